@@ -0,0 +1,172 @@
+"""Compare the urllib3, asyncio HTTP/1.1 and HTTP/2 transports.
+
+Starts a local server that answers ``GET /version`` after a fixed delay,
+over HTTP/1.1 keep-alive or HTTP/2 (h2c prior knowledge), and issues the
+same burst of concurrent calls through each client:
+
+    python scripts/bench_http2.py --requests 2000 --concurrency 200 --latency 0.02
+
+Requires the ``http2`` extra (``pip install deltastream-connector[http2]``).
+"""
+
+import argparse
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import h2.config
+import h2.connection
+import h2.events
+
+from deltastream.api.async_api import AsyncDeltastreamApi
+from deltastream.api.controlplane.openapi_client.api import DeltastreamApi
+from deltastream.api.controlplane.openapi_client.api_client import ApiClient
+from deltastream.api.controlplane.openapi_client.configuration import Configuration
+from deltastream.api.transport import AsyncRESTClientObject, PoolRegistry
+
+BODY = b'{"major": 2, "minor": 0, "patch": 0}'
+PREFACE = b"PRI * HTTP/2.0\r\n"
+
+
+class BenchServer:
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.connections = 0
+
+    async def serve(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.connections += 1
+        try:
+            line = await reader.readline()
+            if line == PREFACE:
+                await self.serve_h2(reader, writer)
+                return
+            while line:
+                while (await reader.readline()) not in (b"\r\n", b""):
+                    pass
+                await asyncio.sleep(self.latency)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: %d\r\n\r\n%s" % (len(BODY), BODY)
+                )
+                await writer.drain()
+                line = await reader.readline()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve_h2(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        conn = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False))
+        conn.initiate_connection()
+        conn.receive_data(PREFACE + await reader.readexactly(8))
+        writer.write(conn.data_to_send())
+        tasks = set()
+
+        async def respond(stream_id: int) -> None:
+            await asyncio.sleep(self.latency)
+            conn.send_headers(
+                stream_id,
+                [
+                    (":status", "200"),
+                    ("content-type", "application/json"),
+                    ("content-length", str(len(BODY))),
+                ],
+            )
+            conn.send_data(stream_id, BODY, end_stream=True)
+            writer.write(conn.data_to_send())
+
+        while data := await reader.read(65536):
+            for event in conn.receive_data(data):
+                if isinstance(event, h2.events.StreamEnded):
+                    task = asyncio.ensure_future(respond(event.stream_id))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            writer.write(conn.data_to_send())
+
+
+def run_server(latency: float) -> tuple:
+    server = BenchServer(latency)
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    port = []
+
+    async def main() -> None:
+        srv = await asyncio.start_server(server.serve, "127.0.0.1", 0)
+        port.append(srv.sockets[0].getsockname()[1])
+        started.set()
+        await asyncio.Event().wait()
+
+    threading.Thread(
+        target=loop.run_until_complete, args=(main(),), daemon=True
+    ).start()
+    started.wait()
+    return server, f"http://127.0.0.1:{port[0]}"
+
+
+def make_config(url: str) -> Configuration:
+    config = Configuration()
+    config.host = url
+    return config
+
+
+def bench_urllib3(url: str, requests: int, concurrency: int) -> None:
+    config = make_config(url)
+    config.connection_pool_maxsize = concurrency
+    api = DeltastreamApi(ApiClient(config))
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(lambda _: api.get_version(), range(requests)))
+
+
+async def bench_async(url: str, requests: int, concurrency: int, http2: bool) -> None:
+    config = make_config(url)
+    registry = PoolRegistry()
+    api = AsyncDeltastreamApi(
+        ApiClient(config), AsyncRESTClientObject(config, registry, http2=http2)
+    )
+    limit = asyncio.Semaphore(concurrency)
+
+    async def call() -> None:
+        async with limit:
+            await api.get_version()
+
+    await asyncio.gather(*(call() for _ in range(requests)))
+    await registry.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    cases = {
+        "urllib3 (threads)": lambda url: bench_urllib3(
+            url, args.requests, args.concurrency
+        ),
+        "asyncio HTTP/1.1": lambda url: asyncio.run(
+            bench_async(url, args.requests, args.concurrency, http2=False)
+        ),
+        "asyncio HTTP/2": lambda url: asyncio.run(
+            bench_async(url, args.requests, args.concurrency, http2=True)
+        ),
+    }
+    print(f"{'transport':<20} {'req/s':>10} {'elapsed (s)':>12} {'connections':>12}")
+    for name, run in cases.items():
+        server, url = run_server(args.latency)
+        start = time.perf_counter()
+        run(url)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{name:<20} {args.requests / elapsed:>10.0f} {elapsed:>12.3f} "
+            f"{server.connections:>12}"
+        )
+
+
+if __name__ == "__main__":
+    main()
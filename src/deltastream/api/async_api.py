@@ -0,0 +1,466 @@
+"""Awaitable facades over the generated OpenAPI clients.
+
+Requests are built with the generated serializers and decoded with the
+generated ``ApiClient.response_deserialize``; only the network round trip
+goes through ``AsyncRESTClientObject``. Requests that exceed their
+``_request_timeout`` raise ``deltastream.api.error.TimeoutError``.
+Idempotent calls are retried under the facade's ``RetryPolicy``, and status
+and partition fetches hedged under its ``HedgePolicy``, if any. With an
+``EndpointRouter``, every request is sent to the router's best endpoint
+instead of the configured host.
+"""
+
+import asyncio
+import functools
+import ssl
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar, Union
+from uuid import UUID
+
+from deltastream.api.controlplane.openapi_client.api import DeltastreamApi
+from deltastream.api.controlplane.openapi_client.api_client import (
+    ApiClient as CPApiClient,
+)
+from deltastream.api.controlplane.openapi_client.exceptions import (
+    ApiException as CPApiException,
+)
+from deltastream.api.controlplane.openapi_client.models import (
+    ResultSet,
+    StatementRequest,
+    StatementStatus,
+    Version,
+)
+from deltastream.api.dataplane.openapi_client.api.dataplane_api import DataplaneApi
+from deltastream.api.dataplane.openapi_client.api_client import (
+    ApiClient as DPApiClient,
+)
+from deltastream.api.dataplane.openapi_client.api_response import (
+    ApiResponse as DPApiResponse,
+)
+from deltastream.api.dataplane.openapi_client.exceptions import (
+    ApiException as DPApiException,
+)
+from deltastream.api.dataplane.openapi_client.models import (
+    ResultSet as DPResultSet,
+    StatementStatus as DPStatementStatus,
+    Version as DPVersion,
+)
+
+from .error import TimeoutError
+from .hedge import HedgePolicy
+from .jsonstream import ResultSetStream
+from .limiter import RequestLimiter
+from .retry import RetryPolicy
+from .routing import EndpointRouter
+from .transport import AsyncRESTClientObject, AsyncRESTResponse, RequestTimeout
+
+T = TypeVar("T")
+
+_STATEMENT_RESPONSE_TYPES: Dict[str, Optional[str]] = {
+    "200": "ResultSet",
+    "202": "StatementStatus",
+    "400": "ErrorResponse",
+    "403": "ErrorResponse",
+    "404": "ErrorResponse",
+    "408": "ErrorResponse",
+    "500": "ErrorResponse",
+    "503": "ErrorResponse",
+}
+
+_VERSION_RESPONSE_TYPES: Dict[str, Optional[str]] = {
+    "200": "Version",
+    "403": "ErrorResponse",
+    "500": "ErrorResponse",
+    "503": "ErrorResponse",
+}
+
+_DOWNLOAD_RESPONSE_TYPES: Dict[str, Optional[str]] = {
+    "200": "str",
+    "400": "ErrorResponse",
+    "403": "ErrorResponse",
+    "404": "ErrorResponse",
+    "408": "ErrorResponse",
+    "500": "ErrorResponse",
+    "503": "ErrorResponse",
+}
+
+
+class _AsyncApi:
+    api_exception: Any = CPApiException
+
+    def __init__(
+        self,
+        api_client: Any,
+        rest_client: Optional[AsyncRESTClientObject] = None,
+        retry: Optional[RetryPolicy] = None,
+        hedge: Optional[HedgePolicy] = None,
+        limiter: Optional[RequestLimiter] = None,
+        router: Optional[EndpointRouter] = None,
+    ) -> None:
+        self.api_client = api_client
+        self.rest_client = rest_client or AsyncRESTClientObject(
+            api_client.configuration
+        )
+        self.retry = retry
+        self.hedge = hedge
+        self.limiter = limiter
+        self.router = router
+
+    async def _request(
+        self,
+        param: Tuple[Any, ...],
+        _request_timeout: RequestTimeout = None,
+        idempotent: bool = False,
+    ) -> AsyncRESTResponse:
+        if idempotent and self.retry is not None:
+            return await self.retry.run(
+                functools.partial(self._send, param), _request_timeout
+            )
+        return await self._send(param, _request_timeout)
+
+    async def _send(
+        self, param: Tuple[Any, ...], _request_timeout: RequestTimeout = None
+    ) -> AsyncRESTResponse:
+        if self.limiter is None:
+            return await self._send_once(param, _request_timeout)
+        ticket = await self.limiter.acquire()
+        try:
+            response = await self._send_once(param, _request_timeout)
+        except TimeoutError:
+            self.limiter.release(ticket, 408)
+            raise
+        except BaseException:
+            self.limiter.release(ticket, None)
+            raise
+        # Like the connection, the slot is held until the body is read.
+        response.add_release_callback(
+            functools.partial(self.limiter.release, ticket, response.status)
+        )
+        return response
+
+    async def _send_once(
+        self, param: Tuple[Any, ...], _request_timeout: RequestTimeout = None
+    ) -> AsyncRESTResponse:
+        url = param[1]
+        if self.router is None:
+            return await self._send_to(param, url, _request_timeout)
+        path = url[len(self.api_client.configuration.host.rstrip("/")) :]
+        return await self.router.run(
+            lambda base: self._send_to(param, base + path, _request_timeout)
+        )
+
+    async def _send_to(
+        self,
+        param: Tuple[Any, ...],
+        url: str,
+        _request_timeout: RequestTimeout = None,
+    ) -> AsyncRESTResponse:
+        method, _, header_params, body, post_params = param
+        try:
+            return await self.rest_client.request(
+                method,
+                url,
+                headers=header_params,
+                body=body,
+                post_params=post_params,
+                _request_timeout=_request_timeout,
+            )
+        except ssl.SSLError as e:
+            msg = "\n".join([type(e).__name__, str(e)])
+            raise self.api_exception(status=0, reason=msg) from e
+        except asyncio.TimeoutError as e:
+            raise TimeoutError(f"{method} {url} timed out") from e
+
+    async def _deserialize(
+        self,
+        response_data: AsyncRESTResponse,
+        response_types_map: Dict[str, Optional[str]],
+    ) -> Any:
+        try:
+            await response_data.read()
+        except (ssl.SSLError, ConnectionError, asyncio.IncompleteReadError) as e:
+            msg = "\n".join([type(e).__name__, str(e)])
+            raise self.api_exception(status=0, reason=msg) from e
+        except asyncio.TimeoutError as e:
+            raise TimeoutError("Timed out reading the response body") from e
+        return self.api_client.response_deserialize(
+            response_data=response_data,
+            response_types_map=response_types_map,
+        )
+
+    async def _call(
+        self,
+        param: Tuple[Any, ...],
+        response_types_map: Dict[str, Optional[str]],
+        _request_timeout: RequestTimeout = None,
+        idempotent: bool = False,
+        hedged: bool = False,
+    ) -> Any:
+        async def call() -> Any:
+            response_data = await self._request(param, _request_timeout, idempotent)
+            return await self._deserialize(response_data, response_types_map)
+
+        if hedged and self.hedge is not None:
+            return await self.hedge.run(call)
+        return await call()
+
+    async def _stream_call(
+        self,
+        param: Tuple[Any, ...],
+        from_dict: Callable[[Dict[str, Any]], Optional[T]],
+        _request_timeout: RequestTimeout = None,
+    ) -> Any:
+        """Like ``_call``, but parse a 200 ``ResultSet`` incrementally.
+
+        Returns a ``ResultSetStream`` for 200 responses and the deserialized
+        ``StatementStatus`` for 202; errors raise as with ``_call``. Status
+        reads are idempotent, so the request is retried like one, and hedged
+        until the response head arrives.
+        """
+        send = functools.partial(self._request, param, _request_timeout, True)
+        if self.hedge is not None:
+            response_data = await self.hedge.run(send, AsyncRESTResponse.release)
+        else:
+            response_data = await send()
+        content_type = response_data.getheader("content-type") or "application/json"
+        if response_data.status == 200 and "json" in content_type:
+            try:
+                return await ResultSetStream.open(response_data, from_dict)
+            except (ssl.SSLError, ConnectionError, asyncio.IncompleteReadError) as e:
+                msg = "\n".join([type(e).__name__, str(e)])
+                raise self.api_exception(status=0, reason=msg) from e
+            except asyncio.TimeoutError as e:
+                raise TimeoutError("Timed out reading the response body") from e
+        response = await self._deserialize(response_data, _STATEMENT_RESPONSE_TYPES)
+        return response.data
+
+    async def close(self) -> None:
+        await self.rest_client.close()
+
+
+class AsyncDeltastreamApi(_AsyncApi):
+    """Awaitable counterpart of the generated controlplane ``DeltastreamApi``."""
+
+    api_exception = CPApiException
+
+    def __init__(
+        self,
+        api_client: Optional[CPApiClient] = None,
+        rest_client: Optional[AsyncRESTClientObject] = None,
+        retry: Optional[RetryPolicy] = None,
+        hedge: Optional[HedgePolicy] = None,
+        limiter: Optional[RequestLimiter] = None,
+        router: Optional[EndpointRouter] = None,
+    ) -> None:
+        super().__init__(
+            api_client or CPApiClient.get_default(),
+            rest_client,
+            retry,
+            hedge,
+            limiter,
+            router,
+        )
+        self.api = DeltastreamApi(self.api_client)
+
+    async def submit_statement(
+        self,
+        request: StatementRequest,
+        attachments: Optional[List[Union[bytes, str, Tuple[str, bytes]]]] = None,
+        _request_timeout: RequestTimeout = None,
+        _request_auth: Optional[Dict[str, Any]] = None,
+        _content_type: Optional[str] = None,
+        _headers: Optional[Dict[str, Any]] = None,
+    ) -> Union[ResultSet, StatementStatus]:
+        param = self.api._submit_statement_serialize(
+            request=request,
+            attachments=attachments,
+            _request_auth=_request_auth,
+            _content_type=_content_type,
+            _headers=_headers,
+            _host_index=0,
+        )
+        response = await self._call(param, _STATEMENT_RESPONSE_TYPES, _request_timeout)
+        return response.data
+
+    async def get_statement_status(
+        self,
+        statement_id: UUID,
+        session_id: Optional[str] = None,
+        partition_id: Optional[int] = None,
+        timezone: Optional[str] = None,
+        _request_timeout: RequestTimeout = None,
+        _request_auth: Optional[Dict[str, Any]] = None,
+        _headers: Optional[Dict[str, Any]] = None,
+    ) -> Union[ResultSet, StatementStatus]:
+        param = self.api._get_statement_status_serialize(
+            statement_id=statement_id,
+            session_id=session_id,
+            partition_id=partition_id,
+            timezone=timezone,
+            _request_auth=_request_auth,
+            _content_type=None,
+            _headers=_headers,
+            _host_index=0,
+        )
+        response = await self._call(
+            param,
+            _STATEMENT_RESPONSE_TYPES,
+            _request_timeout,
+            idempotent=True,
+            hedged=True,
+        )
+        return response.data
+
+    async def stream_statement_status(
+        self,
+        statement_id: UUID,
+        session_id: Optional[str] = None,
+        partition_id: Optional[int] = None,
+        timezone: Optional[str] = None,
+        _request_timeout: RequestTimeout = None,
+        _request_auth: Optional[Dict[str, Any]] = None,
+        _headers: Optional[Dict[str, Any]] = None,
+    ) -> Union[ResultSetStream[ResultSet], StatementStatus]:
+        """``get_statement_status`` that streams the rows of a result set."""
+        param = self.api._get_statement_status_serialize(
+            statement_id=statement_id,
+            session_id=session_id,
+            partition_id=partition_id,
+            timezone=timezone,
+            _request_auth=_request_auth,
+            _content_type=None,
+            _headers=_headers,
+            _host_index=0,
+        )
+        return await self._stream_call(param, ResultSet.from_dict, _request_timeout)
+
+    async def get_version(
+        self,
+        _request_timeout: RequestTimeout = None,
+        _request_auth: Optional[Dict[str, Any]] = None,
+        _headers: Optional[Dict[str, Any]] = None,
+    ) -> Version:
+        param = self.api._get_version_serialize(
+            _request_auth=_request_auth,
+            _content_type=None,
+            _headers=_headers,
+            _host_index=0,
+        )
+        response = await self._call(
+            param, _VERSION_RESPONSE_TYPES, _request_timeout, idempotent=True
+        )
+        return response.data
+
+    async def download_resource(
+        self,
+        resource_type: str,
+        organization_id: UUID,
+        resource_name: str,
+        _request_timeout: RequestTimeout = None,
+        _request_auth: Optional[Dict[str, Any]] = None,
+        _headers: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        param = self.api._download_resource_serialize(
+            resource_type=resource_type,
+            organization_id=organization_id,
+            resource_name=resource_name,
+            _request_auth=_request_auth,
+            _content_type=None,
+            _headers=_headers,
+            _host_index=0,
+        )
+        response = await self._call(
+            param, _DOWNLOAD_RESPONSE_TYPES, _request_timeout, idempotent=True
+        )
+        return response.data
+
+
+class AsyncDataplaneApi(_AsyncApi):
+    """Awaitable counterpart of the generated ``DataplaneApi``."""
+
+    api_exception = DPApiException
+
+    def __init__(
+        self,
+        api_client: Optional[DPApiClient] = None,
+        rest_client: Optional[AsyncRESTClientObject] = None,
+        retry: Optional[RetryPolicy] = None,
+        hedge: Optional[HedgePolicy] = None,
+        limiter: Optional[RequestLimiter] = None,
+    ) -> None:
+        super().__init__(
+            api_client or DPApiClient.get_default(), rest_client, retry, hedge, limiter
+        )
+        self.api = DataplaneApi(self.api_client)
+
+    async def get_statement_status_with_http_info(
+        self,
+        statement_id: UUID,
+        session_id: Optional[str] = None,
+        partition_id: Optional[int] = None,
+        timezone: Optional[str] = None,
+        _request_timeout: RequestTimeout = None,
+        _request_auth: Optional[Dict[str, Any]] = None,
+        _headers: Optional[Dict[str, Any]] = None,
+    ) -> DPApiResponse[Any]:
+        """Fetch a statement status or result set partition.
+
+        The response data is a ``ResultSet`` for 200 and a ``StatementStatus``
+        for 202 (statement still running).
+        """
+        param = self.api._get_statement_status_serialize(
+            statement_id=statement_id,
+            session_id=session_id,
+            partition_id=partition_id,
+            timezone=timezone,
+            _request_auth=_request_auth,
+            _content_type=None,
+            _headers=_headers,
+            _host_index=0,
+        )
+        return await self._call(
+            param,
+            _STATEMENT_RESPONSE_TYPES,
+            _request_timeout,
+            idempotent=True,
+            hedged=True,
+        )
+
+    async def stream_statement_status(
+        self,
+        statement_id: UUID,
+        session_id: Optional[str] = None,
+        partition_id: Optional[int] = None,
+        timezone: Optional[str] = None,
+        _request_timeout: RequestTimeout = None,
+        _request_auth: Optional[Dict[str, Any]] = None,
+        _headers: Optional[Dict[str, Any]] = None,
+    ) -> Union[ResultSetStream[DPResultSet], DPStatementStatus]:
+        """``get_statement_status`` that streams the rows of a result set."""
+        param = self.api._get_statement_status_serialize(
+            statement_id=statement_id,
+            session_id=session_id,
+            partition_id=partition_id,
+            timezone=timezone,
+            _request_auth=_request_auth,
+            _content_type=None,
+            _headers=_headers,
+            _host_index=0,
+        )
+        return await self._stream_call(param, DPResultSet.from_dict, _request_timeout)
+
+    async def get_version(
+        self,
+        _request_timeout: RequestTimeout = None,
+        _request_auth: Optional[Dict[str, Any]] = None,
+        _headers: Optional[Dict[str, Any]] = None,
+    ) -> DPVersion:
+        param = self.api._get_version_serialize(
+            _request_auth=_request_auth,
+            _content_type=None,
+            _headers=_headers,
+            _host_index=0,
+        )
+        response = await self._call(
+            param, _VERSION_RESPONSE_TYPES, _request_timeout, idempotent=True
+        )
+        return response.data
@@ -0,0 +1,146 @@
+"""Per-endpoint circuit breakers for the HTTP transport.
+
+When the controlplane or a dataplane host stops answering, every request to
+it used to wait out its full timeout, clogging the caller's workers. A
+``CircuitBreaker`` counts consecutive failures (connection errors, timeouts
+and ``502``/``503``/``504`` responses) per origin. After
+``failure_threshold`` of them it opens, and requests fail immediately with
+``CircuitOpenError`` (a ``ServiceUnavailableError``). After
+``recovery_timeout`` seconds it lets a few probe requests through
+(half-open); a successful probe closes it again, a failed one reopens it.
+"""
+
+import time
+from enum import Enum
+from typing import Dict, FrozenSet, Tuple
+
+from .error import CircuitOpenError
+
+#: Response statuses that count as the endpoint failing.
+FAILURE_STATUSES: FrozenSet[int] = frozenset({502, 503, 504})
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+
+class CircuitBreaker:
+    """Failure tracking for a single endpoint.
+
+    :param failure_threshold: consecutive failures that open the circuit.
+    :param recovery_timeout: seconds the circuit stays open before probing.
+    :param half_open_probes: requests let through at once while half-open.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 10.0,
+        half_open_probes: int = 1,
+    ) -> None:
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_probes = half_open_probes
+        self.failures = 0
+        #: Times the circuit has opened.
+        self.opened = 0
+        #: Requests rejected while open.
+        self.rejected = 0
+        self._state = CircuitState.CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+
+    @property
+    def state(self) -> CircuitState:
+        if (
+            self._state is CircuitState.OPEN
+            and time.monotonic() - self._opened_at >= self.recovery_timeout
+        ):
+            self._state = CircuitState.HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def before_request(self) -> None:
+        """Admit a request, or raise ``CircuitOpenError`` to fail fast."""
+        state = self.state
+        if state is CircuitState.CLOSED:
+            return
+        if state is CircuitState.HALF_OPEN and self._probes < self.half_open_probes:
+            self._probes += 1
+            return
+        self.rejected += 1
+        retry_in = max(self._opened_at + self.recovery_timeout - time.monotonic(), 0)
+        raise CircuitOpenError(
+            f"Circuit for {self.endpoint} is open after {self.failures} "
+            f"consecutive failures; retry in {retry_in:.1f}s",
+            retry_in,
+        )
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._state = CircuitState.CLOSED
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if (
+            self._state is CircuitState.HALF_OPEN
+            or self.failures >= self.failure_threshold
+        ):
+            if self._state is not CircuitState.OPEN:
+                self.opened += 1
+            self._state = CircuitState.OPEN
+            self._opened_at = time.monotonic()
+
+    def record_status(self, status: int) -> None:
+        if status in FAILURE_STATUSES:
+            self.record_failure()
+        else:
+            self.record_success()
+
+    def record_abandoned(self) -> None:
+        """The request ended without telling anything about the endpoint."""
+        if self._state is CircuitState.HALF_OPEN and self._probes > 0:
+            self._probes -= 1
+
+
+class CircuitBreakers:
+    """One ``CircuitBreaker`` per origin, all with the same settings.
+
+    ``failure_threshold=0`` disables circuit breaking.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 10.0,
+        half_open_probes: int = 1,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_probes = half_open_probes
+        self._breakers: Dict[Tuple[str, str, int], CircuitBreaker] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.failure_threshold > 0
+
+    def breaker_for(self, origin: Tuple[str, str, int]) -> CircuitBreaker:
+        breaker = self._breakers.get(origin)
+        if breaker is None:
+            scheme, host, port = origin
+            breaker = CircuitBreaker(
+                f"{scheme}://{host}:{port}",
+                self.failure_threshold,
+                self.recovery_timeout,
+                self.half_open_probes,
+            )
+            self._breakers[origin] = breaker
+        return breaker
+
+    def states(self) -> Dict[str, CircuitState]:
+        """State of every endpoint seen so far."""
+        return {b.endpoint: b.state for b in self._breakers.values()}
@@ -0,0 +1,197 @@
+"""Content-Encoding negotiation and incremental decompression.
+
+Result set partitions are verbose JSON and compress well. The asyncio
+transport advertises every encoding it can decode and decompresses bodies
+chunk by chunk as they arrive, so the decoded payload never has to be held
+next to its compressed form. ``gzip`` and ``deflate`` are always available;
+``br`` and ``zstd`` are offered when ``brotli`` (or ``brotlicffi``) and
+``zstandard`` are installed, e.g. with
+``pip install deltastream-connector[compression]``.
+"""
+
+import abc
+import importlib
+import zlib
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+
+def _optional_import(*names: str) -> Any:
+    for name in names:
+        try:
+            return importlib.import_module(name)
+        except ImportError:
+            continue
+    return None
+
+
+brotli = _optional_import("brotli", "brotlicffi")
+zstandard = _optional_import("zstandard")
+
+
+class ContentDecodingError(ValueError):
+    """The response body could not be decoded with its Content-Encoding."""
+
+
+class _Decoder(abc.ABC):
+    @abc.abstractmethod
+    def decompress(self, data: bytes) -> bytes: ...
+
+    def flush(self) -> bytes:
+        return b""
+
+
+class _GzipDecoder(_Decoder):
+    def __init__(self) -> None:
+        self._obj = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def decompress(self, data: bytes) -> bytes:
+        out = [self._obj.decompress(data)]
+        # A gzip body may consist of several members.
+        while self._obj.eof and self._obj.unused_data:
+            data = self._obj.unused_data
+            self._obj = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            out.append(self._obj.decompress(data))
+        return b"".join(out)
+
+    def flush(self) -> bytes:
+        return self._obj.flush()
+
+
+class _DeflateDecoder(_Decoder):
+    """zlib-wrapped deflate, falling back to raw deflate as some servers send."""
+
+    def __init__(self) -> None:
+        self._obj = zlib.decompressobj()
+        self._first: Optional[bytes] = b""
+
+    def decompress(self, data: bytes) -> bytes:
+        if self._first is None:
+            return self._obj.decompress(data)
+        self._first += data
+        try:
+            out = self._obj.decompress(data)
+        except zlib.error:
+            self._obj = zlib.decompressobj(-zlib.MAX_WBITS)
+            out = self._obj.decompress(self._first)
+        if out:
+            self._first = None
+        return out
+
+    def flush(self) -> bytes:
+        return self._obj.flush()
+
+
+class _BrotliDecoder(_Decoder):
+    def __init__(self) -> None:
+        self._obj = brotli.Decompressor()
+        self._process = getattr(self._obj, "process", None) or self._obj.decompress
+
+    def decompress(self, data: bytes) -> bytes:
+        return self._process(data)
+
+
+class _ZstdDecoder(_Decoder):
+    def __init__(self) -> None:
+        self._obj = zstandard.ZstdDecompressor().decompressobj()
+
+    def decompress(self, data: bytes) -> bytes:
+        out = []
+        while data:
+            # Each zstd frame needs its own decompression object.
+            if self._obj.eof:
+                self._obj = zstandard.ZstdDecompressor().decompressobj()
+            out.append(self._obj.decompress(data))
+            data = self._obj.unused_data if self._obj.eof else b""
+        return b"".join(out)
+
+
+_DECODERS: Dict[str, Callable[[], _Decoder]] = {
+    "gzip": _GzipDecoder,
+    "x-gzip": _GzipDecoder,
+    "deflate": _DeflateDecoder,
+}
+if brotli is not None:
+    _DECODERS["br"] = _BrotliDecoder
+if zstandard is not None:
+    _DECODERS["zstd"] = _ZstdDecoder
+
+#: Value sent as ``Accept-Encoding`` when the caller does not set one.
+ACCEPT_ENCODING = ", ".join(
+    encoding for encoding in ("zstd", "br", "gzip", "deflate") if encoding in _DECODERS
+)
+
+
+class ContentDecoder:
+    """Incrementally undo the encodings listed in a ``Content-Encoding`` header."""
+
+    def __init__(self, content_encoding: str, encodings: List[str]) -> None:
+        self.content_encoding = content_encoding
+        # Encodings are listed in the order they were applied.
+        self._decoders = [_DECODERS[e]() for e in reversed(encodings)]
+
+    def decompress(self, data: bytes) -> bytes:
+        try:
+            for decoder in self._decoders:
+                data = decoder.decompress(data)
+        except Exception as e:
+            raise self._error(e) from e
+        return data
+
+    def flush(self) -> bytes:
+        data = b""
+        try:
+            for decoder in self._decoders:
+                data = (decoder.decompress(data) if data else b"") + decoder.flush()
+        except Exception as e:
+            raise self._error(e) from e
+        return data
+
+    def _error(self, exc: Exception) -> ContentDecodingError:
+        return ContentDecodingError(
+            f"Failed to decode {self.content_encoding} response body: {exc}"
+        )
+
+
+def get_decoder(content_encoding: Optional[str]) -> Optional[ContentDecoder]:
+    """Return an incremental decoder for a ``Content-Encoding`` header value.
+
+    Returns ``None`` for identity bodies. Raises ``ContentDecodingError`` for
+    encodings that cannot be decoded here.
+    """
+    encodings = [
+        e.strip().lower()
+        for e in (content_encoding or "").split(",")
+        if e.strip() and e.strip().lower() != "identity"
+    ]
+    if not encodings:
+        return None
+    unsupported = [e for e in encodings if e not in _DECODERS]
+    if unsupported:
+        raise ContentDecodingError(
+            f"Unsupported Content-Encoding: {', '.join(unsupported)}"
+        )
+    return ContentDecoder(content_encoding or "", encodings)
+
+
+@dataclass
+class ByteCounter:
+    """Response body bytes received on the wire and after decoding."""
+
+    wire_bytes: int = 0
+    decoded_bytes: int = 0
+
+    @property
+    def compression_ratio(self) -> float:
+        """Decoded size over on-wire size; 1.0 when nothing was received."""
+        if not self.wire_bytes:
+            return 1.0
+        return self.decoded_bytes / self.wire_bytes
+
+    def add(self, wire_bytes: int, decoded_bytes: int) -> None:
+        self.wire_bytes += wire_bytes
+        self.decoded_bytes += decoded_bytes
+
+    def reset(self) -> None:
+        self.wire_bytes = 0
+        self.decoded_bytes = 0
@@ -1,12 +1,26 @@
-from typing import List, Optional, Callable, Awaitable, Dict, Union
+from typing import List, Optional, Callable, Awaitable, Dict, Sequence, Tuple, Union
 from urllib.parse import urlparse, parse_qs
+import asyncio
+import dataclasses
+import functools
 import os
 import mimetypes
 from .blob import Blob
 from .error import AuthenticationError
-from deltastream.api.controlplane.openapi_client.api import DeltastreamApi
+from .async_api import AsyncDeltastreamApi
+from .deadline import Deadline
+from .hedge import HedgePolicy
+from .latency import LatencyModel
+from .limiter import AIMDLimiter, RequestLimiter
+from .polling import PollStrategy
+from .retry import RetryPolicy
+from .routing import EndpointRouter
+from .singleflight import SingleFlight
+from .tokens import TokenCache
+from .transport import AsyncRESTClientObject, keepalive_socket_options
 from deltastream.api.controlplane.openapi_client.api_client import ApiClient
 from deltastream.api.controlplane.openapi_client.exceptions import ApiException
+from .statement import StatementHandle
 from .streaming_rows import StreamingRows
 from .resultset_rows import ResultsetRows
 from .dpconn import DPAPIConnection
@@ -20,6 +34,10 @@ from .models import (
 from deltastream.api.controlplane.openapi_client.models.result_set import (
     ResultSet as CPResultSet,
 )
+from deltastream.api.controlplane.openapi_client.models.statement_status import (
+    StatementStatus as CPStatementStatus,
+)
+from deltastream.api.dataplane.openapi_client import ResultSet as DPResultSet
 from .handlers import StatementHandler, map_error_response
 from deltastream.api.controlplane.openapi_client.configuration import Configuration
 from uuid import UUID
@@ -28,7 +46,7 @@ from uuid import UUID
 class APIConnection:
     def __init__(
         self,
-        server_url: str,
+        server_url: Union[str, Sequence[str]],
         token_provider: Callable[[], Awaitable[str]],
         session_id: Optional[str],
         timezone: str,
@@ -38,9 +56,38 @@ class APIConnection:
         schema_name: Optional[str],
         store_name: Optional[str],
         compute_pool_name: Optional[str] = None,
+        http2: bool = False,
+        hedge: Optional[HedgePolicy] = None,
+        limiter: Optional[RequestLimiter] = None,
+        polling: Optional[PollStrategy] = None,
+        poll_rate: Optional[float] = 50.0,
+        token_ttl: Optional[float] = None,
+        propagate_context: bool = True,
     ):
         self.catalog: Optional[str] = None
+        # With several controlplane URLs, requests go to the fastest healthy one.
+        self.router: Optional[EndpointRouter] = None
+        if not isinstance(server_url, str):
+            if len(server_url) > 1:
+                self.router = EndpointRouter(server_url)
+            server_url = server_url[0]
         self.server_url = server_url
+        self.http2 = http2
+        self.socket_options: Optional[List[Tuple[int, int, int]]] = None
+        self._warm_connections = 0
+        self._warm_targets: Dict[str, Callable[[int], Awaitable[int]]] = {}
+        self._heartbeat: Optional["asyncio.Future[None]"] = None
+        # Retries of idempotent calls, with one budget for this connection.
+        self.retry = RetryPolicy()
+        # Hedging of status and partition fetches, shared with the dataplane.
+        self.hedge = hedge
+        # Client-side rate and concurrency limits for controlplane requests.
+        self.limiter = limiter
+        # Backoff between status polls, shared with the dataplane, scheduled
+        # around the latencies of earlier statements like the one polled.
+        self.polling = polling or PollStrategy(model=LatencyModel())
+        # Dataplane status polls coalesced across queries.
+        self.dp_status_flights: SingleFlight[DPResultSet] = SingleFlight()
         self.session_id = session_id
         self.timezone = timezone
         # Convert to UUID if provided and valid
@@ -68,9 +115,25 @@ class APIConnection:
             compute_pool_name=compute_pool_name,
         )
         self.token_provider = token_provider
+        # Tokens are reused until shortly before they expire (JWT exp or
+        # token_ttl) instead of asking the provider for every call; a token
+        # the server rejects is dropped and the call made once more.
+        self.tokens = TokenCache(token_provider, token_ttl)
+        # Statements waited for are polled from one loop, at most poll_rate
+        # times per second in total; None gives each wait its own loop.
         self.statement_handler = StatementHandler(
-            self._create_api(), self.rsctx, self.session_id, self.timezone
+            self._create_api(),
+            self.rsctx,
+            self.session_id,
+            self.timezone,
+            self.polling,
+            poll_rate,
+            self.tokens.get,
+            self.tokens.invalidate,
         )
+        # Whether statements run without an explicit context update the
+        # connection's context with the one they leave behind.
+        self.propagate_context = propagate_context
 
     @staticmethod
     def from_dsn(
@@ -86,7 +149,9 @@ class APIConnection:
             async def token_provider() -> str:
                 return url.password or ""
 
-        server_url = f"{url.scheme}://{url.hostname}{url.path}"
+        # Several controlplane hosts may be given, separated by commas.
+        hosts = url.netloc.rpartition("@")[2].split(",")
+        server_urls = [f"{url.scheme}://{host}{url.path}" for host in hosts]
         session_id = query_params.get("sessionID", [None])[0] or ""  # Ensure string
         timezone = query_params.get("timezone", ["UTC"])[0]
         organization_id = query_params.get("organizationID", [None])[0]
@@ -95,9 +160,26 @@ class APIConnection:
         schema_name = query_params.get("schemaName", [None])[0]
         store_name = query_params.get("storeName", [None])[0]
         compute_pool_name = query_params.get("computePoolName", [None])[0]
+        http2 = query_params.get("http2", ["false"])[0].lower() in ("1", "true")
+        hedge = query_params.get("hedge", ["false"])[0].lower() in ("1", "true")
+        rate_limit = query_params.get("rateLimit", [None])[0]
+        rate_burst = query_params.get("rateBurst", [None])[0]
+        max_concurrency = query_params.get("maxConcurrency", [None])[0]
+        poll_rate = float(query_params.get("pollRate", ["50"])[0])
+        latency_file = query_params.get("latencyFile", [None])[0]
+        token_ttl = query_params.get("tokenTTL", [None])[0]
+        limiter = None
+        if rate_limit or max_concurrency:
+            limiter = RequestLimiter(
+                rate=float(rate_limit) if rate_limit else None,
+                burst=float(rate_burst) if rate_burst else None,
+                concurrency=AIMDLimiter(max_limit=int(max_concurrency))
+                if max_concurrency
+                else None,
+            )
 
         return APIConnection(
-            server_url,
+            server_urls,
             token_provider,
             session_id,
             timezone,
@@ -107,6 +189,14 @@ class APIConnection:
             schema_name,
             store_name,
             compute_pool_name,
+            http2=http2,
+            hedge=HedgePolicy() if hedge else None,
+            limiter=limiter,
+            polling=PollStrategy(model=LatencyModel(path=latency_file))
+            if latency_file
+            else None,
+            poll_rate=poll_rate or None,
+            token_ttl=float(token_ttl) if token_ttl else None,
         )
 
     def _create_config(self):
@@ -117,86 +207,256 @@ class APIConnection:
     def _create_api(self):
         config = self._create_config()
         api_client = ApiClient(config)
-        return DeltastreamApi(api_client)
-
-    async def _set_auth_header(self):
-        token = await self.token_provider()
-        self.statement_handler.api.api_client.configuration.access_token = token
-        self.statement_handler.api.api_client.default_headers["Authorization"] = (
-            f"Bearer {token}"
+        return AsyncDeltastreamApi(
+            api_client,
+            AsyncRESTClientObject(config, http2=self.http2),
+            self.retry,
+            self.hedge,
+            self.limiter,
+            self.router,
         )
 
-    async def exec(self, query: str, attachments: Optional[List[Blob]] = None) -> None:
+    def context(self) -> ResultSetContext:
+        """A copy of the connection's context, for running statements in.
+
+        Statements run with ``context=`` use that context instead of the
+        connection's, and update it instead of the connection's, so tasks
+        sharing a connection can each keep their own.
+        """
+        return dataclasses.replace(self.rsctx)
+
+    def _propagation_target(
+        self, context: Optional[ResultSetContext]
+    ) -> Optional[ResultSetContext]:
+        """The context a call's statements update, if any."""
+        if context is not None:
+            return context
+        return self.rsctx if self.propagate_context else None
+
+    def _propagate(self, rs: CPResultSet, target: Optional[ResultSetContext]) -> None:
+        if target is not None and rs.metadata.context:
+            self._update_context(
+                self.cp_resultsetcontext_to_local(rs.metadata.context), target
+            )
+
+    async def exec(
+        self,
+        query: str,
+        attachments: Optional[List[Blob]] = None,
+        timeout: Optional[float] = None,
+        context: Optional[ResultSetContext] = None,
+    ) -> None:
+        """Run a statement for its side effects.
+
+        ``timeout`` bounds the whole call in seconds; ``TimeoutError`` is
+        raised when it runs out. The statement runs in ``context`` and
+        updates it, or in the connection's context (see ``context()``).
+        """
         try:
-            await self._set_auth_header()
-            rs = await self.submit_statement(query, attachments)
-            if rs.metadata.context:
-                new_ctx = rs.metadata.context
-                if new_ctx.organization_id:
-                    self.rsctx.organization_id = new_ctx.organization_id
-                if new_ctx.role_name:
-                    self.rsctx.role_name = new_ctx.role_name
-                if new_ctx.database_name:
-                    self.rsctx.database_name = new_ctx.database_name
-                if new_ctx.schema_name:
-                    self.rsctx.schema_name = new_ctx.schema_name
-                if new_ctx.store_name:
-                    self.rsctx.store_name = new_ctx.store_name
-                if hasattr(new_ctx, "compute_pool_name") and new_ctx.compute_pool_name:
-                    self.rsctx.compute_pool_name = new_ctx.compute_pool_name
+            rs = await self.submit_statement(query, attachments, timeout, context)
+            self._propagate(rs, self._propagation_target(context))
             return None
         except ApiException as err:
             map_error_response(err)
             raise
 
-    async def query(self, query: str, attachments: Optional[List[Blob]] = None) -> Rows:
+    async def query(
+        self,
+        query: str,
+        attachments: Optional[List[Blob]] = None,
+        timeout: Optional[float] = None,
+        context: Optional[ResultSetContext] = None,
+    ) -> Rows:
+        """Run a statement and return its rows.
+
+        ``timeout`` is a deadline in seconds for the whole call: submitting
+        the statement, polling until it completes, opening the result
+        websocket and fetching every result set partition while the rows are
+        iterated. Each request gets the time that is left as its timeout, and
+        ``TimeoutError`` is raised when it runs out. ``context`` is as for
+        ``exec``.
+        """
+        deadline = Deadline(timeout)
         try:
-            await self._set_auth_header()
-            rs = await self.submit_statement(query, attachments)
-            if rs.metadata.dataplane_request:
-                dp_req = rs.metadata.dataplane_request
-                base_uri = dp_req.uri.replace(f"/statements/{dp_req.statement_id}", "")
-
-                dpconn = DPAPIConnection(
-                    base_uri, dp_req.token, self.timezone, self.session_id
+            rs = await self.submit_statement(
+                query, attachments, deadline.remaining(), context
+            )
+            return await self._rows(rs, deadline, self._propagation_target(context))
+        except ApiException as err:
+            map_error_response(err)
+            raise
+
+    async def _rows(
+        self,
+        rs: CPResultSet,
+        deadline: Deadline,
+        target: Optional[ResultSetContext] = None,
+    ) -> Rows:
+        """The rows of a completed statement, fetched within ``deadline``.
+
+        The context the statement left behind is applied to ``target``.
+        """
+        if rs.metadata.dataplane_request:
+            dp_req = rs.metadata.dataplane_request
+            base_uri = dp_req.uri.replace(f"/statements/{dp_req.statement_id}", "")
+
+            dpconn = DPAPIConnection(
+                base_uri,
+                dp_req.token,
+                self.timezone,
+                self.session_id,
+                http2=self.http2,
+                socket_options=self.socket_options,
+                retry=self.retry,
+                hedge=self.hedge,
+                polling=self.polling,
+                status_flights=self.dp_status_flights,
+            )
+            if self._heartbeat is not None:
+                self._warm_targets.setdefault(dpconn.server_url, dpconn.warm)
+
+            if dp_req.request_type == "result-set":
+                dp_rs = await dpconn.get_statement_status(
+                    UUID(dp_req.statement_id), 0, deadline
                 )
+                cp_rs = self._dataplane_to_controlplane_resultset(dp_rs)
 
-                if dp_req.request_type == "result-set":
-                    dp_rs = await dpconn.get_statement_status(
-                        UUID(dp_req.statement_id), 0
+                async def cp_get_dp_statement_status(
+                    statement_id: UUID, partition_id: int
+                ) -> CPResultSet:
+                    dp_result = await dpconn.get_statement_status(
+                        statement_id, partition_id, deadline
                     )
-                    cp_rs = self._dataplane_to_controlplane_resultset(dp_rs)
+                    return self._dataplane_to_controlplane_resultset(dp_result)
+
+                return ResultsetRows(
+                    cp_get_dp_statement_status,
+                    cp_rs,
+                    stream_partition=functools.partial(
+                        dpconn.stream_statement_status, deadline=deadline
+                    ),
+                )
 
-                    async def cp_get_statement_status(
-                        statement_id: UUID, partition_id: int
-                    ) -> CPResultSet:
-                        dp_result = await dpconn.get_statement_status(
-                            statement_id, partition_id
-                        )
-                        return self._dataplane_to_controlplane_resultset(dp_result)
+            rows = StreamingRows(
+                dpconn, self.cp_dataplanerequest_to_local(dp_req), deadline
+            )
+            await rows.open()
+            return rows
 
-                    return ResultsetRows(cp_get_statement_status, cp_rs)
+        self._propagate(rs, target)
+        cp_rs = self._dataplane_to_controlplane_resultset(rs)
 
-                rows = StreamingRows(dpconn, self.cp_dataplanerequest_to_local(dp_req))
-                await rows.open()
-                return rows
+        async def cp_get_statement_status(
+            statement_id: UUID, partition_id: int
+        ) -> CPResultSet:
+            result = await self.statement_handler.get_statement_status(
+                statement_id, partition_id, deadline
+            )
+            return self._dataplane_to_controlplane_resultset(result)
+
+        return ResultsetRows(
+            cp_get_statement_status,
+            cp_rs,
+            stream_partition=functools.partial(
+                self.statement_handler.stream_statement_status, deadline=deadline
+            ),
+        )
 
-            if rs.metadata.context:
-                self._update_context(
-                    self.cp_resultsetcontext_to_local(rs.metadata.context)
-                )
-            cp_rs = self._dataplane_to_controlplane_resultset(rs)
+    async def submit(
+        self,
+        query: str,
+        attachments: Optional[List[Blob]] = None,
+        timeout: Optional[float] = None,
+        context: Optional[ResultSetContext] = None,
+    ) -> StatementHandle:
+        """Submit a statement and return as soon as the server accepts it.
+
+        The returned ``StatementHandle`` waits for the statement with
+        ``result()`` or ``rows()``. ``timeout`` bounds the submission, the
+        wait and fetching the rows, as for ``query``; ``context`` is as for
+        ``exec``.
+        """
+        deadline = Deadline(timeout)
+        initial_response = await self._send_statement(
+            query, attachments, deadline, context
+        )
+        return StatementHandle(
+            self, initial_response, deadline, self._propagation_target(context)
+        )
 
-            async def cp_get_statement_status(
-                statement_id: UUID, partition_id: int
-            ) -> CPResultSet:
-                result = await self.statement_handler.get_statement_status(
-                    statement_id, partition_id
-                )
-                return self._dataplane_to_controlplane_resultset(result)
+    async def submit_all(
+        self,
+        query: str,
+        attachments: Optional[List[Blob]] = None,
+        timeout: Optional[float] = None,
+        context: Optional[ResultSetContext] = None,
+    ) -> List[StatementHandle]:
+        """Submit SQL with several statements and return a handle for each.
+
+        The statements are submitted in one request; the handles are in the
+        order of the statements and are returned as soon as the server
+        accepts them. ``timeout`` bounds the submission and every handle's
+        wait, and ``context`` is as for ``submit``.
+        """
+        deadline = Deadline(timeout)
+        initial_response = await self._send_statement(
+            query, attachments, deadline, context
+        )
+        return StatementHandle.for_each(
+            self, initial_response, deadline, self._propagation_target(context)
+        )
 
-            return ResultsetRows(cp_get_statement_status, cp_rs)
+    async def query_all(
+        self,
+        query: str,
+        attachments: Optional[List[Blob]] = None,
+        timeout: Optional[float] = None,
+        context: Optional[ResultSetContext] = None,
+    ) -> List[Rows]:
+        """Run SQL with several statements and return the rows of each.
+
+        All statements are waited for concurrently instead of one poll loop
+        after another. The rows come back in the order of the statements.
+        If a statement fails, its ``SQLError`` is raised and the waits for
+        the others are cancelled. ``timeout`` bounds the whole call and
+        ``context`` is as for ``query``.
+        """
+        deadline = Deadline(timeout)
+        target = self._propagation_target(context)
+        initial_response = await self._send_statement(
+            query, attachments, deadline, context
+        )
+        # The handles leave the context alone; the rows apply it in order.
+        handles = StatementHandle.for_each(self, initial_response, deadline)
+        try:
+            results = await asyncio.gather(*(h.result() for h in handles))
+        except BaseException:
+            for handle in handles:
+                handle.cancel()
+            raise
+        try:
+            # Started in statement order, so the context ends up as the last
+            # statement left it, whichever completed last.
+            return list(
+                await asyncio.gather(
+                    *(self._rows(rs, deadline, target) for rs in results)
+                )
+            )
+        except ApiException as err:
+            map_error_response(err)
+            raise
 
+    async def _send_statement(
+        self,
+        query: str,
+        attachments: Optional[List[Blob]],
+        deadline: Deadline,
+        context: Optional[ResultSetContext],
+    ) -> Union[CPResultSet, CPStatementStatus]:
+        try:
+            return await self.statement_handler.send_statement(
+                query, attachments, deadline, self._snapshot(context)
+            )
         except ApiException as err:
             map_error_response(err)
             raise
@@ -339,11 +599,21 @@ class APIConnection:
         )
 
     async def submit_statement(
-        self, query: str, attachments: Optional[List[Blob]] = None
+        self,
+        query: str,
+        attachments: Optional[List[Blob]] = None,
+        timeout: Optional[float] = None,
+        context: Optional[ResultSetContext] = None,
     ) -> CPResultSet:
+        """Submit a statement and wait up to ``timeout`` seconds for its result.
+
+        The statement runs in ``context``, or in the connection's context;
+        neither is updated.
+        """
         try:
-            await self._set_auth_header()
-            return await self.statement_handler.submit_statement(query, attachments)
+            return await self.statement_handler.submit_statement(
+                query, attachments, Deadline(timeout), self._snapshot(context)
+            )
         except ApiException as err:
             map_error_response(err)
             raise
@@ -352,7 +622,6 @@ class APIConnection:
         self, statement_id: UUID, partition_id: int
     ) -> CPResultSet:
         try:
-            await self._set_auth_header()
             return await self.statement_handler.get_statement_status(
                 statement_id, partition_id
             )
@@ -362,8 +631,9 @@ class APIConnection:
 
     async def version(self) -> Dict[str, int]:
         try:
-            await self._set_auth_header()
-            version_response = self.statement_handler.api.get_version()
+            version_response = await self.statement_handler.authorized(
+                lambda auth: self.statement_handler.api.get_version(_request_auth=auth)
+            )
             return {
                 "major": version_response.major,
                 "minor": version_response.minor,
@@ -373,19 +643,93 @@ class APIConnection:
             map_error_response(err)
             raise
 
-    def _update_context(self, new_ctx: ResultSetContext) -> None:
+    async def warmup(
+        self,
+        connections: int = 2,
+        dataplane_urls: Sequence[str] = (),
+        heartbeat_interval: Optional[float] = 30.0,
+    ) -> None:
+        """Open keep-alive connections before the first statement is sent.
+
+        Opens ``connections`` connections to each controlplane endpoint and
+        to each of ``dataplane_urls``, tuned with
+        ``keepalive_socket_options()``. Unless
+        ``heartbeat_interval`` is ``None``, a background task then replaces
+        connections the servers have closed every ``heartbeat_interval``
+        seconds, and the dataplane hosts that later queries are routed to are
+        kept warm as well. ``close()`` stops the task.
+        """
+        rest_client = self.statement_handler.api.rest_client
+        if self.socket_options is None:
+            self.socket_options = keepalive_socket_options()
+            rest_client.configuration.socket_options = self.socket_options
+        self._warm_connections = connections
+        for url in self.router.urls if self.router else [self.server_url]:
+            self._warm_targets.setdefault(url, functools.partial(rest_client.warm, url))
+        for url in dataplane_urls:
+            dpconn = DPAPIConnection(
+                url,
+                "",
+                self.timezone,
+                http2=self.http2,
+                socket_options=self.socket_options,
+            )
+            self._warm_targets.setdefault(dpconn.server_url, dpconn.warm)
+
+        for result in await self._warm_all():
+            if isinstance(result, BaseException):
+                raise result
+        if heartbeat_interval is not None and self._heartbeat is None:
+            self._heartbeat = asyncio.ensure_future(self._keep_warm(heartbeat_interval))
+
+    async def _warm_all(self) -> List[Union[int, BaseException]]:
+        return await asyncio.gather(
+            *(warm(self._warm_connections) for warm in self._warm_targets.values()),
+            return_exceptions=True,
+        )
+
+    async def _keep_warm(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            # Hosts that cannot be reached are retried on the next heartbeat.
+            await self._warm_all()
+
+    async def close(self) -> None:
+        """Release the HTTP transport used by this connection."""
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            try:
+                await self._heartbeat
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat = None
+        if self.statement_handler.multiplexer is not None:
+            await self.statement_handler.multiplexer.close()
+        if self.polling.model is not None and self.polling.model.path is not None:
+            self.polling.model.save()
+        await self.statement_handler.api.close()
+
+    def _snapshot(self, context: Optional[ResultSetContext]) -> ResultSetContext:
+        # A copy, so statements still being submitted are not affected by
+        # context updates from others completing meanwhile.
+        return dataclasses.replace(context or self.rsctx)
+
+    def _update_context(
+        self, new_ctx: ResultSetContext, target: Optional[ResultSetContext] = None
+    ) -> None:
+        ctx = target or self.rsctx
         if new_ctx.organization_id:
-            self.rsctx.organization_id = new_ctx.organization_id
+            ctx.organization_id = new_ctx.organization_id
         if new_ctx.role_name:
-            self.rsctx.role_name = new_ctx.role_name
+            ctx.role_name = new_ctx.role_name
         if new_ctx.database_name:
-            self.rsctx.database_name = new_ctx.database_name
+            ctx.database_name = new_ctx.database_name
         if new_ctx.schema_name:
-            self.rsctx.schema_name = new_ctx.schema_name
+            ctx.schema_name = new_ctx.schema_name
         if new_ctx.store_name:
-            self.rsctx.store_name = new_ctx.store_name
+            ctx.store_name = new_ctx.store_name
         if hasattr(new_ctx, "compute_pool_name") and new_ctx.compute_pool_name:
-            self.rsctx.compute_pool_name = new_ctx.compute_pool_name
+            ctx.compute_pool_name = new_ctx.compute_pool_name
 
     def get_catalog_name(self) -> str:
         return self.catalog if self.catalog else ""
@@ -0,0 +1,85 @@
+"""End-to-end deadlines for connector calls.
+
+A ``Deadline`` is created once per user-facing call (``APIConnection.query``
+with ``timeout=``) and handed down to every request that call makes:
+submitting the statement, polling its status, fetching result set partitions
+and opening the result websocket. Each request gets the time that is left as
+its total timeout, so the call as a whole cannot overrun its budget no matter
+how many round trips it takes. Running out raises
+``deltastream.api.error.TimeoutError``.
+"""
+
+import asyncio
+import inspect
+import time
+from typing import Awaitable, Optional, TypeVar
+
+from .error import TimeoutError
+
+T = TypeVar("T")
+
+
+class Deadline:
+    """The point in time by which an operation has to finish.
+
+    :param timeout: seconds from now; ``None`` never expires.
+    """
+
+    def __init__(self, timeout: Optional[float]) -> None:
+        self.timeout = timeout
+        self.expires_at = None if timeout is None else time.monotonic() + timeout
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, or ``None`` without a deadline."""
+        if self.expires_at is None:
+            return None
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def expired(self) -> bool:
+        return self.remaining() == 0.0
+
+    def error(self) -> TimeoutError:
+        return TimeoutError(f"Deadline of {self.timeout}s exceeded")
+
+    def request_timeout(self) -> Optional[float]:
+        """Total timeout for the next request (``_request_timeout``).
+
+        Raises ``TimeoutError`` once the deadline has passed.
+        """
+        remaining = self.remaining()
+        if remaining == 0.0:
+            raise self.error()
+        return remaining
+
+    async def sleep(self, delay: float) -> None:
+        """Sleep between polls; raises ``TimeoutError`` if the deadline passes first."""
+        remaining = self.remaining()
+        if remaining is not None and remaining <= delay:
+            await asyncio.sleep(remaining)
+            raise self.error()
+        await asyncio.sleep(delay)
+
+    async def run(self, aw: Awaitable[T]) -> T:
+        """Await ``aw`` within the time left.
+
+        Only running out of time raises ``TimeoutError``; a timeout raised
+        by ``aw`` itself propagates unchanged.
+        """
+        remaining = self.remaining()
+        if remaining == 0.0:
+            if inspect.iscoroutine(aw):
+                # Never awaited; close it so it is not reported as leaked.
+                aw.close()
+            raise self.error()
+        timeout = asyncio.timeout(remaining)
+        try:
+            async with timeout:
+                return await aw
+        except asyncio.TimeoutError as e:
+            if timeout.expired():
+                raise self.error() from e
+            raise
+
+
+#: Default for calls made without a deadline.
+NO_DEADLINE = Deadline(None)
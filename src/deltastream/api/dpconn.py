@@ -1,20 +1,50 @@
-from typing import Optional
+from typing import Any, Callable, List, Optional, Tuple, TypeVar, Union
 from urllib.parse import urlparse, parse_qs
-import asyncio
+import functools
 from uuid import UUID
 
 from deltastream.api.dataplane.openapi_client import (
+    ApiClient,
     Configuration,
-    DataplaneApi,
     ResultSet,
     StatementStatus,
 )
-from .error import AuthenticationError, SQLError, SqlState
+from deltastream.api.dataplane.openapi_client.api_response import ApiResponse
+from .async_api import AsyncDataplaneApi
+from .deadline import NO_DEADLINE, Deadline
+from .jsonstream import ResultSetStream
+from .hedge import HedgePolicy
+from .polling import Pending, PollStats, PollStrategy, StatementPoller
+from .resolver import DNSCache
+from .retry import RetryPolicy
+from .singleflight import SingleFlight
+from .tls import ResumingSSLContext
+from .transport import AsyncRESTClientObject
+from .error import (
+    AuthenticationError,
+    PollCancelledError,
+    ServiceUnavailableError,
+    SQLError,
+    SqlState,
+    TimeoutError,
+)
+
+T = TypeVar("T")
 
 
 class DPAPIConnection:
     def __init__(
-        self, dsn: str, token: str, timezone: str, session_id: Optional[str] = None
+        self,
+        dsn: str,
+        token: str,
+        timezone: str,
+        session_id: Optional[str] = None,
+        http2: bool = False,
+        socket_options: Optional[List[Tuple[int, int, int]]] = None,
+        retry: Optional[RetryPolicy] = None,
+        hedge: Optional[HedgePolicy] = None,
+        polling: Optional[PollStrategy] = None,
+        status_flights: Optional[SingleFlight[ResultSet]] = None,
     ):
         if token is None:
             raise AuthenticationError("Invalid DSN: missing token")
@@ -24,7 +54,8 @@ class DPAPIConnection:
         self.session_id = session_id
 
         url = urlparse(dsn)
-        self.server_url = f"{url.scheme}://{url.hostname}{url.path}"
+        port = f":{url.port}" if url.port else ""
+        self.server_url = f"{url.scheme}://{url.hostname}{port}{url.path}"
 
         query_params = parse_qs(url.query)
         self.session_id = query_params.get("sessionID", [None])[0]
@@ -32,61 +63,172 @@ class DPAPIConnection:
         config = Configuration()
         config.host = self.server_url
         config.access_token = self.token
+        if socket_options is not None:
+            # The generated Configuration types this as always None.
+            config.socket_options = socket_options  # type: ignore[assignment]
 
-        self.api = DataplaneApi(config)
+        # Status and partition reads are retried; share the policy of the
+        # controlplane connection to share its retry budget.
+        self.retry = retry or RetryPolicy()
+        self.polling = polling or PollStrategy()
+        # A connection is created per query; share the group of the
+        # controlplane connection so that queries of one statement coalesce.
+        self.status_flights: SingleFlight[ResultSet] = status_flights or SingleFlight()
+        self.api = AsyncDataplaneApi(
+            ApiClient(config),
+            AsyncRESTClientObject(config, http2=http2),
+            self.retry,
+            hedge,
+        )
 
-    def _get_statement_status_api(self, statement_id: UUID, partition_id: int):
-        resp = self.api.get_statement_status(
-            statement_id=statement_id, partition_id=partition_id
+    async def _get_statement_status_api(
+        self, statement_id: UUID, partition_id: int, deadline: Deadline = NO_DEADLINE
+    ) -> ApiResponse[Any]:
+        return await self.api.get_statement_status_with_http_info(
+            statement_id=statement_id,
+            partition_id=partition_id,
+            _request_timeout=deadline.request_timeout(),
         )
-        return resp
+
+    async def close(self) -> None:
+        """Release the HTTP transport used by this connection."""
+        await self.api.close()
+
+    def ssl_context(self) -> ResumingSSLContext:
+        """The SSL context shared with other connections to the dataplane.
+
+        Websockets opened with it resume TLS sessions of the HTTP connections.
+        """
+        rest_client = self.api.rest_client
+        return rest_client.registry.ssl_context(rest_client.configuration)
+
+    def dns_cache(self) -> DNSCache:
+        """The DNS cache shared with other connections to the dataplane."""
+        return self.api.rest_client.registry.dns
+
+    async def warm(self, connections: int) -> int:
+        """Pre-open keep-alive connections to the dataplane host."""
+        return await self.api.rest_client.warm(self.server_url, connections)
 
     async def get_statement_status(
-        self, statement_id: UUID, partition_id: int
+        self, statement_id: UUID, partition_id: int, deadline: Deadline = NO_DEADLINE
     ) -> ResultSet:
-        try:
-            resp = self._get_statement_status_api(statement_id, partition_id)
-            if resp.status == 200:
-                result_set = resp.body
-                if result_set.sql_state == SqlState.SQL_STATE_SUCCESSFUL_COMPLETION:
-                    return result_set
-                raise SQLError(
-                    result_set.message or "",
-                    result_set.sql_state,
-                    result_set.statement_id,
-                )
-            elif resp.status == 202:
-                statement_status = StatementStatus.from_json(resp.raw.body)
-                await asyncio.sleep(1)
-                if statement_status is not None and hasattr(
-                    statement_status, "statement_id"
-                ):
-                    # Recurse, but always call the API again
-                    return await self.get_statement_status(
-                        statement_status.statement_id, partition_id
-                    )
-                else:
-                    raise SQLError(
-                        "Invalid statement status",
-                        "",
-                        UUID("00000000-0000-0000-0000-000000000000"),
-                    )
-            else:
-                result_set = resp.body
-                if result_set.sql_state == SqlState.SQL_STATE_SUCCESSFUL_COMPLETION:
-                    return result_set
-                raise SQLError(
-                    result_set.message or "",
-                    result_set.sql_state,
-                    result_set.statement_id,
-                )
+        """Wait for a statement and return the result set partition.
+
+        Concurrent calls for the same partition share one request and the
+        parsed ``ResultSet``. The shared request runs without a deadline; each
+        caller's ``deadline`` bounds only its own wait.
+        """
+        return await deadline.run(
+            self.status_flights.do(
+                (statement_id, partition_id),
+                functools.partial(
+                    self._get_statement_status, statement_id, partition_id, NO_DEADLINE
+                ),
+            )
+        )
+
+    def poller(
+        self,
+        statement_id: UUID,
+        partition_id: int = 0,
+        deadline: Deadline = NO_DEADLINE,
+    ) -> StatementPoller[ResultSet]:
+        """A poller that waits for the statement and returns the partition."""
+        return StatementPoller(
+            functools.partial(self._fetch_statement_status, deadline),
+            statement_id,
+            partition_id,
+            self.polling,
+            deadline,
+        )
+
+    async def _get_statement_status(
+        self, statement_id: UUID, partition_id: int, deadline: Deadline
+    ) -> ResultSet:
+        return await self._wait(self.poller(statement_id, partition_id, deadline))
 
+    async def _wait(self, poller: StatementPoller[T]) -> T:
+        try:
+            return await poller.wait()
+        except (TimeoutError, ServiceUnavailableError, PollCancelledError):
+            raise
         except Exception as exc:
             raise RuntimeError(str(exc))
 
-    async def wait_for_completion(self, statement_id: UUID) -> ResultSet:
-        result_set = await self.get_statement_status(statement_id, 0)
+    async def _fetch_statement_status(
+        self, deadline: Deadline, statement_id: UUID, partition_id: int
+    ) -> Union[ResultSet, Pending]:
+        resp = await self._get_statement_status_api(
+            statement_id, partition_id, deadline
+        )
+        if resp.status_code == 202:
+            statement_status = resp.data
+            if not isinstance(statement_status, StatementStatus):
+                raise SQLError(
+                    "Invalid statement status",
+                    "",
+                    UUID("00000000-0000-0000-0000-000000000000"),
+                )
+            return Pending(statement_status.statement_id, partition_id)
+        result_set = resp.data
         if result_set.sql_state == SqlState.SQL_STATE_SUCCESSFUL_COMPLETION:
             return result_set
-        await asyncio.sleep(1)  # Don't use return value
-        return await self.wait_for_completion(statement_id)
+        raise SQLError(
+            result_set.message or "",
+            result_set.sql_state,
+            result_set.statement_id,
+        )
+
+    async def stream_statement_status(
+        self, statement_id: UUID, partition_id: int, deadline: Deadline = NO_DEADLINE
+    ) -> ResultSetStream[ResultSet]:
+        """Like ``get_statement_status``, but rows are parsed as they download.
+
+        Not coalesced: each caller reads its own stream.
+        """
+        return await self._wait(
+            StatementPoller(
+                functools.partial(self._fetch_statement_stream, deadline),
+                statement_id,
+                partition_id,
+                self.polling,
+                deadline,
+            )
+        )
+
+    async def _fetch_statement_stream(
+        self, deadline: Deadline, statement_id: UUID, partition_id: int
+    ) -> Union[ResultSetStream[ResultSet], Pending]:
+        resp = await self.api.stream_statement_status(
+            statement_id=statement_id,
+            partition_id=partition_id,
+            _request_timeout=deadline.request_timeout(),
+        )
+        if isinstance(resp, StatementStatus):
+            return Pending(resp.statement_id, partition_id)
+        result_set = resp.result_set
+        if result_set.sql_state != SqlState.SQL_STATE_SUCCESSFUL_COMPLETION:
+            await resp.aclose()
+            raise SQLError(
+                result_set.message or "",
+                result_set.sql_state,
+                result_set.statement_id,
+            )
+        return resp
+
+    async def wait_for_completion(
+        self,
+        statement_id: UUID,
+        max_wait: Optional[float] = None,
+        on_progress: Optional[Callable[[PollStats], None]] = None,
+    ) -> ResultSet:
+        """Poll until the statement completes, for at most ``max_wait`` seconds.
+
+        ``on_progress`` is called with the wait's ``PollStats`` after every
+        poll that found the statement still running.
+        """
+        poller = self.poller(statement_id)
+        poller.max_wait = max_wait if max_wait is not None else poller.max_wait
+        poller.on_progress = on_progress
+        return await self._wait(poller)
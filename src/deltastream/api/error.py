@@ -32,6 +32,24 @@ class ServiceUnavailableError(Exception):
         self.name = "ServiceUnavailableError"
 
 
+class CircuitOpenError(ServiceUnavailableError):
+    """Raised without contacting an endpoint whose circuit breaker is open."""
+
+    def __init__(self, message: str, retry_in: float):
+        super().__init__(message)
+        self.name = "CircuitOpenError"
+        self.retry_in = retry_in
+
+
+class PollCancelledError(InterfaceError):
+    """Raised by a statement wait stopped with ``StatementPoller.cancel()``."""
+
+    def __init__(self, message: str, statement_id: UUID):
+        super().__init__(message)
+        self.name = "PollCancelledError"
+        self.statement_id = statement_id
+
+
 class SQLError(Exception):
     def __init__(self, message: str, code: str, statement_id: UUID):
         super().__init__(message)
@@ -1,5 +1,17 @@
-from typing import Optional, List, Union, Tuple
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Optional,
+    List,
+    TypeVar,
+    Union,
+    Tuple,
+)
+import functools
 import json
+import time
 from uuid import UUID
 from deltastream.api.controlplane.openapi_client.exceptions import ApiException
 from deltastream.api.controlplane.openapi_client.models import (
@@ -18,41 +30,116 @@ from .error import (
     ServiceUnavailableError,
     SQLError,
 )
-from deltastream.api.controlplane.openapi_client.api import DeltastreamApi
+from .async_api import AsyncDeltastreamApi
+from .deadline import NO_DEADLINE, Deadline
+from .jsonstream import ResultSetStream
+from .latency import fingerprint
 from .models import ResultSetContext
+from .multiplexer import StatusMultiplexer
+from .polling import Pending, PollStrategy, StatementPoller
+from .singleflight import SingleFlight
 from .blob import Blob
 from pydantic import ValidationError
-import asyncio
 from deltastream.api.error import SqlState
 
+T = TypeVar("T")
+
 
 class StatementHandler:
     def __init__(
         self,
-        api: DeltastreamApi,
+        api: AsyncDeltastreamApi,
         rsctx: ResultSetContext,
         session_id: Optional[str],
         timezone: str,
+        polling: Optional[PollStrategy] = None,
+        poll_rate: Optional[float] = None,
+        token: Optional[Callable[[], Awaitable[str]]] = None,
+        invalidate_token: Optional[Callable[[str], None]] = None,
     ):
         self.api = api
         self.rsctx = rsctx
+        # Each request carries its own token instead of the client's shared
+        # default headers, so concurrent calls cannot see each other's.
+        self.token = token
+        # Called with a token the server rejected, before trying once more.
+        self.invalidate_token = invalidate_token
         self.session_id = session_id
         self.timezone = timezone
+        self.polling = polling or PollStrategy()
+        # With a poll rate, all waits share one rate-capped poll loop.
+        self.multiplexer: Optional[StatusMultiplexer[ResultSet]] = (
+            StatusMultiplexer(self.polling, poll_rate) if poll_rate else None
+        )
+        self.status_flights: SingleFlight[ResultSet] = SingleFlight()
+
+    async def request_auth(self) -> Optional[Dict[str, Any]]:
+        """Auth for one request, or ``None`` to use the client's configuration."""
+        if self.token is None:
+            return None
+        return bearer_auth(await self.token())
+
+    async def authorized(
+        self,
+        call: Callable[[Optional[Dict[str, Any]]], Awaitable[T]],
+        idempotent: bool = True,
+    ) -> T:
+        """Make an API call with the request auth of ``request_auth``.
+
+        If the server rejects the token as invalid (401), the token is
+        invalidated and, for ``idempotent`` calls, the call is made once
+        more with a fresh one. A 403 (not permitted) is raised as is.
+        """
+        if self.token is None:
+            return await call(None)
+        token = await self.token()
+        try:
+            return await call(bearer_auth(token))
+        except ApiException as err:
+            if err.status != 401 or self.invalidate_token is None:
+                raise
+            self.invalidate_token(token)
+            if not idempotent:
+                raise
+        return await call(await self.request_auth())
 
     async def submit_statement(
-        self, query: str, attachments: Optional[List[Blob]] = None
+        self,
+        query: str,
+        attachments: Optional[List[Blob]] = None,
+        deadline: Deadline = NO_DEADLINE,
+        context: Optional[ResultSetContext] = None,
     ) -> ResultSet:
+        initial_response = await self.send_statement(
+            query, attachments, deadline, context
+        )
+        return await self.wait_for_statement(initial_response, deadline)
+
+    async def send_statement(
+        self,
+        query: str,
+        attachments: Optional[List[Blob]] = None,
+        deadline: Deadline = NO_DEADLINE,
+        context: Optional[ResultSetContext] = None,
+    ) -> Union[ResultSet, StatementStatus]:
+        """Submit a statement and return the server's first answer.
+
+        That is a ``ResultSet`` if the statement completed right away and a
+        ``StatementStatus`` if it was accepted and is still running. The
+        statement runs in ``context``, or in the handler's ``rsctx``.
+        """
+        ctx = context or self.rsctx
         try:
             statement_request = StatementRequest(
                 statement=query,
-                organization=str(self.rsctx.organization_id)
-                if self.rsctx.organization_id is not None
+                organization=str(ctx.organization_id)
+                if ctx.organization_id is not None
                 else None,
-                role=self.rsctx.role_name,
-                database=self.rsctx.database_name,
-                schema=self.rsctx.schema_name,
-                store=self.rsctx.store_name,
-                computePool=self.rsctx.compute_pool_name,
+                role=ctx.role_name,
+                database=ctx.database_name,
+                schema=ctx.schema_name,
+                store=ctx.store_name,
+                computePool=ctx.compute_pool_name,
                 parameters=StatementRequestParameters(
                     sessionID=self.session_id,
                     timezone=self.timezone,
@@ -70,79 +157,216 @@ class StatementHandler:
                 else None
             )
 
-            initial_response = self.api.submit_statement(
-                request=statement_request,
-                attachments=attachments_list,
-                _content_type="multipart/form-data",
+            submitted = time.monotonic()
+            initial_response = await self.authorized(
+                lambda auth: self.api.submit_statement(
+                    request=statement_request,
+                    attachments=attachments_list,
+                    _request_timeout=deadline.request_timeout(),
+                    _request_auth=auth,
+                    _content_type="multipart/form-data",
+                ),
+                # Never submit a statement twice.
+                idempotent=False,
             )
+            if not isinstance(initial_response, (ResultSet, StatementStatus)):
+                raise ValueError(
+                    f"Unexpected response type from submit_statement: {type(initial_response)}"
+                )
+            if (
+                self.polling.model is not None
+                and isinstance(initial_response, StatementStatus)
+                and not initial_response.statement_ids
+            ):
+                # Poll it around the time similar statements took.
+                self.polling.expect(
+                    initial_response.statement_id, fingerprint(query), submitted
+                )
+            return initial_response
+
+        except ValidationError:
+            raise
+        except ApiException as err:
+            map_error_response(err)
+            raise
+
+    async def wait_for_statement(
+        self,
+        initial_response: Union[ResultSet, StatementStatus],
+        deadline: Deadline = NO_DEADLINE,
+    ) -> ResultSet:
+        """Wait for a statement sent with ``send_statement`` to complete."""
+        try:
             if isinstance(initial_response, ResultSet):
                 result_set = initial_response
-            elif isinstance(initial_response, StatementStatus):
-                status_response = initial_response
-                result_set = await self.get_statement_status(
-                    statement_id=status_response.statement_id, partition_id=0
-                )
             else:
-                raise ValueError(
-                    f"Unexpected response type from submit_statement: {type(initial_response)}"
+                result_set = await self.get_statement_status(
+                    statement_id=initial_response.statement_id,
+                    partition_id=0,
+                    deadline=deadline,
                 )
 
             match result_set.sql_state:
                 case SqlState.SQL_STATE_SUCCESSFUL_COMPLETION:
                     return result_set
                 case SqlState.SQL_STATE_SQL_STATEMENT_NOT_YET_COMPLETE:
-                    return await self.get_resultset(result_set.statement_id, 0)
+                    return await self.get_resultset(
+                        result_set.statement_id, 0, deadline
+                    )
                 case _:
-                    from deltastream.api.error import SQLError
-
                     raise SQLError(
                         result_set.message or "No message provided",
                         result_set.sql_state,
                         result_set.statement_id,
                     )
 
-        except ValidationError:
-            raise
         except ApiException as err:
             map_error_response(err)
             raise
 
     async def get_statement_status(
-        self, statement_id: UUID, partition_id: int
+        self, statement_id: UUID, partition_id: int, deadline: Deadline = NO_DEADLINE
     ) -> ResultSet:
+        """Wait for a statement and return the result set partition.
+
+        Concurrent calls for the same partition share one request and the
+        parsed ``ResultSet``. The shared request runs without a deadline; each
+        caller's ``deadline`` bounds only its own wait.
+        """
+        return await deadline.run(
+            self.status_flights.do(
+                (statement_id, partition_id),
+                functools.partial(
+                    self._get_statement_status, statement_id, partition_id, NO_DEADLINE
+                ),
+            )
+        )
+
+    def poller(
+        self,
+        statement_id: UUID,
+        partition_id: int = 0,
+        deadline: Deadline = NO_DEADLINE,
+    ) -> StatementPoller[ResultSet]:
+        """A poller that waits for the statement and returns the partition."""
+        return StatementPoller(
+            functools.partial(self._fetch_statement_status, deadline),
+            statement_id,
+            partition_id,
+            self.polling,
+            deadline,
+        )
+
+    async def _get_statement_status(
+        self, statement_id: UUID, partition_id: int, deadline: Deadline
+    ) -> ResultSet:
+        if self.multiplexer is not None:
+            return await self.multiplexer.wait(
+                functools.partial(self._fetch_statement_status, deadline),
+                statement_id,
+                partition_id,
+            )
+        return await self.poller(statement_id, partition_id, deadline).wait()
+
+    async def _fetch_statement_status(
+        self, deadline: Deadline, statement_id: UUID, partition_id: int
+    ) -> Union[ResultSet, Pending]:
         try:
-            result_set = self.api.get_statement_status(
-                statement_id=statement_id,
-                session_id=self.session_id,
-                partition_id=partition_id,
+            result_set = await self.authorized(
+                lambda auth: self.api.get_statement_status(
+                    statement_id=statement_id,
+                    session_id=self.session_id,
+                    partition_id=partition_id,
+                    _request_timeout=deadline.request_timeout(),
+                    _request_auth=auth,
+                )
             )
+        except ApiException as err:
+            map_error_response(err)
+            raise
 
-            match result_set.sql_state:
-                case SqlState.SQL_STATE_SUCCESSFUL_COMPLETION:
-                    return result_set
-                case SqlState.SQL_STATE_SQL_STATEMENT_NOT_YET_COMPLETE:
-                    await asyncio.sleep(1)
-                    return await self.get_statement_status(result_set.statement_id, 0)
-                case _:
-                    raise SQLError(
-                        result_set.message or "No message provided",
-                        result_set.sql_state,
-                        result_set.statement_id,
-                    )
+        match result_set.sql_state:
+            case SqlState.SQL_STATE_SUCCESSFUL_COMPLETION if isinstance(
+                result_set, ResultSet
+            ):
+                return result_set
+            case (
+                SqlState.SQL_STATE_SUCCESSFUL_COMPLETION
+                | SqlState.SQL_STATE_SQL_STATEMENT_NOT_YET_COMPLETE
+            ):
+                # A 202 StatementStatus carries no result set yet.
+                return Pending(result_set.statement_id, partition_id)
+            case _:
+                raise SQLError(
+                    result_set.message or "No message provided",
+                    result_set.sql_state,
+                    result_set.statement_id,
+                )
+
+    async def stream_statement_status(
+        self, statement_id: UUID, partition_id: int, deadline: Deadline = NO_DEADLINE
+    ) -> ResultSetStream[ResultSet]:
+        """Like ``get_statement_status``, but rows are parsed as they download.
 
+        Not coalesced: each caller reads its own stream.
+        """
+        poller: StatementPoller[ResultSetStream[ResultSet]] = StatementPoller(
+            functools.partial(self._fetch_statement_stream, deadline),
+            statement_id,
+            partition_id,
+            self.polling,
+            deadline,
+        )
+        return await poller.wait()
+
+    async def _fetch_statement_stream(
+        self, deadline: Deadline, statement_id: UUID, partition_id: int
+    ) -> Union[ResultSetStream[ResultSet], Pending]:
+        try:
+            resp = await self.authorized(
+                lambda auth: self.api.stream_statement_status(
+                    statement_id=statement_id,
+                    session_id=self.session_id,
+                    partition_id=partition_id,
+                    _request_timeout=deadline.request_timeout(),
+                    _request_auth=auth,
+                )
+            )
         except ApiException as err:
             map_error_response(err)
             raise
-        except Exception as e:
-            raise e
+        if isinstance(resp, StatementStatus):
+            if resp.sql_state not in (
+                SqlState.SQL_STATE_SUCCESSFUL_COMPLETION,
+                SqlState.SQL_STATE_SQL_STATEMENT_NOT_YET_COMPLETE,
+            ):
+                raise SQLError(
+                    resp.message or "No message provided",
+                    resp.sql_state,
+                    resp.statement_id,
+                )
+            return Pending(resp.statement_id, partition_id)
+        result_set = resp.result_set
+        if result_set.sql_state != SqlState.SQL_STATE_SUCCESSFUL_COMPLETION:
+            await resp.aclose()
+            raise SQLError(
+                result_set.message or "No message provided",
+                result_set.sql_state,
+                result_set.statement_id,
+            )
+        return resp
 
-    async def get_resultset(self, statement_id: UUID, partition_id: int) -> ResultSet:
-        initial_response = await self.get_statement_status(statement_id, partition_id)
+    async def get_resultset(
+        self, statement_id: UUID, partition_id: int, deadline: Deadline = NO_DEADLINE
+    ) -> ResultSet:
+        initial_response = await self.get_statement_status(
+            statement_id, partition_id, deadline
+        )
         result = initial_response
 
         if initial_response.metadata.dataplane_request:
             status_response = await self.get_statement_status(
-                statement_id, partition_id
+                statement_id, partition_id, deadline
             )
             final_result = status_response
             return final_result
@@ -150,6 +374,16 @@ class StatementHandler:
         return result
 
 
+def bearer_auth(token: str) -> Dict[str, Any]:
+    """A ``_request_auth`` that sends ``token`` as a bearer token."""
+    return {
+        "in": "header",
+        "type": "bearer",
+        "key": "Authorization",
+        "value": f"Bearer {token}",
+    }
+
+
 def map_error_response(err: ApiException) -> None:
     """Map API exceptions to appropriate error types."""
     try:
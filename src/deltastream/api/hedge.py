@@ -0,0 +1,173 @@
+"""Hedged status and partition fetches.
+
+Iterating a ``ResultsetRows`` is as slow as its slowest partition fetch, and
+the occasional fetch takes far longer than the rest. ``HedgePolicy`` sends a
+duplicate of a fetch that has not completed within a percentile of recent
+latencies, returns whichever finishes first and cancels the other. Hedges
+are drawn from a budget so they add at most a small share of extra load.
+Only idempotent reads are hedged.
+"""
+
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, TypeVar
+
+from .retry import RetryBudget
+
+T = TypeVar("T")
+
+
+@dataclass
+class HedgeStats:
+    """Requests made under a ``HedgePolicy`` and how their hedges fared."""
+
+    requests: int = 0
+    #: Requests that were duplicated.
+    hedged: int = 0
+    #: Hedged requests answered first by the duplicate.
+    wins: int = 0
+
+    @property
+    def win_rate(self) -> float:
+        """Share of hedges that beat the original request."""
+        if not self.hedged:
+            return 0.0
+        return self.wins / self.hedged
+
+    def reset(self) -> None:
+        self.requests = 0
+        self.hedged = 0
+        self.wins = 0
+
+
+class HedgePolicy:
+    """Duplicate slow idempotent requests.
+
+    :param percentile: latency percentile (0-1) after which a request is
+        hedged.
+    :param window: number of recent latencies the percentile is taken over.
+    :param min_samples: latencies to collect before hedging starts.
+    :param min_delay: lower bound of the hedging delay in seconds.
+    :param budget: share of requests that may be hedged; 5% plus a burst of
+        5 by default.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 0.95,
+        window: int = 200,
+        min_samples: int = 20,
+        min_delay: float = 0.005,
+        budget: Optional[RetryBudget] = None,
+    ) -> None:
+        if not 0 < percentile < 1:
+            raise ValueError("percentile must be between 0 and 1")
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.budget = budget or RetryBudget(ratio=0.05, max_tokens=5.0)
+        self.stats = HedgeStats()
+        self._latencies: Deque[float] = deque(maxlen=window)
+
+    def record(self, latency: float) -> None:
+        """Add the latency of a completed request."""
+        self._latencies.append(latency)
+
+    def delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or ``None`` while still learning."""
+        if len(self._latencies) < self.min_samples:
+            return None
+        latencies = sorted(self._latencies)
+        index = min(int(self.percentile * len(latencies)), len(latencies) - 1)
+        return max(latencies[index], self.min_delay)
+
+    async def run(
+        self,
+        call: Callable[[], Awaitable[T]],
+        discard: Optional[Callable[[T], None]] = None,
+    ) -> T:
+        """Await ``call()``, hedged with a second ``call()`` if it is slow.
+
+        The first successful result is returned; an error is raised only when
+        every attempt failed. ``discard`` releases the result of an attempt
+        that completed but lost the race.
+        """
+        self.stats.requests += 1
+        self.budget.deposit()
+        started: Dict["asyncio.Future[T]", float] = {}
+        finished: Dict["asyncio.Future[T]", float] = {}
+
+        def attempt() -> "asyncio.Future[T]":
+            task = asyncio.ensure_future(call())
+            started[task] = time.monotonic()
+            task.add_done_callback(lambda t: finished.setdefault(t, time.monotonic()))
+            return task
+
+        primary = attempt()
+        tasks: List["asyncio.Future[T]"] = [primary]
+        winner: Optional["asyncio.Future[T]"] = None
+        try:
+            delay = self.delay()
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done and self.budget.withdraw():
+                    self.stats.hedged += 1
+                    tasks.append(attempt())
+
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    error = task.exception()
+                    if error is None:
+                        winner = task
+                        break
+                if winner is not None:
+                    break
+            if winner is None:
+                assert error is not None
+                raise error
+            if winner is not primary:
+                self.stats.wins += 1
+            self._record_attempts(tasks, winner, started, finished)
+            return winner.result()
+        finally:
+            await self._cancel_losers(tasks, winner, discard)
+
+    def _record_attempts(
+        self,
+        tasks: List["asyncio.Future[T]"],
+        winner: "asyncio.Future[T]",
+        started: Dict["asyncio.Future[T]", float],
+        finished: Dict["asyncio.Future[T]", float],
+    ) -> None:
+        # The caller waited from the primary's start. Timing a winning hedge
+        # from its own start would hide the slow primary and drag the
+        # percentile, and with it the hedging delay, down.
+        self.record(finished[winner] - started[tasks[0]])
+        for task in tasks:
+            if (
+                task is not winner
+                and task in finished
+                and not task.cancelled()
+                and task.exception() is None
+            ):
+                self.record(finished[task] - started[task])
+
+    @staticmethod
+    async def _cancel_losers(
+        tasks: List["asyncio.Future[T]"],
+        winner: Optional["asyncio.Future[T]"],
+        discard: Optional[Callable[[T], None]],
+    ) -> None:
+        losers = [task for task in tasks if task is not winner]
+        for task in losers:
+            task.cancel()
+        for result in await asyncio.gather(*losers, return_exceptions=True):
+            if discard is not None and not isinstance(result, BaseException):
+                discard(result)
@@ -0,0 +1,587 @@
+"""Opt-in HTTP/2 transport built on the ``h2`` protocol state machine.
+
+HTTP/1.1 needs one connection per in-flight request, so bursts of small
+``get_statement_status`` calls either open many sockets or queue behind
+``connection_pool_maxsize``. ``HTTP2Pool`` keeps a single connection per
+origin instead and multiplexes concurrent requests over it as streams.
+
+Install the optional dependency with ``pip install deltastream-connector[http2]``.
+"""
+
+import asyncio
+from dataclasses import dataclass
+from http import HTTPStatus
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+try:
+    import h2.config
+    import h2.connection
+    import h2.events
+    import h2.exceptions
+    import h2.settings
+    from h2.errors import ErrorCodes
+except ImportError as e:  # pragma: no cover - exercised without the extra
+    raise ImportError(
+        "HTTP/2 support requires the 'h2' package; install it with "
+        "`pip install deltastream-connector[http2]`."
+    ) from e
+
+from urllib3._collections import HTTPHeaderDict
+
+from .resolver import DNSCache, shared_dns_cache
+from .tls import record_handshake, save_session
+from .transport import (
+    _DEFAULT_PORTS,
+    AsyncRESTResponse,
+    HTTP2NotNegotiated,
+    Timeout,
+    _apply_socket_options,
+    _wait,
+)
+
+# Connection-specific headers are not allowed in HTTP/2 (RFC 9113 8.2.2).
+_HOP_BY_HOP = {
+    "connection",
+    "host",
+    "keep-alive",
+    "proxy-connection",
+    "te",
+    "transfer-encoding",
+    "upgrade",
+}
+_READ_CHUNK_SIZE = 64 * 1024
+
+
+@dataclass(frozen=True)
+class HTTP2Settings:
+    """Flow-control settings advertised to the server.
+
+    :param initial_window_size: receive window of each stream, in bytes. Large
+        result set partitions stream without waiting on WINDOW_UPDATE round
+        trips as long as they fit in this window.
+    :param connection_window_size: receive window shared by all streams of a
+        connection, in bytes.
+    :param max_frame_size: largest DATA frame the server may send, in bytes.
+    :param max_header_list_size: largest response header block accepted.
+    """
+
+    initial_window_size: int = 4 * 1024 * 1024
+    connection_window_size: int = 16 * 1024 * 1024
+    max_frame_size: int = 64 * 1024
+    max_header_list_size: int = 64 * 1024
+
+
+_StreamItem = Union[Tuple[bytes, int], BaseException, None]
+
+
+class _Unprocessed(ConnectionResetError):
+    """The server did not process the stream, so it may be sent again."""
+
+
+class _Stream:
+    def __init__(self, stream_id: int) -> None:
+        self.stream_id = stream_id
+        self.response: "asyncio.Future[Tuple[int, HTTPHeaderDict]]" = (
+            asyncio.get_running_loop().create_future()
+        )
+        self.body: "asyncio.Queue[_StreamItem]" = asyncio.Queue()
+        self.ended = False
+
+    def fail(self, exc: BaseException) -> None:
+        if not self.response.done():
+            self.response.set_exception(exc)
+            # Nobody may ever await it, e.g. when the request was cancelled.
+            self.response.exception()
+        self.body.put_nowait(exc)
+
+
+class HTTP2Connection:
+    """A single HTTP/2 connection multiplexing concurrent requests."""
+
+    def __init__(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        settings: HTTP2Settings,
+    ) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.idle_since = 0.0
+        self._h2 = h2.connection.H2Connection(
+            h2.config.H2Configuration(client_side=True, header_encoding=None)
+        )
+        self._h2.local_settings = h2.settings.Settings(
+            client=True,
+            initial_values={
+                h2.settings.SettingCodes.ENABLE_PUSH: 0,
+                h2.settings.SettingCodes.INITIAL_WINDOW_SIZE: (
+                    settings.initial_window_size
+                ),
+                h2.settings.SettingCodes.MAX_FRAME_SIZE: settings.max_frame_size,
+                h2.settings.SettingCodes.MAX_HEADER_LIST_SIZE: (
+                    settings.max_header_list_size
+                ),
+            },
+        )
+        # Settings given as initial values are not renegotiated, so apply
+        # their inbound limits now rather than on the SETTINGS ACK.
+        self._h2.max_inbound_frame_size = settings.max_frame_size
+        self._h2.decoder.max_header_list_size = settings.max_header_list_size
+        self._settings = settings
+        self._streams: Dict[int, _Stream] = {}
+        self._closed = False
+        self._goaway = False
+        # Set whenever flow-control windows grow or streams close.
+        self._changed = asyncio.Event()
+        self._read_task: Optional["asyncio.Task[None]"] = None
+
+    @property
+    def num_streams(self) -> int:
+        return len(self._streams)
+
+    def is_available(self) -> bool:
+        """Whether new requests may be opened on this connection."""
+        return not (self._closed or self._goaway or self.writer.is_closing())
+
+    async def start(self) -> None:
+        self._h2.initiate_connection()
+        window_delta = self._settings.connection_window_size - 65535
+        if window_delta > 0:
+            self._h2.increment_flow_control_window(window_delta)
+        self._flush()
+        await self.writer.drain()
+        self.idle_since = asyncio.get_running_loop().time()
+        self._read_task = asyncio.get_running_loop().create_task(self._read_loop())
+
+    async def request(
+        self,
+        method: str,
+        scheme: str,
+        authority: str,
+        target: str,
+        headers: Dict[str, str],
+        payload: Optional[bytes],
+        timeout: Timeout,
+    ) -> Tuple[_Stream, int, HTTPHeaderDict]:
+        await self._wait_until(self._stream_available)
+        stream_id = self._h2.get_next_available_stream_id()
+        stream = _Stream(stream_id)
+        self._streams[stream_id] = stream
+
+        request_headers: List[Tuple[str, str]] = [
+            (":method", method),
+            (":scheme", scheme),
+            (":authority", authority),
+            (":path", target),
+        ]
+        request_headers.extend(
+            (k.lower(), str(v))
+            for k, v in headers.items()
+            if v is not None and k.lower() not in _HOP_BY_HOP
+        )
+        if payload is not None:
+            request_headers.append(("content-length", str(len(payload))))
+
+        try:
+            self._h2.send_headers(stream_id, request_headers, end_stream=not payload)
+            self._flush()
+            if payload:
+                await self._send_body(stream_id, payload)
+            await self.writer.drain()
+            status, response_headers = await _wait(stream.response, timeout.read)
+        except BaseException:
+            self.reset(stream)
+            raise
+        return stream, status, response_headers
+
+    def acknowledge(self, stream: _Stream, size: int) -> None:
+        """Return ``size`` consumed bytes to the stream and connection windows."""
+        if size and not self._closed:
+            self._h2.acknowledge_received_data(size, stream.stream_id)
+            self._flush()
+
+    def reset(self, stream: _Stream) -> None:
+        """Cancel ``stream`` unless the server has already finished it."""
+        if self._forget(stream.stream_id) is None:
+            return
+        if not stream.ended and not self._closed:
+            try:
+                self._h2.reset_stream(stream.stream_id, ErrorCodes.CANCEL)
+                self._flush()
+            except h2.exceptions.StreamClosedError:
+                pass
+
+    def finish(self, stream: _Stream) -> None:
+        """Forget a stream whose response was read to the end."""
+        self._forget(stream.stream_id)
+
+    def close(self) -> None:
+        if not self._closed:
+            try:
+                self._h2.close_connection()
+                self._flush()
+            except (h2.exceptions.ProtocolError, RuntimeError):
+                pass
+        self._terminate(ConnectionResetError("HTTP/2 connection closed"))
+        if self._read_task is not None:
+            self._read_task.cancel()
+
+    def _forget(self, stream_id: int) -> Optional[_Stream]:
+        stream = self._streams.pop(stream_id, None)
+        if stream is not None:
+            if not self._streams:
+                self.idle_since = asyncio.get_running_loop().time()
+            self._changed.set()
+        return stream
+
+    def _stream_available(self) -> bool:
+        if not self.is_available():
+            raise _Unprocessed("HTTP/2 connection is no longer usable")
+        limit = self._h2.remote_settings.max_concurrent_streams
+        return self._h2.open_outbound_streams < limit
+
+    async def _wait_until(self, ready: Any) -> None:
+        while not ready():
+            self._changed.clear()
+            await self._changed.wait()
+
+    async def _send_body(self, stream_id: int, payload: bytes) -> None:
+        view = memoryview(payload)
+        while view:
+            await self._wait_until(
+                lambda: self._send_window(stream_id) > 0 or self._closed
+            )
+            if self._closed:
+                raise ConnectionResetError("HTTP/2 connection closed")
+            size = min(
+                self._send_window(stream_id),
+                self._h2.max_outbound_frame_size,
+                len(view),
+            )
+            self._h2.send_data(stream_id, bytes(view[:size]))
+            view = view[size:]
+            self._flush()
+            await self.writer.drain()
+        self._h2.end_stream(stream_id)
+        self._flush()
+
+    def _send_window(self, stream_id: int) -> int:
+        return self._h2.local_flow_control_window(stream_id)
+
+    def _flush(self) -> None:
+        data = self._h2.data_to_send()
+        if data:
+            self.writer.write(data)
+
+    async def _read_loop(self) -> None:
+        exc: BaseException = ConnectionResetError("HTTP/2 connection closed")
+        try:
+            while True:
+                data = await self.reader.read(_READ_CHUNK_SIZE)
+                if not data:
+                    break
+                for event in self._h2.receive_data(data):
+                    self._dispatch(event)
+                self._flush()
+        except asyncio.CancelledError:
+            raise
+        except (ConnectionError, h2.exceptions.ProtocolError) as e:
+            exc = e
+        finally:
+            self._terminate(exc)
+            self.writer.close()
+
+    def _dispatch(self, event: Any) -> None:
+        if isinstance(event, h2.events.ResponseReceived):
+            stream = self._streams.get(event.stream_id)
+            if stream is not None and not stream.response.done():
+                stream.response.set_result(_decode_headers(event.headers))
+        elif isinstance(event, h2.events.DataReceived):
+            stream = self._streams.get(event.stream_id)
+            if stream is None:
+                # Cancelled stream; keep the connection window open.
+                self._h2.acknowledge_received_data(
+                    event.flow_controlled_length, event.stream_id
+                )
+            else:
+                stream.body.put_nowait((event.data, event.flow_controlled_length))
+        elif isinstance(event, h2.events.StreamEnded):
+            stream = self._streams.get(event.stream_id)
+            if stream is not None:
+                stream.ended = True
+                stream.body.put_nowait(None)
+            self._changed.set()
+        elif isinstance(event, h2.events.StreamReset):
+            stream = self._forget(event.stream_id)
+            if stream is not None:
+                stream.ended = True
+                error = (
+                    _Unprocessed
+                    if event.error_code == ErrorCodes.REFUSED_STREAM
+                    else ConnectionResetError
+                )
+                stream.fail(
+                    error(f"HTTP/2 stream reset by server: {event.error_code!r}")
+                )
+            self._changed.set()
+        elif isinstance(event, h2.events.ConnectionTerminated):
+            self._goaway = True
+            last_stream_id = event.last_stream_id or 0
+            for stream_id, stream in list(self._streams.items()):
+                if stream_id > last_stream_id:
+                    # Never processed by the server; safe to retry elsewhere.
+                    self._forget(stream_id)
+                    stream.fail(_Unprocessed("HTTP/2 GOAWAY received"))
+            self._changed.set()
+        elif isinstance(
+            event, (h2.events.WindowUpdated, h2.events.RemoteSettingsChanged)
+        ):
+            self._changed.set()
+
+    def _terminate(self, exc: BaseException) -> None:
+        self._closed = True
+        for stream in self._streams.values():
+            if not stream.ended:
+                stream.fail(exc)
+        self._streams.clear()
+        self._changed.set()
+
+
+def _decode_headers(
+    raw_headers: List[Tuple[bytes, bytes]],
+) -> Tuple[int, HTTPHeaderDict]:
+    status = 0
+    headers = HTTPHeaderDict()
+    for name, value in raw_headers:
+        if name == b":status":
+            status = int(value)
+        elif not name.startswith(b":"):
+            headers.add(name.decode("latin-1"), value.decode("latin-1"))
+    return status, headers
+
+
+class HTTP2Response(AsyncRESTResponse):
+    """Response to a request sent as an HTTP/2 stream."""
+
+    def __init__(
+        self,
+        status: int,
+        headers: HTTPHeaderDict,
+        connection: HTTP2Connection,
+        stream: _Stream,
+        pool: "HTTP2Pool",
+        method: str,
+        timeout: Timeout,
+        deadline: Optional[float],
+    ) -> None:
+        try:
+            reason = HTTPStatus(status).phrase
+        except ValueError:
+            reason = ""
+        super().__init__(status, reason, headers, None, None, method, timeout, deadline)
+        self._connection: Optional[HTTP2Connection] = connection
+        self._stream = stream
+        self._h2_pool = pool
+
+    async def _raw_stream(self) -> AsyncGenerator[bytes, None]:
+        connection = self._connection
+        if connection is None:
+            return
+        try:
+            while True:
+                item = await _wait(self._stream.body.get(), self._read_timeout())
+                if item is None:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                data, flow_controlled_length = item
+                connection.acknowledge(self._stream, flow_controlled_length)
+                if data:
+                    yield data
+            self._body_read = True
+            connection.finish(self._stream)
+        finally:
+            self.release()
+
+    def release(self) -> None:
+        """Finish the stream, cancelling it if the body was not fully read."""
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            connection.reset(self._stream)
+            self._h2_pool.release(connection)
+        self._run_release_callbacks()
+
+
+class HTTP2Pool:
+    """One multiplexed HTTP/2 connection to a single origin.
+
+    The connection is opened on first use and replaced once the server closes
+    it or sends GOAWAY. For ``https`` origins the protocol is negotiated with
+    ALPN; when the server does not select ``h2``, ``negotiated`` becomes
+    ``False`` and ``HTTP2NotNegotiated`` tells the caller to use HTTP/1.1.
+    Plain ``http`` origins are spoken to with prior knowledge (h2c).
+    """
+
+    def __init__(
+        self,
+        scheme: str,
+        host: str,
+        port: int,
+        ssl_context: Any,
+        server_hostname: Optional[str],
+        settings: HTTP2Settings,
+        socket_options: Optional[List[Tuple[int, int, int]]] = None,
+        idle_timeout: Optional[float] = None,
+        resolver: Optional[DNSCache] = None,
+    ) -> None:
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.ssl_context = ssl_context
+        self.server_hostname = server_hostname
+        self.resolver = resolver or shared_dns_cache()
+        self.settings = settings
+        self.socket_options = socket_options
+        self.idle_timeout = idle_timeout
+        self.negotiated: Optional[bool] = None
+        self.connections_opened = 0
+        self.streams_opened = 0
+        self.last_used = 0.0
+        self.min_idle = 0
+        self._connection: Optional[HTTP2Connection] = None
+        self._connect_lock = asyncio.Lock()
+
+    @property
+    def num_idle(self) -> int:
+        conn = self._connection
+        return int(conn is not None and conn.is_available() and not conn.num_streams)
+
+    @property
+    def num_in_use(self) -> int:
+        return self._connection.num_streams if self._connection else 0
+
+    @property
+    def authority(self) -> str:
+        if self.port == _DEFAULT_PORTS[self.scheme]:
+            return self.host
+        return f"{self.host}:{self.port}"
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        headers: Dict[str, str],
+        payload: Optional[bytes],
+        timeout: Timeout,
+        deadline: Optional[float],
+    ) -> HTTP2Response:
+        parts = urlsplit(url)
+        target = parts.path or "/"
+        if parts.query:
+            target += "?" + parts.query
+
+        retried = False
+        while True:
+            connection = await self._get_connection(timeout.connect)
+            self.streams_opened += 1
+            self.last_used = asyncio.get_running_loop().time()
+            try:
+                stream, status, response_headers = await connection.request(
+                    method,
+                    self.scheme,
+                    self.authority,
+                    target,
+                    headers,
+                    payload,
+                    timeout,
+                )
+            except _Unprocessed:
+                if retried:
+                    raise
+                # The server refused the stream or drained the connection
+                # (GOAWAY) before processing it; retry once. Other failures
+                # may come after the request took effect and are raised.
+                retried = True
+                continue
+            return HTTP2Response(
+                status,
+                response_headers,
+                connection,
+                stream,
+                self,
+                method,
+                timeout,
+                deadline,
+            )
+
+    def release(self, connection: HTTP2Connection) -> None:
+        self.last_used = asyncio.get_running_loop().time()
+        save_session(connection.writer.get_extra_info("ssl_object"))
+
+    async def warm(self, timeout: Optional[float] = None) -> int:
+        """Open the connection ahead of the first request and keep it open.
+
+        Returns the number of connections opened (0 or 1).
+        """
+        self.min_idle = 1
+        opened = self.connections_opened
+        await self._get_connection(timeout)
+        self.last_used = asyncio.get_running_loop().time()
+        return self.connections_opened - opened
+
+    def evict_idle(self) -> None:
+        """Close the connection once it has carried no streams for ``idle_timeout``."""
+        conn = self._connection
+        if conn is None or self.idle_timeout is None or conn.num_streams:
+            return
+        if self.min_idle:
+            return
+        if conn.idle_since <= asyncio.get_running_loop().time() - self.idle_timeout:
+            conn.close()
+            self._connection = None
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    async def _get_connection(self, timeout: Optional[float]) -> HTTP2Connection:
+        self.evict_idle()
+        conn = self._connection
+        if conn is not None and conn.is_available():
+            return conn
+        async with self._connect_lock:
+            conn = self._connection
+            if conn is not None and conn.is_available():
+                return conn
+            if self.negotiated is False:
+                raise HTTP2NotNegotiated(self.authority)
+            conn = await _wait(self._connect(), timeout)
+            self._connection = conn
+            self.connections_opened += 1
+            return conn
+
+    async def _connect(self) -> HTTP2Connection:
+        reader, writer = await self.resolver.connect(
+            self.host,
+            self.port,
+            lambda address: asyncio.open_connection(
+                address,
+                self.port,
+                ssl=self.ssl_context,
+                server_hostname=self.server_hostname if self.ssl_context else None,
+            ),
+        )
+        if self.ssl_context is not None:
+            ssl_object = writer.get_extra_info("ssl_object")
+            record_handshake(ssl_object)
+            if ssl_object is None or ssl_object.selected_alpn_protocol() != "h2":
+                self.negotiated = False
+                writer.close()
+                raise HTTP2NotNegotiated(self.authority)
+        self.negotiated = True
+        _apply_socket_options(writer, self.socket_options)
+        conn = HTTP2Connection(reader, writer, self.settings)
+        await conn.start()
+        return conn
@@ -0,0 +1,248 @@
+"""Incremental parsing of ``ResultSet`` response bodies.
+
+``ApiClient.response_deserialize`` needs the whole body in memory, decoded
+to text and then to Python objects, before a single pydantic model is
+built. For large partitions that costs several times the partition size in
+memory, and no row is available until the last byte arrives.
+
+``ResultSetParser`` is a push parser for the ``ResultSet`` document. It
+decodes the top-level members (``sqlState``, ``metadata``, ...) as soon as
+each one is complete and hands out the rows of ``data`` one at a time.
+``ResultSetStream`` drives it from a streaming HTTP response.
+"""
+
+import codecs
+import json
+from collections import deque
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Callable,
+    Deque,
+    Dict,
+    Generic,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+from .transport import AsyncRESTResponse
+
+_WHITESPACE = " \t\r\n"
+_ROWS_KEY = "data"
+
+# Parser states
+_START = "start"
+_KEY_OR_END = "key_or_end"
+_KEY = "key"
+_COLON = "colon"
+_VALUE = "value"
+_ROWS_START = "rows_start"
+_ROW_OR_END = "row_or_end"
+_ROW = "row"
+_ROW_SEP = "row_sep"
+_MEMBER_SEP = "member_sep"
+_DONE = "done"
+
+
+class ResultSetParser:
+    """Push parser for a ``ResultSet`` JSON document.
+
+    Call ``feed()`` with body bytes as they arrive; it returns the rows of
+    ``data`` completed by that chunk. Every other top-level member ends up in
+    ``fields`` once it has been fully received.
+    """
+
+    def __init__(self) -> None:
+        self.fields: Dict[str, Any] = {}
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        self._state = _START
+        self._key: Optional[str] = None
+
+    @property
+    def done(self) -> bool:
+        """Whether the whole document has been parsed."""
+        return self._state == _DONE
+
+    @property
+    def in_rows(self) -> bool:
+        """Whether the parser is inside the ``data`` array."""
+        return self._state in (_ROW_OR_END, _ROW, _ROW_SEP)
+
+    def feed(self, data: bytes, final: bool = False) -> List[List[Any]]:
+        """Parse ``data`` and return the rows it completed.
+
+        Pass ``final=True`` with the last chunk; a document that is still
+        incomplete then raises ``json.JSONDecodeError``.
+        """
+        self._buf = self._buf[self._pos :] + self._utf8.decode(data, final)
+        self._pos = 0
+        rows: List[List[Any]] = []
+        while self._step(rows, final):
+            pass
+        if final and self._state != _DONE:
+            raise json.JSONDecodeError(
+                "Incomplete result set document", self._buf, self._pos
+            )
+        return rows
+
+    def _step(self, rows: List[List[Any]], final: bool) -> bool:
+        """Advance by one token; return ``False`` when more input is needed."""
+        self._skip_whitespace()
+        if self._pos >= len(self._buf):
+            return False
+        state, char = self._state, self._buf[self._pos]
+
+        if state == _START:
+            self._expect(char, "{")
+            self._state = _KEY_OR_END
+        elif state in (_KEY_OR_END, _KEY):
+            if char == "}" and state == _KEY_OR_END:
+                self._pos += 1
+                self._state = _DONE
+                return True
+            complete, key = self._decode(final, scalar=False)
+            if not complete:
+                return False
+            if not isinstance(key, str):
+                raise self._error("Expecting property name")
+            self._key = key
+            self._state = _COLON
+        elif state == _COLON:
+            self._expect(char, ":")
+            self._state = _ROWS_START if self._key == _ROWS_KEY else _VALUE
+        elif state == _ROWS_START and char == "[":
+            self._pos += 1
+            self._state = _ROW_OR_END
+        elif state in (_VALUE, _ROWS_START):
+            complete, value = self._decode(final, scalar=True)
+            if not complete:
+                return False
+            assert self._key is not None
+            self.fields[self._key] = value
+            self._state = _MEMBER_SEP
+        elif state in (_ROW_OR_END, _ROW):
+            if char == "]" and state == _ROW_OR_END:
+                self._pos += 1
+                self._state = _MEMBER_SEP
+                return True
+            complete, row = self._decode(final, scalar=False)
+            if not complete:
+                return False
+            if not isinstance(row, list):
+                raise self._error("Expecting result set row")
+            rows.append(row)
+            self._state = _ROW_SEP
+        elif state == _ROW_SEP:
+            self._expect(char, ",]")
+            self._state = _ROW if char == "," else _MEMBER_SEP
+        elif state == _MEMBER_SEP:
+            self._expect(char, ",}")
+            self._state = _KEY if char == "," else _DONE
+        else:
+            raise self._error("Extra data")
+        return True
+
+    def _decode(self, final: bool, scalar: bool) -> Tuple[bool, Any]:
+        """Decode the next JSON value; ``(False, None)`` if it is incomplete."""
+        try:
+            value, end = self._decoder.raw_decode(self._buf, self._pos)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            return False, None
+        if scalar and end == len(self._buf) and not final:
+            # A number at the end of the buffer may continue in the next chunk.
+            return False, None
+        self._pos = end
+        return True, value
+
+    def _skip_whitespace(self) -> None:
+        while self._pos < len(self._buf) and self._buf[self._pos] in _WHITESPACE:
+            self._pos += 1
+
+    def _expect(self, char: str, allowed: str) -> None:
+        if char not in allowed:
+            raise self._error(f"Expecting one of {allowed!r}")
+        self._pos += 1
+
+    def _error(self, msg: str) -> json.JSONDecodeError:
+        return json.JSONDecodeError(msg, self._buf, self._pos)
+
+
+T = TypeVar("T")
+
+
+class ResultSetStream(Generic[T]):
+    """A ``ResultSet`` whose rows are parsed while the body is downloading.
+
+    ``result_set`` holds every member except ``data`` (which is left unset);
+    iterate ``rows()`` to receive the rows as lists of plain JSON values, in
+    the same shape ``castRowData`` accepts from the websocket path.
+    """
+
+    def __init__(
+        self,
+        result_set: T,
+        parser: ResultSetParser,
+        chunks: AsyncGenerator[bytes, None],
+        pending: Deque[List[Any]],
+    ) -> None:
+        self.result_set = result_set
+        self._parser = parser
+        self._chunks = chunks
+        self._pending = pending
+
+    @classmethod
+    async def open(
+        cls,
+        response: AsyncRESTResponse,
+        from_dict: Callable[[Dict[str, Any]], Optional[T]],
+    ) -> "ResultSetStream[T]":
+        """Read ``response`` up to the start of the rows and build the header model.
+
+        :param from_dict: builds the model, e.g. ``ResultSet.from_dict``.
+
+        ``metadata`` is normally sent before ``data``; when it is not, rows are
+        buffered until it arrives.
+        """
+        parser = ResultSetParser()
+        chunks = response.stream()
+        pending: Deque[List[Any]] = deque()
+        try:
+            while not parser.done and not (
+                parser.in_rows and "metadata" in parser.fields
+            ):
+                chunk = await anext(chunks, None)
+                pending.extend(parser.feed(chunk or b"", final=chunk is None))
+            result_set = from_dict(parser.fields)
+            if result_set is None:
+                raise ValueError("Empty result set document")
+        except BaseException:
+            await chunks.aclose()
+            raise
+        return cls(result_set, parser, chunks, pending)
+
+    async def rows(self) -> AsyncIterator[List[Any]]:
+        """Yield the rows of ``data`` as they are parsed."""
+        try:
+            while True:
+                while self._pending:
+                    yield self._pending.popleft()
+                if self._parser.done:
+                    return
+                chunk = await anext(self._chunks, None)
+                self._pending.extend(
+                    self._parser.feed(chunk or b"", final=chunk is None)
+                )
+        finally:
+            await self.aclose()
+
+    async def aclose(self) -> None:
+        """Stop reading the body and release its connection."""
+        await self._chunks.aclose()
@@ -0,0 +1,143 @@
+"""Expected statement latency, learned from earlier runs of similar statements.
+
+Many statements are repetitive: the same ``DESCRIBE``, ``LIST`` or ``CREATE
+STREAM`` shapes with different names and literals. A blind backoff polls
+them as if nothing were known about them. ``LatencyModel`` keeps the recent
+latencies of each statement fingerprint, i.e. the statement with literals
+and comments removed, so that ``PollStrategy`` can hold off the first poll
+until shortly before the statement is expected to complete and poll closely
+around that time.
+
+The model lives in memory and keeps the most recently used fingerprints,
+up to ``max_keys``; given a ``path`` it is loaded from and saved to a JSON
+file, so that it survives restarts.
+"""
+
+import json
+import os
+import re
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Deque, List, Optional, OrderedDict as OrderedDictType
+
+_COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r"\b\d+(?:\.\d+)?\b")
+# Digit runs inside identifiers, e.g. ``t_20260101`` or ``foo_123``.
+_DIGITS = re.compile(r"\d+")
+_SPACE = re.compile(r"\s+")
+_WORD = re.compile(r"[a-z_]+")
+
+
+def fingerprint(sql: str) -> str:
+    """Normalize a statement so that runs differing only in literals match.
+
+    Comments are dropped, string and number literals become ``?``, digit
+    runs in names become ``#``, and case and whitespace are normalized.
+    """
+    sql = _COMMENTS.sub(" ", sql)
+    sql = _STRINGS.sub("?", sql)
+    sql = _NUMBERS.sub("?", sql)
+    sql = _DIGITS.sub("#", sql)
+    return _SPACE.sub(" ", sql).strip().rstrip(";").strip().lower()
+
+
+def kind(fingerprint: str) -> str:
+    """The leading keywords of a fingerprint, e.g. ``create stream``."""
+    words = []
+    for token in fingerprint.split(" ")[:2]:
+        if not _WORD.fullmatch(token):
+            break
+        words.append(token)
+    return " ".join(words)
+
+
+@dataclass(frozen=True)
+class Estimate:
+    """When a statement is expected to complete, in seconds after submission."""
+
+    #: Most runs took at least this long (10th percentile).
+    low: float
+    median: float
+    #: Most runs completed within this (90th percentile).
+    high: float
+    samples: int
+
+
+class LatencyModel:
+    """Recent latencies per statement fingerprint.
+
+    :param samples: latencies kept per fingerprint.
+    :param min_samples: latencies needed before an estimate is made.
+    :param path: JSON file the model is loaded from and saved to.
+    :param max_keys: fingerprints kept; the least recently used go first.
+    """
+
+    def __init__(
+        self,
+        samples: int = 32,
+        min_samples: int = 3,
+        path: Optional[str] = None,
+        max_keys: int = 1024,
+    ) -> None:
+        self.samples = samples
+        self.min_samples = min_samples
+        self.path = path
+        self.max_keys = max_keys
+        self._latencies: OrderedDictType[str, Deque[float]] = OrderedDict()
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def record(self, fingerprint: str, seconds: float) -> None:
+        """Record that a statement with ``fingerprint`` took ``seconds``."""
+        # Statements of the same kind stand in for fingerprints not seen yet.
+        for key in (fingerprint, f"kind:{kind(fingerprint)}"):
+            latencies = self._latencies.get(key)
+            if latencies is None:
+                latencies = self._latencies[key] = deque(maxlen=self.samples)
+            else:
+                self._latencies.move_to_end(key)
+            latencies.append(max(seconds, 0.0))
+        while len(self._latencies) > self.max_keys:
+            self._latencies.popitem(last=False)
+
+    def estimate(self, fingerprint: str) -> Optional[Estimate]:
+        """The expected latency of ``fingerprint``, or ``None`` if unknown."""
+        for key in (fingerprint, f"kind:{kind(fingerprint)}"):
+            latencies = self._latencies.get(key)
+            if latencies is not None and len(latencies) >= self.min_samples:
+                self._latencies.move_to_end(key)
+                ordered = sorted(latencies)
+                return Estimate(
+                    _quantile(ordered, 0.1),
+                    _quantile(ordered, 0.5),
+                    _quantile(ordered, 0.9),
+                    len(ordered),
+                )
+        return None
+
+    def load(self) -> None:
+        """Replace the model with the one saved at ``path``."""
+        if self.path is None:
+            raise ValueError("LatencyModel has no path")
+        with open(self.path) as f:
+            saved = json.load(f)
+        # Saved least recently used first.
+        self._latencies = OrderedDict(
+            (key, deque(latencies, maxlen=self.samples))
+            for key, latencies in list(saved.items())[-self.max_keys :]
+        )
+
+    def save(self) -> None:
+        """Write the model to ``path``."""
+        if self.path is None:
+            raise ValueError("LatencyModel has no path")
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({k: list(v) for k, v in self._latencies.items()}, f)
+        # Atomic, so a crash never leaves a truncated model behind.
+        os.replace(tmp, self.path)
+
+
+def _quantile(ordered: List[float], q: float) -> float:
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
@@ -0,0 +1,184 @@
+"""Client-side rate limiting and adaptive concurrency control.
+
+A batch job that fires thousands of ``exec`` calls at once overloads the
+controlplane, which answers with ``503``. ``RequestLimiter`` holds requests
+back on the client instead: a ``TokenBucket`` caps the request rate and an
+``AIMDLimiter`` caps the number of requests in flight. The concurrency limit
+grows additively while requests succeed and is cut multiplicatively when the
+server signals overload (``408``, ``429`` or ``503``, which
+``map_error_response`` turns into ``TimeoutError`` and
+``ServiceUnavailableError``), so throughput settles just below what the
+server sustains.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Deque, FrozenSet, Optional
+
+#: Statuses that mean the server is overloaded.
+OVERLOAD_STATUSES: FrozenSet[int] = frozenset({408, 429, 503})
+
+
+class TokenBucket:
+    """Allow ``rate`` acquisitions per second, in bursts of up to ``burst``."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = max(burst if burst is not None else rate, 1.0)
+        self.tokens = self.burst
+        self.waiting = 0
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Wait for a token; waiters are served in arrival order."""
+        self.waiting += 1
+        try:
+            async with self._lock:
+                self._refill()
+                if self.tokens < 1.0:
+                    await asyncio.sleep((1.0 - self.tokens) / self.rate)
+                    self._refill()
+                self.tokens -= 1.0
+        finally:
+            self.waiting -= 1
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.tokens + (now - self._updated) * self.rate, self.burst)
+        self._updated = now
+
+
+class AIMDLimiter:
+    """Concurrency limit adjusted by additive increase, multiplicative decrease.
+
+    Each successful request raises the limit by ``1 / limit``, i.e. by one per
+    limit's worth of requests; an overloaded request multiplies it by
+    ``backoff``. Overload reported by requests that started before the last
+    decrease is ignored, so a burst of failures cuts the limit only once.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 8,
+        min_limit: int = 1,
+        max_limit: int = 256,
+        backoff: float = 0.5,
+    ) -> None:
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.in_flight = 0
+        self._limit = float(min(max(initial_limit, min_limit), max_limit))
+        self._epoch = 0
+        self._waiters: Deque["asyncio.Future[None]"] = deque()
+
+    @property
+    def limit(self) -> int:
+        """Requests currently allowed in flight."""
+        return int(self._limit)
+
+    @property
+    def queue_depth(self) -> int:
+        """Requests waiting for a slot."""
+        return sum(1 for waiter in self._waiters if not waiter.done())
+
+    async def acquire(self) -> int:
+        """Wait for a slot; returns the ticket to ``release`` it with."""
+        if self.in_flight >= self.limit or self.queue_depth:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # Woken up, but cancelled before taking the slot.
+                    self.in_flight -= 1
+                    self._wake()
+                raise
+        else:
+            self.in_flight += 1
+        return self._epoch
+
+    def release(self, ticket: int, overloaded: Optional[bool]) -> None:
+        """Give the slot back and adjust the limit.
+
+        ``overloaded`` is ``None`` when the request failed without telling
+        anything about the server's load.
+        """
+        self.in_flight -= 1
+        if overloaded:
+            if ticket == self._epoch:
+                self._limit = max(self._limit * self.backoff, self.min_limit)
+                self._epoch += 1
+        elif overloaded is not None:
+            self._limit = min(self._limit + 1 / self._limit, self.max_limit)
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+
+class RequestLimiter:
+    """Rate and concurrency limits for the requests of one connection.
+
+    :param rate: requests per second; unlimited when ``None``.
+    :param burst: requests that may be sent at once after a quiet period;
+        defaults to one second's worth.
+    :param concurrency: adaptive limit on requests in flight; unlimited when
+        ``None``.
+    """
+
+    def __init__(
+        self,
+        rate: Optional[float] = None,
+        burst: Optional[float] = None,
+        concurrency: Optional[AIMDLimiter] = None,
+    ) -> None:
+        self.bucket = TokenBucket(rate, burst) if rate is not None else None
+        self.concurrency = concurrency
+        self._in_flight = 0
+
+    @property
+    def limit(self) -> Optional[int]:
+        """Requests allowed in flight, or ``None`` if unlimited."""
+        if self.concurrency is None:
+            return None
+        return self.concurrency.limit
+
+    @property
+    def in_flight(self) -> int:
+        if self.concurrency is None:
+            return self._in_flight
+        return self.concurrency.in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        """Requests held back by either limit."""
+        waiting = self.bucket.waiting if self.bucket is not None else 0
+        if self.concurrency is not None:
+            waiting += self.concurrency.queue_depth
+        return waiting
+
+    async def acquire(self) -> int:
+        if self.bucket is not None:
+            await self.bucket.acquire()
+        if self.concurrency is None:
+            self._in_flight += 1
+            return 0
+        return await self.concurrency.acquire()
+
+    def release(self, ticket: int, status: Optional[int]) -> None:
+        """Release a request that got ``status``, or ``None`` if it failed."""
+        if self.concurrency is None:
+            self._in_flight -= 1
+            return
+        overloaded = None if status is None else status in OVERLOAD_STATUSES
+        self.concurrency.release(ticket, overloaded)
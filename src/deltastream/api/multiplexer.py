@@ -0,0 +1,215 @@
+"""One poll loop for every statement a connection is waiting for.
+
+With hundreds of concurrent ``exec`` calls, each waiting coroutine used to
+run its own poll loop and sleep timer, so poll traffic grew with the number
+of waiters. ``StatusMultiplexer`` keeps the pending statements in a single
+schedule and polls them from one loop, under a global rate cap and a cap on
+polls in flight. Each statement is due according to the ``PollStrategy``
+backoff; when more polls are due than the caps allow, the one that has been
+due longest goes first, and among equally due ones the oldest wait. A
+waiter's future is resolved as soon as a poll finds its statement complete.
+
+A wait is bounded by the strategy's ``max_wait`` and reports progress like a
+``StatementPoller``; cancelling the waiting task takes the statement out of
+the schedule.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from dataclasses import dataclass, field
+from typing import (
+    Awaitable,
+    Callable,
+    Generic,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+)
+from uuid import UUID
+
+from .error import SQLError, TimeoutError
+from .limiter import TokenBucket
+from .polling import Pending, PollStats, PollStrategy
+
+T = TypeVar("T")
+
+
+@dataclass
+class _Entry(Generic[T]):
+    fetch: Callable[[UUID, int], Awaitable[Union[T, Pending]]]
+    statement_id: UUID
+    partition_id: int
+    future: "asyncio.Future[T]"
+    stats: PollStats
+    max_wait: Optional[float] = None
+    on_progress: Optional[Callable[[PollStats], None]] = None
+    poll: Optional["asyncio.Future[None]"] = field(default=None, repr=False)
+
+
+class StatusMultiplexer(Generic[T]):
+    """Poll all pending statements of a connection from a single loop.
+
+    :param strategy: backoff that decides when each statement is due.
+    :param rate: polls per second across all statements.
+    :param max_in_flight: polls that may be awaiting a response at once.
+    """
+
+    def __init__(
+        self, strategy: PollStrategy, rate: float = 50.0, max_in_flight: int = 16
+    ) -> None:
+        self.strategy = strategy
+        self.rate = rate
+        self.max_in_flight = max_in_flight
+        #: Polls sent.
+        self.polls = 0
+        #: Statements being waited for.
+        self.pending = 0
+        self._order = itertools.count()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._runner: Optional["asyncio.Future[None]"] = None
+
+    def _reset(self, loop: asyncio.AbstractEventLoop) -> None:
+        # The schedule, timers and poll tasks belong to one event loop.
+        self._loop = loop
+        self.bucket = TokenBucket(self.rate)
+        self._schedule: List[Tuple[float, float, int, _Entry[T]]] = []
+        self._in_flight: Set["asyncio.Future[None]"] = set()
+        self._wakeup = asyncio.Event()
+        self._runner = None
+
+    async def wait(
+        self,
+        fetch: Callable[[UUID, int], Awaitable[Union[T, Pending]]],
+        statement_id: UUID,
+        partition_id: int,
+        max_wait: Optional[float] = None,
+        on_progress: Optional[Callable[[PollStats], None]] = None,
+    ) -> T:
+        """Wait until ``fetch`` stops returning ``Pending`` for the statement.
+
+        ``fetch``, ``max_wait`` and ``on_progress`` are as for
+        ``StatementPoller``. The first poll is due immediately, or at the
+        strategy's ``first_delay`` for statements with a latency estimate.
+        """
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._reset(loop)
+        entry = _Entry(
+            fetch,
+            statement_id,
+            partition_id,
+            loop.create_future(),
+            self.strategy.begin(statement_id),
+            max_wait if max_wait is not None else self.strategy.max_wait,
+            on_progress,
+        )
+        self._push(entry, time.monotonic() + self.strategy.first_delay(entry.stats))
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.ensure_future(self._run())
+        self.pending += 1
+        try:
+            return await entry.future
+        finally:
+            self.pending -= 1
+            # Cancelled waiters drop out of the schedule; stop their poll.
+            if entry.poll is not None and not entry.poll.done():
+                entry.poll.cancel()
+
+    async def close(self) -> None:
+        """Stop the poll loop; waiters still pending are cancelled."""
+        if self._loop is None:
+            return
+        if self._runner is not None:
+            self._runner.cancel()
+            await asyncio.gather(self._runner, return_exceptions=True)
+            self._runner = None
+        for task in list(self._in_flight):
+            task.cancel()
+        await asyncio.gather(*self._in_flight, return_exceptions=True)
+        for *_, entry in self._schedule:
+            entry.future.cancel()
+        self._schedule.clear()
+
+    def _push(self, entry: _Entry[T], due: float) -> None:
+        # Ties on the due time go to the wait that started first.
+        heapq.heappush(
+            self._schedule, (due, entry.stats.started, next(self._order), entry)
+        )
+        if self._schedule[0][3] is entry:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while self._schedule or self._in_flight:
+            if not self._schedule:
+                await self._sleep(None)
+                continue
+            due, *_, entry = self._schedule[0]
+            if entry.future.done():
+                heapq.heappop(self._schedule)
+                continue
+            delay = due - time.monotonic()
+            if delay > 0:
+                await self._sleep(delay)
+                continue
+            if len(self._in_flight) >= self.max_in_flight:
+                await asyncio.wait(self._in_flight, return_when=asyncio.FIRST_COMPLETED)
+                continue
+            await self.bucket.acquire()
+            heapq.heappop(self._schedule)
+            if entry.future.done():
+                continue
+            self.polls += 1
+            entry.poll = poll = asyncio.ensure_future(self._poll(entry))
+            self._in_flight.add(poll)
+            poll.add_done_callback(self._poll_done)
+
+    def _poll_done(self, poll: "asyncio.Future[None]") -> None:
+        self._in_flight.discard(poll)
+        self._wakeup.set()
+
+    async def _sleep(self, delay: Optional[float]) -> None:
+        """Sleep until ``delay`` passes or the schedule changes."""
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _poll(self, entry: _Entry[T]) -> None:
+        try:
+            outcome = await entry.fetch(entry.statement_id, entry.partition_id)
+        except Exception as exc:
+            if isinstance(exc, SQLError):
+                self.strategy.completed(entry.stats, failed=True)
+            if not entry.future.done():
+                entry.future.set_exception(exc)
+            return
+        if entry.future.done():
+            return
+        if isinstance(outcome, Pending):
+            entry.statement_id = outcome.statement_id
+            entry.partition_id = outcome.partition_id
+            delay = self.strategy.pending(entry.stats)
+            try:
+                if entry.on_progress is not None:
+                    entry.on_progress(entry.stats)
+                if (
+                    entry.max_wait is not None
+                    and time.monotonic() - entry.stats.started + delay > entry.max_wait
+                ):
+                    raise TimeoutError(
+                        f"Statement {entry.statement_id} did not complete "
+                        f"within {entry.max_wait}s"
+                    )
+            except Exception as exc:
+                entry.future.set_exception(exc)
+                return
+            self._push(entry, time.monotonic() + delay)
+        else:
+            self.strategy.completed(entry.stats)
+            entry.future.set_result(outcome)
@@ -0,0 +1,291 @@
+"""Waiting for statements: backoff between status polls and the poll loop.
+
+A statement that is still running is polled until it completes. Sleeping a
+fixed second between polls adds up to a second of latency to every short
+statement and spends many requests on long ones. ``PollStrategy`` starts
+with a short delay and grows it geometrically up to a cap, so short
+statements are picked up within tens of milliseconds and long ones are
+polled at most once per ``max_delay``.
+
+With a ``LatencyModel``, statements that resemble earlier ones are not
+polled blindly: the first poll waits until shortly before the statement is
+expected to complete, and polls are closely spaced until the time most
+earlier runs had completed by. After that the backoff resumes.
+
+Each wait for a statement is recorded in a ``PollStats``: the number of
+polls, the time spent waiting and the overshoot, i.e. how long the
+completion may have gone unnoticed. The statement finished at some point
+during the last delay, so the overshoot is at most that delay.
+
+``StatementPoller`` runs the poll loop iteratively, so a statement that takes
+minutes to provision holds a single coroutine and a fixed amount of state. A
+wait can be bounded by ``max_wait``, reports progress after each pending
+poll and can be cancelled on its own with ``cancel()``, without cancelling
+the task that waits. Cancelling only stops the wait: the API has no way to
+abort a statement, so it keeps running on the server.
+"""
+
+import asyncio
+import functools
+import random
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Deque,
+    Generic,
+    List,
+    OrderedDict as OrderedDictType,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+)
+from uuid import UUID
+
+from .deadline import NO_DEADLINE, Deadline
+from .error import PollCancelledError, SQLError, TimeoutError
+from .latency import Estimate, LatencyModel
+
+T = TypeVar("T")
+S = TypeVar("S")
+
+
+@dataclass
+class PollStats:
+    """Polls made while waiting for one statement."""
+
+    statement_id: str
+    polls: int = 0
+    #: Seconds from the first poll until completion was seen.
+    elapsed: float = 0.0
+    #: Upper bound of the seconds between completion and its detection;
+    #: ``None`` while the statement is still pending.
+    overshoot: Optional[float] = None
+    started: float = field(default_factory=time.monotonic, repr=False)
+    last_delay: float = field(default=0.0, repr=False)
+    #: Fingerprint of the statement, if its latency is being learned.
+    fingerprint: Optional[str] = None
+    #: Expected completion the polls were scheduled around.
+    estimate: Optional[Estimate] = None
+
+    @property
+    def done(self) -> bool:
+        return self.overshoot is not None
+
+
+class PollStrategy:
+    """Geometric backoff between polls of a pending statement.
+
+    :param initial_delay: seconds before the second poll.
+    :param multiplier: factor the delay grows by after each pending poll.
+    :param max_delay: cap on the delay between polls.
+    :param jitter: relative random spread of each delay, so that many
+        statements submitted together are not polled in lockstep.
+    :param history: number of waits kept in ``history``.
+    :param max_wait: default bound in seconds on a ``StatementPoller`` wait.
+    :param model: latencies of earlier statements to schedule polls around;
+        statements are registered with ``expect``.
+    """
+
+    def __init__(
+        self,
+        initial_delay: float = 0.025,
+        multiplier: float = 2.0,
+        max_delay: float = 1.0,
+        jitter: float = 0.1,
+        history: int = 256,
+        max_wait: Optional[float] = None,
+        model: Optional[LatencyModel] = None,
+    ) -> None:
+        if initial_delay <= 0 or max_delay < initial_delay:
+            raise ValueError("delays must satisfy 0 < initial_delay <= max_delay")
+        if multiplier < 1:
+            raise ValueError("multiplier must be at least 1")
+        self.initial_delay = initial_delay
+        self.multiplier = multiplier
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.max_wait = max_wait
+        self.model = model
+        self._history: Deque[PollStats] = deque(maxlen=history)
+        # Submitted statements not waited for yet: ID -> (fingerprint, time).
+        self._expected: OrderedDictType[str, Tuple[str, float]] = OrderedDict()
+
+    @property
+    def history(self) -> List[PollStats]:
+        """Stats of the most recent waits, oldest first."""
+        return list(self._history)
+
+    def delay(self, polls: int) -> float:
+        """Seconds to wait after the ``polls``-th poll found the statement pending."""
+        delay = self.initial_delay * self.multiplier ** max(polls - 1, 0)
+        delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        return min(delay, self.max_delay)
+
+    def expect(self, statement_id: object, fingerprint: str, submitted: float) -> None:
+        """Register a statement submitted at ``submitted`` (monotonic time).
+
+        Its wait is then scheduled with the model's estimate for
+        ``fingerprint``, and its latency is recorded when it completes.
+        """
+        if self.model is None:
+            return
+        self._expected[str(statement_id)] = (fingerprint, submitted)
+        # Statements that are never waited for must not pile up.
+        while len(self._expected) > (self._history.maxlen or 0):
+            self._expected.popitem(last=False)
+
+    def begin(self, statement_id: object) -> PollStats:
+        """Start recording the polls of a wait for ``statement_id``."""
+        stats = PollStats(str(statement_id))
+        expected = self._expected.pop(stats.statement_id, None)
+        if expected is not None and self.model is not None:
+            stats.fingerprint, stats.started = expected
+            stats.estimate = self.model.estimate(stats.fingerprint)
+        self._history.append(stats)
+        return stats
+
+    def first_delay(self, stats: PollStats) -> float:
+        """Seconds before the first poll.
+
+        None for a blind wait; with an estimate, until the time most earlier
+        runs took at least.
+        """
+        if stats.estimate is None:
+            return 0.0
+        stats.last_delay = max(
+            stats.estimate.low - (time.monotonic() - stats.started), 0.0
+        )
+        return stats.last_delay
+
+    def pending(self, stats: PollStats) -> float:
+        """Record a poll that found the statement running; returns the delay."""
+        stats.polls += 1
+        stats.last_delay = self._next_delay(stats)
+        return stats.last_delay
+
+    def completed(self, stats: PollStats, failed: bool = False) -> None:
+        """Record the poll that found the statement complete (or failed)."""
+        stats.polls += 1
+        stats.elapsed = time.monotonic() - stats.started
+        stats.overshoot = stats.last_delay
+        if self.model is not None and stats.fingerprint is not None and not failed:
+            # It completed at some point during the last delay; take the middle.
+            self.model.record(stats.fingerprint, stats.elapsed - stats.overshoot / 2)
+
+    def _next_delay(self, stats: PollStats) -> float:
+        estimate = stats.estimate
+        if estimate is not None:
+            remaining = estimate.high - (time.monotonic() - stats.started)
+            if remaining > 0:
+                # Within the expected window: a few polls across its width.
+                step = (estimate.high - estimate.low) / 4
+                return min(max(step, self.initial_delay), self.max_delay)
+        return self.delay(stats.polls)
+
+
+@dataclass(frozen=True)
+class Pending:
+    """What a poller's fetch returns while the statement is still running."""
+
+    statement_id: UUID
+    partition_id: int
+
+
+class StatementPoller(Generic[T]):
+    """Poll a statement until ``fetch`` returns something other than ``Pending``.
+
+    :param fetch: makes one status request for a statement and partition;
+        returns the result, ``Pending`` with the next statement and partition
+        to poll, or raises (``SQLError`` for a failed statement).
+    :param max_wait: seconds after which the wait raises ``TimeoutError``;
+        the strategy's ``max_wait`` by default.
+    :param on_progress: called with the wait's ``PollStats`` after every
+        poll that found the statement pending.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[UUID, int], Awaitable[Union[T, Pending]]],
+        statement_id: UUID,
+        partition_id: int,
+        strategy: PollStrategy,
+        deadline: Deadline = NO_DEADLINE,
+        max_wait: Optional[float] = None,
+        on_progress: Optional[Callable[[PollStats], None]] = None,
+    ) -> None:
+        self.fetch = fetch
+        self.statement_id = statement_id
+        self.partition_id = partition_id
+        self.strategy = strategy
+        self.deadline = deadline
+        self.max_wait = max_wait if max_wait is not None else strategy.max_wait
+        self.on_progress = on_progress
+        self.stats: Optional[PollStats] = None
+        self._cancelled = False
+        self._step: Optional["asyncio.Future[Any]"] = None
+
+    def cancel(self) -> None:
+        """Stop the wait; ``wait()`` raises ``PollCancelledError``.
+
+        The statement itself keeps running on the server.
+        """
+        self._cancelled = True
+        if self._step is not None:
+            self._step.cancel()
+
+    async def wait(self) -> T:
+        """Poll until the statement completes and return the result."""
+        self.stats = stats = self.strategy.begin(self.statement_id)
+        delay = self.strategy.first_delay(stats)
+        if delay > 0:
+            await self._run_step(functools.partial(self.deadline.sleep, delay))
+        while True:
+            try:
+                outcome = await self._run_step(
+                    functools.partial(self.fetch, self.statement_id, self.partition_id)
+                )
+            except SQLError:
+                self.strategy.completed(stats, failed=True)
+                raise
+            if not isinstance(outcome, Pending):
+                self.strategy.completed(stats)
+                return outcome
+            self.statement_id = outcome.statement_id
+            self.partition_id = outcome.partition_id
+            delay = self.strategy.pending(stats)
+            if self.on_progress is not None:
+                self.on_progress(stats)
+            if (
+                self.max_wait is not None
+                and time.monotonic() - stats.started + delay > self.max_wait
+            ):
+                raise TimeoutError(
+                    f"Statement {self.statement_id} did not complete "
+                    f"within {self.max_wait}s"
+                )
+            await self._run_step(functools.partial(self.deadline.sleep, delay))
+
+    async def _run_step(self, step_fn: Callable[[], Awaitable[S]]) -> S:
+        """Run one request or sleep so that ``cancel()`` can interrupt it."""
+        if self._cancelled:
+            raise self._cancelled_error()
+        self._step = step = asyncio.ensure_future(step_fn())
+        try:
+            return await step
+        except asyncio.CancelledError:
+            task = asyncio.current_task()
+            if self._cancelled and not (task is not None and task.cancelling()):
+                raise self._cancelled_error() from None
+            raise
+        finally:
+            self._step = None
+
+    def _cancelled_error(self) -> PollCancelledError:
+        return PollCancelledError(
+            f"Wait for statement {self.statement_id} was cancelled", self.statement_id
+        )
@@ -0,0 +1,322 @@
+"""A bounded, shared pool of ``APIConnection`` objects.
+
+A web tier that builds an ``APIConnection`` per request, or caches a few in
+globals, either opens more connections than the controlplane needs under
+bursty load or shares them without bounds. ``APIConnectionPool`` keeps
+between ``min_size`` and ``max_size`` connections. Callers wait up to
+``acquire_timeout`` for one to be free. Connections idle for longer than
+``idle_timeout`` are closed, down to ``min_size``, by a background task
+started with ``open()``. Connections idle for
+longer than ``check_after`` are checked with ``version()`` before they are
+handed out, and replaced if the check fails. On release, a connection's
+context is reset to the one it was created with, so a ``USE DATABASE`` in
+one request does not leak into the next.
+"""
+
+import asyncio
+import contextlib
+import dataclasses
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+
+from .conn import APIConnection
+from .error import InterfaceError, TimeoutError
+from .models import ResultSetContext
+
+#: Upper bounds in seconds of the ``wait_time`` histogram buckets.
+WAIT_TIME_BUCKETS: Tuple[float, ...] = (
+    0.001,
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.5,
+    1.0,
+    5.0,
+    float("inf"),
+)
+
+
+@dataclass
+class Histogram:
+    """Counts of observations per bucket, with their total."""
+
+    bounds: Tuple[float, ...] = WAIT_TIME_BUCKETS
+    #: Observations at most each bound and above the previous one.
+    counts: List[int] = field(default_factory=list)
+    count: int = 0
+    total: float = 0.0
+
+    def __post_init__(self) -> None:
+        if not self.counts:
+            self.counts = [0] * len(self.bounds)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[i] += 1
+                return
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """``(bound, observations at most bound)`` for each bucket."""
+        pairs, seen = [], 0
+        for bound, count in zip(self.bounds, self.counts, strict=True):
+            seen += count
+            pairs.append((bound, seen))
+        return pairs
+
+
+@dataclass(frozen=True)
+class PoolMetrics:
+    """A snapshot of an ``APIConnectionPool``."""
+
+    in_use: int
+    idle: int
+    #: Callers waiting for a connection.
+    waiting: int
+    created: int
+    #: Connections closed after being idle for too long.
+    evicted: int
+    #: Connections closed because their health check failed.
+    failed_checks: int
+    #: Acquisitions that gave up after ``acquire_timeout``.
+    timeouts: int
+    #: Seconds callers waited for a connection.
+    wait_time: Histogram
+
+
+@dataclass
+class _Pooled:
+    conn: APIConnection
+    defaults: ResultSetContext
+    idle_since: float
+    checked_at: float
+
+
+class APIConnectionPool:
+    """Share a bounded number of ``APIConnection`` objects.
+
+    :param factory: creates a connection.
+    :param min_size: connections kept open, even when idle.
+    :param max_size: connections open at most; callers beyond it wait.
+    :param acquire_timeout: seconds ``acquire`` waits for a connection
+        before raising ``TimeoutError``; ``None`` waits indefinitely.
+    :param idle_timeout: seconds after which an idle connection is closed,
+        unless it is among the ``min_size`` kept open. Idle connections are
+        swept every ``idle_timeout / 2`` seconds once the pool is opened, and
+        otherwise only when a connection is acquired.
+    :param check_after: seconds a connection may be idle before it is
+        checked with ``version()`` on acquisition; ``None`` disables checks.
+    :param check_timeout: seconds a health check may take.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], APIConnection],
+        min_size: int = 0,
+        max_size: int = 10,
+        acquire_timeout: Optional[float] = 30.0,
+        idle_timeout: Optional[float] = 300.0,
+        check_after: Optional[float] = 30.0,
+        check_timeout: float = 5.0,
+    ) -> None:
+        if max_size < 1 or not 0 <= min_size <= max_size:
+            raise ValueError(
+                "sizes must satisfy 0 <= min_size <= max_size, 1 <= max_size"
+            )
+        self.factory = factory
+        self.min_size = min_size
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.idle_timeout = idle_timeout
+        self.check_after = check_after
+        self.check_timeout = check_timeout
+        self.wait_time = Histogram()
+        self._created = 0
+        self._evicted = 0
+        self._failed_checks = 0
+        self._timeouts = 0
+        self._waiting = 0
+        self._closed = False
+        self._reaper: Optional["asyncio.Future[None]"] = None
+        # Most recently released last.
+        self._idle: Deque[_Pooled] = deque()
+        self._in_use: Dict[int, _Pooled] = {}
+        self._slots = asyncio.Semaphore(max_size)
+
+    @classmethod
+    def from_dsn(
+        cls,
+        dsn: str,
+        token_provider: Optional[Callable[[], Awaitable[str]]] = None,
+        **kwargs,
+    ) -> "APIConnectionPool":
+        """A pool of connections created with ``APIConnection.from_dsn``."""
+        return cls(lambda: APIConnection.from_dsn(dsn, token_provider), **kwargs)
+
+    def metrics(self) -> PoolMetrics:
+        return PoolMetrics(
+            in_use=len(self._in_use),
+            idle=len(self._idle),
+            waiting=self._waiting,
+            created=self._created,
+            evicted=self._evicted,
+            failed_checks=self._failed_checks,
+            timeouts=self._timeouts,
+            wait_time=dataclasses.replace(
+                self.wait_time, counts=list(self.wait_time.counts)
+            ),
+        )
+
+    async def open(self) -> None:
+        """Create connections until ``min_size`` are open.
+
+        Also starts the task that closes idle connections; ``close()`` stops
+        it.
+        """
+        now = time.monotonic()
+        while len(self._idle) + len(self._in_use) < self.min_size:
+            pooled = self._create(now)
+            pooled.idle_since = now
+            self._idle.appendleft(pooled)
+        if self.idle_timeout is not None and self._reaper is None:
+            self._reaper = asyncio.ensure_future(self._reap(self.idle_timeout / 2))
+
+    async def acquire(self, timeout: Optional[float] = None) -> APIConnection:
+        """Check out a connection, waiting up to ``timeout`` seconds for one.
+
+        ``timeout`` defaults to ``acquire_timeout``. The connection must be
+        handed back with ``release``.
+        """
+        if self._closed:
+            raise InterfaceError("The connection pool is closed")
+        timeout = self.acquire_timeout if timeout is None else timeout
+        start = time.monotonic()
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self._timeouts += 1
+            raise TimeoutError(
+                f"No connection became available within {timeout}s"
+            ) from None
+        finally:
+            self._waiting -= 1
+        self.wait_time.observe(time.monotonic() - start)
+        try:
+            pooled = await self._checkout()
+        except BaseException:
+            self._slots.release()
+            raise
+        self._in_use[id(pooled.conn)] = pooled
+        return pooled.conn
+
+    async def release(self, conn: APIConnection, discard: bool = False) -> None:
+        """Return a connection to the pool, or close it if ``discard``.
+
+        The connection's context is reset to the one it was created with.
+        """
+        pooled = self._in_use.pop(id(conn), None)
+        if pooled is None:
+            raise ValueError("Connection is not checked out from this pool")
+        try:
+            if discard or self._closed:
+                await pooled.conn.close()
+                return
+            _reset(conn.rsctx, pooled.defaults)
+            pooled.idle_since = time.monotonic()
+            self._idle.append(pooled)
+        finally:
+            self._slots.release()
+
+    @contextlib.asynccontextmanager
+    async def connection(
+        self, timeout: Optional[float] = None
+    ) -> AsyncIterator[APIConnection]:
+        """Check out a connection for the ``async with`` block."""
+        conn = await self.acquire(timeout)
+        try:
+            yield conn
+        finally:
+            await self.release(conn)
+
+    async def evict_idle(self) -> None:
+        """Close connections idle for longer than ``idle_timeout``."""
+        if self.idle_timeout is None:
+            return
+        expiry = time.monotonic() - self.idle_timeout
+        while (
+            self._idle
+            and len(self._idle) + len(self._in_use) > self.min_size
+            and self._idle[0].idle_since <= expiry
+        ):
+            self._evicted += 1
+            await self._idle.popleft().conn.close()
+
+    async def close(self) -> None:
+        """Close the idle connections; the others are closed on release."""
+        self._closed = True
+        if self._reaper is not None:
+            self._reaper.cancel()
+            try:
+                await self._reaper
+            except asyncio.CancelledError:
+                pass
+            self._reaper = None
+        while self._idle:
+            await self._idle.pop().conn.close()
+
+    async def _reap(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.evict_idle()
+            except Exception:
+                # A connection that failed to close is already out of the
+                # pool; the others are swept next time.
+                pass
+
+    async def _checkout(self) -> _Pooled:
+        await self.evict_idle()
+        while self._idle:
+            pooled = self._idle.pop()
+            if await self._healthy(pooled):
+                return pooled
+            self._failed_checks += 1
+            await pooled.conn.close()
+        return self._create(time.monotonic())
+
+    async def _healthy(self, pooled: _Pooled) -> bool:
+        now = time.monotonic()
+        if self.check_after is None or now - pooled.checked_at < self.check_after:
+            return True
+        try:
+            await asyncio.wait_for(pooled.conn.version(), self.check_timeout)
+        except Exception:
+            return False
+        pooled.checked_at = time.monotonic()
+        return True
+
+    def _create(self, now: float) -> _Pooled:
+        conn = self.factory()
+        self._created += 1
+        return _Pooled(conn, dataclasses.replace(conn.rsctx), now, now)
+
+
+def _reset(ctx: ResultSetContext, defaults: ResultSetContext) -> None:
+    # In place: the connection's statement handler shares the object.
+    for f in dataclasses.fields(ctx):
+        setattr(ctx, f.name, getattr(defaults, f.name))
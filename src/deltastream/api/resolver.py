@@ -0,0 +1,169 @@
+"""Cached asynchronous DNS resolution.
+
+Every new keep-alive connection, HTTP/2 connection and result websocket used
+to resolve its host again with the system resolver. ``DNSCache`` resolves
+names with ``loop.getaddrinfo`` (in the loop's executor, so the event loop is
+never blocked), caches the addresses for ``ttl`` seconds and failed lookups
+for ``negative_ttl`` seconds, and shares a lookup between concurrent
+callers. The system resolver does not report record TTLs, so a fixed TTL is
+applied.
+
+Entries can be pre-seeded, e.g. to point the API hosts at a local stand-in
+server when benchmarking::
+
+    shared_dns_cache().seed("api.deltastream.io", ["127.0.0.1"])
+"""
+
+import asyncio
+import ipaddress
+import socket
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass
+class _Entry:
+    addresses: List[str]
+    expires: Optional[float]
+    error: Optional[socket.gaierror] = None
+
+
+class DNSCache:
+    """Host name to address cache with positive and negative TTLs.
+
+    :param ttl: seconds a successful lookup is reused.
+    :param negative_ttl: seconds a failed lookup is remembered and re-raised.
+    :param maxsize: upper bound on cached host names.
+    """
+
+    def __init__(
+        self, ttl: float = 60.0, negative_ttl: float = 5.0, maxsize: int = 1024
+    ) -> None:
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[str, _Entry] = {}
+        self._pending: Dict[
+            Tuple[asyncio.AbstractEventLoop, str], "asyncio.Future[List[str]]"
+        ] = {}
+
+    def seed(
+        self, host: str, addresses: List[str], ttl: Optional[float] = None
+    ) -> None:
+        """Answer lookups of ``host`` with ``addresses``.
+
+        Seeded entries never expire unless ``ttl`` is given.
+        """
+        expires = None if ttl is None else _now() + ttl
+        self._store(host.lower(), _Entry(list(addresses), expires))
+
+    def invalidate(self, host: Optional[str] = None) -> None:
+        """Forget ``host``, or every cached entry when no host is given."""
+        if host is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(host.lower(), None)
+
+    async def resolve(self, host: str, port: int) -> List[str]:
+        """Return the addresses of ``host``, most preferred first.
+
+        Raises ``socket.gaierror`` when the name does not resolve.
+        """
+        if _is_ip_address(host):
+            return [host]
+        key = host.lower()
+        entry = self._entries.get(key)
+        if entry is not None and (entry.expires is None or entry.expires > _now()):
+            self.hits += 1
+            if entry.error is not None:
+                raise socket.gaierror(*entry.error.args)
+            return entry.addresses
+
+        loop = asyncio.get_running_loop()
+        pending = self._pending.get((loop, key))
+        if pending is not None:
+            self.hits += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        future: "asyncio.Future[List[str]]" = loop.create_future()
+        self._pending[(loop, key)] = future
+        try:
+            addresses = await self._lookup(loop, host, port)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            if isinstance(e, socket.gaierror):
+                self._store(key, _Entry([], _now() + self.negative_ttl, e))
+            future.set_exception(e)
+            # Waiters re-raise it; don't report it as never retrieved.
+            future.exception()
+            raise
+        finally:
+            del self._pending[(loop, key)]
+        self._store(key, _Entry(addresses, _now() + self.ttl))
+        future.set_result(addresses)
+        return addresses
+
+    async def connect(
+        self, host: str, port: int, connect: Callable[[str], Awaitable[T]]
+    ) -> T:
+        """Call ``connect`` with each address of ``host`` until one succeeds.
+
+        When every address fails the entry is dropped, so the next attempt
+        resolves the name again, and the last error is raised.
+        """
+        addresses = await self.resolve(host, port)
+        error: Optional[OSError] = None
+        for address in addresses:
+            try:
+                return await connect(address)
+            except OSError as e:
+                error = e
+        self.invalidate(host)
+        if error is None:
+            raise socket.gaierror(socket.EAI_NONAME, f"No addresses for {host}")
+        raise error
+
+    async def _lookup(
+        self, loop: asyncio.AbstractEventLoop, host: str, port: int
+    ) -> List[str]:
+        infos = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        addresses: List[str] = []
+        for _, _, _, _, sockaddr in infos:
+            address = str(sockaddr[0])
+            if address not in addresses:
+                addresses.append(address)
+        return addresses
+
+    def _store(self, key: str, entry: _Entry) -> None:
+        self._entries.pop(key, None)
+        self._entries[key] = entry
+        while len(self._entries) > self.maxsize:
+            del self._entries[next(iter(self._entries))]
+
+
+def _now() -> float:
+    return time.monotonic()
+
+
+def _is_ip_address(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return True
+
+
+_shared_cache = DNSCache()
+
+
+def shared_dns_cache() -> DNSCache:
+    """Return the process-wide ``DNSCache`` used by default."""
+    return _shared_cache
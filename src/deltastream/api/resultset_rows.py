@@ -1,28 +1,50 @@
+import asyncio
 from typing import AsyncIterator, List, Optional, Any, Tuple, Callable, Awaitable
 from uuid import UUID
 
 from deltastream.api.controlplane.openapi_client import ResultSet
 
+from .jsonstream import ResultSetStream
 from .models import Rows
-from .error import InterfaceError
+from .error import InterfaceError, TimeoutError
 from .rows import castRowData, Column
 
 
 class ResultsetRows(Rows):
+    """Rows of a result set, fetching further partitions on demand.
+
+    When ``stream_partition`` is given, partitions after the first are parsed
+    incrementally and their rows are returned while the rest of the partition
+    is still downloading.
+    """
+
     def __init__(
         self,
         get_statement_status: Callable[[UUID, int], Awaitable[ResultSet]],
         result_set: ResultSet,
+        stream_partition: Optional[
+            Callable[[UUID, int], Awaitable[ResultSetStream[Any]]]
+        ] = None,
     ):
         self.current_row_idx: int = -1
         self.current_partition_idx: int = 0
         self.current_result_set: ResultSet = result_set
         self.get_statement_status = get_statement_status
+        self.stream_partition = stream_partition
+        self.partition_stream: Optional[ResultSetStream[Any]] = None
+        self.partition_rows: Optional[AsyncIterator[List[Any]]] = None
         self.is_open: bool = True
         self.cached_columns: Optional[List[Column]] = None
 
     async def close(self) -> None:
         self.is_open = False
+        await self._close_partition_stream()
+
+    async def _close_partition_stream(self) -> None:
+        if self.partition_stream is not None:
+            stream, self.partition_stream = self.partition_stream, None
+            self.partition_rows = None
+            await stream.aclose()
 
     def __aiter__(self) -> AsyncIterator[Optional[List[Any]]]:
         return self
@@ -36,12 +58,29 @@ class ResultsetRows(Rows):
             raise StopAsyncIteration
 
         if part_idx != self.current_partition_idx:
-            self.current_result_set = await self.get_statement_status(
-                self.current_result_set.statement_id, part_idx
-            )
+            await self._close_partition_stream()
+            if self.stream_partition is not None:
+                self.partition_stream = await self.stream_partition(
+                    self.current_result_set.statement_id, part_idx
+                )
+                self.partition_rows = self.partition_stream.rows()
+            else:
+                self.current_result_set = await self.get_statement_status(
+                    self.current_result_set.statement_id, part_idx
+                )
             self.current_partition_idx = part_idx
 
         self.current_row_idx += 1
+        if self.partition_rows is not None:
+            try:
+                row_values = await anext(self.partition_rows)
+            except StopAsyncIteration:
+                raise InterfaceError(
+                    f"partition {part_idx} ended before its advertised row count"
+                ) from None
+            except asyncio.TimeoutError as e:
+                raise TimeoutError(f"Timed out reading partition {part_idx}") from e
+            return castRowData(row_values, self.columns())
         if self.current_result_set.data is None:
             return None
         # Filter out None values for type safety
@@ -0,0 +1,169 @@
+"""Retries for idempotent API calls.
+
+Status polls, partition fetches, resource downloads and version checks can
+be repeated safely, so a ``503`` or a reset connection should not throw away
+a long-running query's progress. ``RetryPolicy`` retries them with jittered
+exponential backoff, waits as long as a ``Retry-After`` header asks, and
+draws every retry from a ``RetryBudget`` shared by a connection, so an
+outage doesn't turn into a retry storm. Statements are never resubmitted.
+"""
+
+import asyncio
+import email.utils
+import random
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, FrozenSet, Optional
+
+from .transport import AsyncRESTResponse, RequestTimeout
+
+#: Statuses that mean "try again later" rather than "this request is wrong".
+RETRYABLE_STATUSES: FrozenSet[int] = frozenset({429, 502, 503, 504})
+
+
+@dataclass
+class RetryStats:
+    """Retries made under a ``RetryPolicy``."""
+
+    retries: int = 0
+    #: Seconds spent waiting between attempts.
+    retry_time: float = 0.0
+    #: Retries that were skipped because the budget was spent.
+    budget_exhausted: int = 0
+
+    def reset(self) -> None:
+        self.retries = 0
+        self.retry_time = 0.0
+        self.budget_exhausted = 0
+
+
+class RetryBudget:
+    """Caps retries at a share of the calls made.
+
+    Every call deposits ``ratio`` tokens and every retry withdraws one. The
+    balance starts at, and never exceeds, ``max_tokens``, which allows a
+    short burst of retries; after that only ``ratio`` retries per call are
+    made until calls succeed again.
+    """
+
+    def __init__(self, ratio: float = 0.1, max_tokens: float = 10.0) -> None:
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+
+    def deposit(self) -> None:
+        self.tokens = min(self.tokens + self.ratio, self.max_tokens)
+
+    def withdraw(self) -> bool:
+        """Take a token for a retry; ``False`` when the budget is spent."""
+        if self.tokens < 1.0:
+            return False
+        self.tokens -= 1.0
+        return True
+
+
+class RetryPolicy:
+    """Jittered exponential backoff for idempotent requests.
+
+    :param max_attempts: attempts per call, including the first.
+    :param base_delay: backoff ceiling of the first retry in seconds; it
+        doubles with each retry up to ``max_delay``. The actual delay is drawn
+        uniformly below the ceiling ("full jitter").
+    :param max_retry_after: longest ``Retry-After`` that is waited for; a
+        response asking for more is returned as is.
+    :param budget: shared ``RetryBudget``; a new one by default.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 4,
+        base_delay: float = 0.1,
+        max_delay: float = 10.0,
+        max_retry_after: float = 60.0,
+        retry_statuses: FrozenSet[int] = RETRYABLE_STATUSES,
+        budget: Optional[RetryBudget] = None,
+    ) -> None:
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.retry_statuses = retry_statuses
+        self.budget = budget or RetryBudget()
+        self.stats = RetryStats()
+
+    def backoff(self, retry: int) -> float:
+        """Delay before retry number ``retry`` (starting at 0)."""
+        ceiling = min(self.base_delay * 2**retry, self.max_delay)
+        return random.uniform(0, ceiling)
+
+    async def run(
+        self,
+        send: Callable[[RequestTimeout], Awaitable[AsyncRESTResponse]],
+        request_timeout: RequestTimeout = None,
+    ) -> AsyncRESTResponse:
+        """Call ``send`` until it returns a response that is not retried.
+
+        A total ``request_timeout`` bounds all attempts and the waits between
+        them together. When no more retries can be made, the last response is
+        returned, or the last connection error raised.
+        """
+        expires_at = None
+        if request_timeout and isinstance(request_timeout, (int, float)):
+            expires_at = time.monotonic() + request_timeout
+        self.budget.deposit()
+        retry = 0
+        while True:
+            timeout = request_timeout
+            if expires_at is not None:
+                timeout = expires_at - time.monotonic()
+            try:
+                response = await send(timeout)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                delay = self._next_delay(retry, None, expires_at)
+                if delay is None:
+                    raise
+            else:
+                if response.status not in self.retry_statuses:
+                    return response
+                retry_after = response.getheader("Retry-After")
+                delay = self._next_delay(retry, retry_after, expires_at)
+                if delay is None:
+                    return response
+                # Drain the body so the connection can be reused.
+                await response.read()
+
+            self.stats.retries += 1
+            start = time.monotonic()
+            await asyncio.sleep(delay)
+            self.stats.retry_time += time.monotonic() - start
+            retry += 1
+
+    def _next_delay(
+        self, retry: int, retry_after: Optional[str], expires_at: Optional[float]
+    ) -> Optional[float]:
+        """Delay before the next attempt, or ``None`` to stop retrying."""
+        if retry + 1 >= self.max_attempts:
+            return None
+        delay = None if retry_after is None else parse_retry_after(retry_after)
+        if delay is None:
+            delay = self.backoff(retry)
+        elif delay > self.max_retry_after:
+            return None
+        if expires_at is not None and time.monotonic() + delay >= expires_at:
+            return None
+        if not self.budget.withdraw():
+            self.stats.budget_exhausted += 1
+            return None
+        return delay
+
+
+def parse_retry_after(value: str) -> Optional[float]:
+    """Seconds to wait from a ``Retry-After`` header (delay or HTTP date)."""
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(when.timestamp() - time.time(), 0.0)
@@ -0,0 +1,166 @@
+"""Latency-aware routing across several controlplane endpoints.
+
+When the controlplane is reachable through more than one URL (regional
+endpoints of the same deployment, say), ``EndpointRouter`` sends each request
+to the healthy endpoint with the lowest moving latency estimate. A request
+that cannot reach its endpoint at all (connection refused, name not
+resolved, host unreachable or its circuit open) was never delivered, so it
+is sent again to the next best endpoint, and the failed endpoint sits out a
+cool-down. Endpoints that have not been used for a while are probed with the
+occasional request so their estimates stay current.
+"""
+
+import errno
+import socket
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, TypeVar
+
+from .error import CircuitOpenError
+
+T = TypeVar("T")
+
+_UNREACHABLE_ERRNOS = frozenset({errno.ENETUNREACH, errno.EHOSTUNREACH})
+
+
+def _not_delivered(exc: BaseException) -> bool:
+    """Whether ``exc`` means the request never reached the endpoint."""
+    if isinstance(exc, (ConnectionRefusedError, socket.gaierror, CircuitOpenError)):
+        return True
+    return isinstance(exc, OSError) and exc.errno in _UNREACHABLE_ERRNOS
+
+
+@dataclass
+class EndpointStats:
+    """Requests routed to one endpoint and how it answered them."""
+
+    url: str
+    #: Moving average of the time to a response, in seconds; ``None`` until
+    #: the endpoint has answered.
+    latency: Optional[float] = None
+    requests: int = 0
+    #: Requests that could not reach the endpoint.
+    failures: int = 0
+    #: Requests sent elsewhere after this endpoint failed.
+    failovers: int = 0
+    healthy: bool = True
+
+
+class EndpointRouter:
+    """Route requests to the fastest healthy endpoint of a list.
+
+    :param urls: base URLs of the endpoints, in order of preference for as
+        long as none has a latency estimate.
+    :param alpha: weight of the newest sample in the moving latency average.
+    :param cooldown: seconds a failed endpoint is skipped.
+    :param probe_interval: seconds after which an endpoint that has not been
+        used gets a request to refresh its estimate.
+    """
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        alpha: float = 0.3,
+        cooldown: float = 30.0,
+        probe_interval: float = 60.0,
+    ) -> None:
+        if not urls:
+            raise ValueError("at least one endpoint is required")
+        if not 0 < alpha <= 1:
+            raise ValueError("alpha must be between 0 and 1")
+        self.alpha = alpha
+        self.cooldown = cooldown
+        self.probe_interval = probe_interval
+        self._endpoints = [EndpointStats(url.rstrip("/")) for url in urls]
+        now = time.monotonic()
+        self._last_used = {e.url: now for e in self._endpoints}
+        self._down_until: Dict[str, float] = {}
+
+    @property
+    def urls(self) -> List[str]:
+        return [e.url for e in self._endpoints]
+
+    def stats(self) -> Dict[str, EndpointStats]:
+        """Per-endpoint statistics, by URL."""
+        now = time.monotonic()
+        for e in self._endpoints:
+            e.healthy = self._down_until.get(e.url, 0.0) <= now
+        return {e.url: e for e in self._endpoints}
+
+    def ranked(self) -> List[EndpointStats]:
+        """Endpoints in the order they should be tried."""
+        now = time.monotonic()
+        healthy = [
+            e for e in self._endpoints if self._down_until.get(e.url, 0.0) <= now
+        ]
+        down = sorted(
+            (e for e in self._endpoints if e not in healthy),
+            key=lambda e: self._down_until[e.url],
+        )
+        if not healthy:
+            return down
+        stale = sorted(
+            (
+                e
+                for e in healthy
+                if e.latency is None
+                or now - self._last_used[e.url] >= self.probe_interval
+            ),
+            key=lambda e: self._last_used[e.url],
+        )
+        fastest = sorted(
+            (e for e in healthy if e not in stale),
+            key=lambda e: e.latency if e.latency is not None else 0.0,
+        )
+        return stale[:1] + fastest + stale[1:] + down
+
+    def record(self, url: str, latency: float) -> None:
+        """Add the latency of a request ``url`` answered."""
+        endpoint = self._endpoint(url)
+        if endpoint.latency is None:
+            endpoint.latency = latency
+        else:
+            endpoint.latency += self.alpha * (latency - endpoint.latency)
+        self._down_until.pop(url, None)
+
+    def record_failure(self, url: str) -> None:
+        """Take ``url`` out of rotation for the cool-down."""
+        self._endpoint(url).failures += 1
+        self._down_until[url] = time.monotonic() + self.cooldown
+
+    async def run(self, send: Callable[[str], Awaitable[T]]) -> T:
+        """Call ``send`` with endpoint base URLs until one is reached.
+
+        Errors other than connection failures are raised as they are: the
+        request may have been delivered, and sending it again is up to the
+        retry policy.
+        """
+        ranked = self.ranked()
+        for endpoint in ranked[:-1]:
+            try:
+                return await self._send(endpoint, send)
+            except Exception as exc:
+                if not _not_delivered(exc):
+                    raise
+                endpoint.failovers += 1
+        return await self._send(ranked[-1], send)
+
+    async def _send(
+        self, endpoint: EndpointStats, send: Callable[[str], Awaitable[T]]
+    ) -> T:
+        endpoint.requests += 1
+        self._last_used[endpoint.url] = start = time.monotonic()
+        try:
+            result = await send(endpoint.url)
+        except Exception as exc:
+            if _not_delivered(exc):
+                self.record_failure(endpoint.url)
+            raise
+        self.record(endpoint.url, time.monotonic() - start)
+        return result
+
+    def _endpoint(self, url: str) -> EndpointStats:
+        for e in self._endpoints:
+            if e.url == url:
+                return e
+        raise KeyError(url)
@@ -0,0 +1,58 @@
+"""Coalescing of identical in-flight calls.
+
+Dashboards often fan out over one statement, so several coroutines ask for
+the same status or partition at once. ``SingleFlight`` runs one call per key
+and hands its result (or error) to every caller that asked for the same key
+while it was in flight.
+"""
+
+import asyncio
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Generic, Hashable, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass
+class _Flight(Generic[T]):
+    task: "asyncio.Future[T]"
+    waiters: int = 0
+
+
+class SingleFlight(Generic[T]):
+    """Share one in-flight call among concurrent callers with the same key.
+
+    The call runs in its own task, so a caller that is cancelled or times out
+    does not abort it for the others; it is cancelled only once every caller
+    has gone.
+    """
+
+    def __init__(self) -> None:
+        #: Calls answered by a call that was already in flight.
+        self.coalesced = 0
+        self._flights: Dict[Tuple[asyncio.AbstractEventLoop, Hashable], _Flight[T]] = {}
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[T]]) -> T:
+        """Return the result of ``call()``, or of the in-flight call for ``key``."""
+        flight_key = (asyncio.get_running_loop(), key)
+        flight = self._flights.get(flight_key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(call()))
+            self._flights[flight_key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(flight_key, flight))
+        else:
+            self.coalesced += 1
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                self._forget(flight_key, flight)
+                flight.task.cancel()
+
+    def _forget(
+        self, flight_key: Tuple[asyncio.AbstractEventLoop, Hashable], flight: _Flight[T]
+    ) -> None:
+        if self._flights.get(flight_key) is flight:
+            del self._flights[flight_key]
@@ -0,0 +1,182 @@
+"""Handles to statements that have been submitted but may still be running.
+
+``APIConnection.exec`` and ``query`` return only after the statement has
+completed. ``APIConnection.submit`` returns a ``StatementHandle`` as soon as
+the server has accepted the statement, so callers can submit several
+statements, or do other work, while they run.
+"""
+
+import asyncio
+from typing import TYPE_CHECKING, List, Optional, Union
+from uuid import UUID
+
+from deltastream.api.controlplane.openapi_client.exceptions import ApiException
+from deltastream.api.controlplane.openapi_client.models import (
+    ResultSet,
+    StatementStatus,
+)
+
+from .deadline import Deadline
+from .error import PollCancelledError, SqlState
+from .handlers import map_error_response
+from .models import ResultSetContext, Rows
+
+if TYPE_CHECKING:
+    from .conn import APIConnection
+
+
+class StatementHandle:
+    """A submitted statement.
+
+    The statement is waited for once, on the first ``result()`` or
+    ``rows()``; later calls share that wait. The connection's ``submit``
+    ``timeout`` bounds the wait and the fetching of the rows. Once it has
+    completed, the context the statement left behind is applied to
+    ``context``, if given.
+    """
+
+    def __init__(
+        self,
+        conn: "APIConnection",
+        initial_response: Union[ResultSet, StatementStatus],
+        deadline: Deadline,
+        context: Optional[ResultSetContext] = None,
+    ) -> None:
+        self.statement_id: UUID = initial_response.statement_id
+        self._conn = conn
+        self._initial = initial_response
+        self._deadline = deadline
+        self._context = context
+        self._waiter: Optional["asyncio.Future[ResultSet]"] = None
+        self._cancelled = False
+
+    @classmethod
+    def for_each(
+        cls,
+        conn: "APIConnection",
+        initial_response: Union[ResultSet, StatementStatus],
+        deadline: Deadline,
+        context: Optional[ResultSetContext] = None,
+    ) -> List["StatementHandle"]:
+        """A handle per statement of a submission, in the order of the SQL.
+
+        A submission with several statements lists them in
+        ``statement_ids``; the server's first answer belongs to the one with
+        ``statement_id``, and the others start out as running.
+        """
+        if not initial_response.statement_ids:
+            return [cls(conn, initial_response, deadline, context)]
+        return [
+            cls(
+                conn,
+                initial_response
+                if statement_id == initial_response.statement_id
+                else StatementStatus(
+                    sqlState=SqlState.SQL_STATE_SQL_STATEMENT_NOT_YET_COMPLETE.value,
+                    statementID=statement_id,
+                    createdOn=initial_response.created_on,
+                ),
+                deadline,
+                context,
+            )
+            for statement_id in initial_response.statement_ids
+        ]
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def done(self) -> bool:
+        """Whether the statement is known to have completed (or failed)."""
+        if isinstance(self._initial, ResultSet):
+            return True
+        return self._waiter is not None and self._waiter.done()
+
+    async def status(self) -> SqlState:
+        """Ask the server for the statement's state, without waiting for it.
+
+        Returns ``SQL_STATE_SQL_STATEMENT_NOT_YET_COMPLETE`` while it runs,
+        ``SQL_STATE_SUCCESSFUL_COMPLETION`` once it has completed, and the
+        error state if it failed.
+        """
+        if isinstance(self._initial, ResultSet):
+            return _sql_state(self._initial.sql_state)
+        handler = self._conn.statement_handler
+        try:
+            response = await handler.authorized(
+                lambda auth: handler.api.get_statement_status(
+                    statement_id=self.statement_id,
+                    session_id=handler.session_id,
+                    partition_id=0,
+                    _request_timeout=self._deadline.request_timeout(),
+                    _request_auth=auth,
+                )
+            )
+        except ApiException as err:
+            map_error_response(err)
+            raise
+        if isinstance(response, ResultSet) and self._waiter is None:
+            # Completed: later waits need not poll again.
+            self._initial = response
+        return _sql_state(response.sql_state)
+
+    async def result(self) -> ResultSet:
+        """Wait for the statement to complete and return its result set.
+
+        Raises ``SQLError`` if the statement failed and
+        ``PollCancelledError`` after ``cancel()``.
+        """
+        if self._cancelled:
+            raise self._cancelled_error()
+        if self._waiter is None:
+            self._waiter = asyncio.ensure_future(self._wait())
+        try:
+            # Shielded: one caller giving up does not stop the others' wait.
+            return await asyncio.shield(self._waiter)
+        except asyncio.CancelledError:
+            if self._cancelled and self._waiter.cancelled():
+                raise self._cancelled_error() from None
+            raise
+
+    async def rows(self) -> Rows:
+        """Wait for the statement to complete and return its rows."""
+        rs = await self.result()
+        try:
+            return await self._conn._rows(rs, self._deadline, self._context)
+        except ApiException as err:
+            map_error_response(err)
+            raise
+
+    def cancel(self) -> None:
+        """Stop waiting for the statement.
+
+        Pending and later ``result()`` and ``rows()`` calls raise
+        ``PollCancelledError``. The API has no call to abort a statement, so
+        it keeps running on the server.
+        """
+        self._cancelled = True
+        if self._waiter is not None:
+            self._waiter.cancel()
+
+    async def _wait(self) -> ResultSet:
+        rs = await self._conn.statement_handler.wait_for_statement(
+            self._initial, self._deadline
+        )
+        self._conn._propagate(rs, self._context)
+        return rs
+
+    def _cancelled_error(self) -> PollCancelledError:
+        return PollCancelledError(
+            f"Wait for statement {self.statement_id} was cancelled", self.statement_id
+        )
+
+    def __repr__(self) -> str:
+        state = "cancelled" if self._cancelled else "done" if self.done() else "pending"
+        return f"<StatementHandle {self.statement_id} {state}>"
+
+
+def _sql_state(code: str) -> SqlState:
+    try:
+        return SqlState(code)
+    except ValueError:
+        return SqlState.SQL_STATE_UNDEFINED
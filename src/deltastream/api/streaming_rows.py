@@ -1,13 +1,34 @@
-from typing import List, Optional, Any, Dict, AsyncIterator
+from typing import List, Optional, Any, Callable, Dict, AsyncIterator
 from dataclasses import dataclass
 import asyncio
 import json
-from websockets.legacy.client import WebSocketClientProtocol, connect as ws_connect
+import ssl
+from urllib.parse import urlsplit
+from websockets.legacy.client import WebSocketClientProtocol, connect as _ws_connect
 
+from .deadline import NO_DEADLINE, Deadline
 from .models import DataplaneRequest, Rows
 from .dpconn import DPAPIConnection
-from .error import InterfaceError, SQLError
+from .error import InterfaceError, SQLError, TimeoutError
+from .resolver import DNSCache
 from .rows import castRowData, Column
+from .tls import ResumingSSLContext, record_handshake, save_session
+
+
+async def ws_connect(
+    uri: str, resolver: DNSCache, **kwargs: Any
+) -> WebSocketClientProtocol:
+    """Open the websocket at ``uri``, resolving its host through ``resolver``."""
+    parts = urlsplit(uri)
+    host = parts.hostname or ""
+    port = parts.port or (443 if parts.scheme == "wss" else 80)
+    if kwargs.get("ssl"):
+        kwargs.setdefault("server_hostname", host)
+    return await resolver.connect(
+        host,
+        port,
+        lambda address: _ws_connect(uri, host=address, port=port, **kwargs),
+    )
 
 
 @dataclass
@@ -52,17 +73,29 @@ class Deferred:
 
 
 class StreamingRows(Rows):
-    def __init__(self, conn: DPAPIConnection, req: DataplaneRequest):
+    def __init__(
+        self,
+        conn: DPAPIConnection,
+        req: DataplaneRequest,
+        deadline: Deadline = NO_DEADLINE,
+    ):
         self.conn = conn
         self.req = req
+        self.deadline = deadline
+        self._reader: Optional["asyncio.Task[None]"] = None
         self.ws: Optional[WebSocketClientProtocol] = None
         self.metadata: Optional[PrintTopicMetadata] = None
         self.rows: List[List[Any]] = []
         self.deferred_row: Optional[Deferred] = None
         self.error: Optional[Any] = None
+        self._ssl_context: Optional[Any] = None
 
     async def open(self) -> None:
-        """Internal function used by the connection to authenticate and open the websocket."""
+        """Internal function used by the connection to authenticate and open the websocket.
+
+        Raises ``TimeoutError`` when the websocket handshake and the metadata
+        message do not complete before the deadline.
+        """
         self.rows = []
         deferred_ready = Deferred()
 
@@ -70,7 +103,13 @@ class StreamingRows(Rows):
             try:
                 # Convert HTTPS URL to WSS for WebSocket connection
                 ws_uri = self.req.uri.replace("https://", "wss://", 1)
-                ws = await ws_connect(ws_uri)
+                connect_kwargs: Dict[str, Any] = {}
+                if ws_uri.startswith("wss://"):
+                    # Share the dataplane's SSL context to resume its TLS sessions.
+                    self._ssl_context = self.conn.ssl_context()
+                    connect_kwargs["ssl"] = self._ssl_context
+                ws = await ws_connect(ws_uri, self.conn.dns_cache(), **connect_kwargs)
+                self._track_tls(ws, record_handshake)
                 self.ws = ws
 
                 # Send authentication
@@ -140,10 +179,15 @@ class StreamingRows(Rows):
                 raise
 
         # Start handling messages in the background
-        asyncio.create_task(handle_messages())
+        self._reader = asyncio.create_task(handle_messages())
 
         # Wait for the connection to be ready
-        await deferred_ready.promise
+        try:
+            await self.deadline.run(deferred_ready.promise)
+        except TimeoutError:
+            self._reader.cancel()
+            await self.close()
+            raise
 
     def columns(self) -> List[Column]:
         """Returns the column definitions."""
@@ -152,9 +196,18 @@ class StreamingRows(Rows):
 
         return self.metadata.columns
 
+    def _track_tls(
+        self,
+        ws: WebSocketClientProtocol,
+        track: Callable[[Optional[ssl.SSLObject]], None],
+    ) -> None:
+        if isinstance(self._ssl_context, ResumingSSLContext):
+            track(ws.transport.get_extra_info("ssl_object"))
+
     async def close(self) -> None:
         """Closes the WebSocket connection."""
         if self.ws is not None:
+            self._track_tls(self.ws, save_session)
             await self.ws.close()
             self.ws = None
 
@@ -0,0 +1,129 @@
+"""TLS session resumption for API connections.
+
+A ``DPAPIConnection`` is created per query, and every new socket to a
+dataplane host used to pay a full TLS handshake. ``ResumingSSLContext``
+remembers the last session (or TLS 1.3 ticket) each server handed out and
+offers it on the next connection to that server, so the handshake is
+abbreviated. Sessions can only be resumed from the context that created
+them; ``PoolRegistry`` keeps one context per TLS configuration, which the
+HTTP pools and the ``StreamingRows`` websocket share.
+"""
+
+import os
+import ssl
+import sys
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional, Union
+
+
+@dataclass
+class TLSSessionStats:
+    """Full and resumed TLS handshakes performed by client connections."""
+
+    handshakes: int = 0
+    resumed: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """Share of handshakes that resumed a cached session."""
+        if not self.handshakes:
+            return 0.0
+        return self.resumed / self.handshakes
+
+    def reset(self) -> None:
+        self.handshakes = 0
+        self.resumed = 0
+
+
+class ResumingSSLContext(ssl.SSLContext):
+    """Client ``SSLContext`` that offers cached sessions to known servers.
+
+    Sessions are keyed by server hostname and kept for the ``max_sessions``
+    most recently used servers.
+    """
+
+    max_sessions = 256
+
+    def __new__(cls, *args: Any, **kwargs: Any) -> "ResumingSSLContext":
+        context = super().__new__(cls, *args, **kwargs)
+        context.sessions = OrderedDict()
+        context.stats = TLSSessionStats()
+        return context
+
+    sessions: "OrderedDict[str, ssl.SSLSession]"
+    stats: TLSSessionStats
+
+    def wrap_bio(
+        self,
+        incoming: ssl.MemoryBIO,
+        outgoing: ssl.MemoryBIO,
+        server_side: bool = False,
+        server_hostname: Optional[Union[str, bytes]] = None,
+        session: Optional[ssl.SSLSession] = None,
+    ) -> ssl.SSLObject:
+        if session is None and not server_side and server_hostname:
+            session = self.sessions.get(_hostname(server_hostname))
+        return super().wrap_bio(
+            incoming, outgoing, server_side, server_hostname, session
+        )
+
+    def record_handshake(self, ssl_object: ssl.SSLObject) -> None:
+        """Count a completed handshake and remember its session."""
+        self.stats.handshakes += 1
+        if ssl_object.session_reused:
+            self.stats.resumed += 1
+        self.save_session(ssl_object)
+
+    def save_session(self, ssl_object: ssl.SSLObject) -> None:
+        """Remember the session of ``ssl_object`` for its server.
+
+        TLS 1.3 tickets arrive after the handshake, so this is called again
+        once a response has been read.
+        """
+        session = ssl_object.session
+        hostname = ssl_object.server_hostname
+        if session is None or not hostname:
+            return
+        if ssl_object.version() == "TLSv1.3" and not session.has_ticket:
+            return
+        key = _hostname(hostname)
+        self.sessions[key] = session
+        self.sessions.move_to_end(key)
+        while len(self.sessions) > self.max_sessions:
+            self.sessions.popitem(last=False)
+
+
+def _hostname(server_hostname: Union[str, bytes]) -> str:
+    if isinstance(server_hostname, bytes):
+        return server_hostname.decode("ascii")
+    return server_hostname
+
+
+def create_resuming_context(
+    cafile: Optional[str] = None, cadata: Optional[Union[str, bytes]] = None
+) -> ResumingSSLContext:
+    """``ssl.create_default_context()`` for server auth, with session resumption."""
+    context = ResumingSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.verify_mode = ssl.CERT_REQUIRED
+    context.check_hostname = True
+    if cafile or cadata:
+        context.load_verify_locations(cafile, None, cadata)
+    else:
+        context.load_default_certs(ssl.Purpose.SERVER_AUTH)
+    keylogfile = os.environ.get("SSLKEYLOGFILE")
+    if keylogfile and not sys.flags.ignore_environment:
+        context.keylog_filename = keylogfile
+    return context
+
+
+def record_handshake(ssl_object: Optional[ssl.SSLObject]) -> None:
+    """Count the handshake of a new connection when its context resumes sessions."""
+    if ssl_object is not None and isinstance(ssl_object.context, ResumingSSLContext):
+        ssl_object.context.record_handshake(ssl_object)
+
+
+def save_session(ssl_object: Optional[ssl.SSLObject]) -> None:
+    """Remember the session of a connection that is being released or closed."""
+    if ssl_object is not None and isinstance(ssl_object.context, ResumingSSLContext):
+        ssl_object.context.save_session(ssl_object)
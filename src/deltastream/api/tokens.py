@@ -0,0 +1,128 @@
+"""Caching of API tokens until shortly before they expire.
+
+Every call authenticates with a token from the connection's
+``token_provider``. With an OAuth-backed provider, asking it for every call
+means one identity provider round trip per statement. ``TokenCache`` keeps
+the token until it expires, which it reads from the ``exp`` claim of a JWT
+or takes from a TTL. Ahead of the expiry it fetches a new token in the
+background while callers keep using the current one, and callers that find
+no valid token share a single in-flight fetch. A token whose expiry is
+unknown is not cached, so rotated tokens are picked up as before.
+"""
+
+import asyncio
+import base64
+import binascii
+import json
+import time
+from typing import Awaitable, Callable, Optional
+
+from .singleflight import SingleFlight
+
+# Seconds before retrying a background refresh that failed.
+_REFRESH_RETRY = 1.0
+
+
+def jwt_expiry(token: str) -> Optional[float]:
+    """The ``exp`` claim of a JWT as a POSIX timestamp, or ``None``.
+
+    The signature is not verified; the server does that.
+    """
+    parts = token.split(".")
+    if len(parts) != 3:
+        return None
+    try:
+        payload = base64.urlsafe_b64decode(parts[1] + "=" * (-len(parts[1]) % 4))
+        claims = json.loads(payload)
+    except (ValueError, binascii.Error):
+        return None
+    exp = claims.get("exp") if isinstance(claims, dict) else None
+    if isinstance(exp, (int, float)) and not isinstance(exp, bool):
+        return float(exp)
+    return None
+
+
+class TokenCache:
+    """Reuse the token of ``provider`` until it is about to expire.
+
+    :param provider: returns a fresh token.
+    :param ttl: seconds a token stays valid. A JWT's ``exp`` also bounds its
+        lifetime; a token that is neither a JWT with ``exp`` nor has a TTL
+        is not cached.
+    :param refresh_ahead: seconds before expiry to fetch the next token in
+        the background; at most half the token's lifetime.
+    """
+
+    def __init__(
+        self,
+        provider: Callable[[], Awaitable[str]],
+        ttl: Optional[float] = None,
+        refresh_ahead: float = 60.0,
+    ) -> None:
+        self.provider = provider
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        #: Tokens fetched from the provider.
+        self.fetches = 0
+        self._token: Optional[str] = None
+        # Monotonic times of the cached token.
+        self._expires_at = 0.0
+        self._refresh_at = 0.0
+        self._flights: SingleFlight[str] = SingleFlight()
+        self._refresh: Optional["asyncio.Future[str]"] = None
+
+    async def get(self) -> str:
+        """A valid token, fetched only if the cached one has expired."""
+        now = time.monotonic()
+        token = self._token
+        if token is None or now >= self._expires_at:
+            return await self._flights.do(None, self._fetch)
+        if now >= self._refresh_at:
+            self._refresh_in_background()
+        return token
+
+    def invalidate(self, token: Optional[str] = None) -> None:
+        """Drop the cached token, e.g. after the server rejected it.
+
+        With ``token``, only drop the cached token if it is that one, so a
+        token fetched since the rejected one was sent is kept.
+        """
+        if token is None or token == self._token:
+            self._token = None
+
+    def _refresh_in_background(self) -> None:
+        if self._refresh is not None and not self._refresh.done():
+            return
+        self._refresh = refresh = asyncio.ensure_future(
+            self._flights.do(None, self._fetch)
+        )
+        refresh.add_done_callback(self._refresh_done)
+
+    def _refresh_done(self, refresh: "asyncio.Future[str]") -> None:
+        if refresh.cancelled() or refresh.exception() is None:
+            return
+        # Keep the current token while it is valid; try again shortly.
+        self._refresh_at = time.monotonic() + _REFRESH_RETRY
+
+    async def _fetch(self) -> str:
+        token = await self.provider()
+        self.fetches += 1
+        now = time.monotonic()
+        lifetime = self._lifetime(token)
+        if lifetime is None:
+            # Unknown expiry: ask the provider again next time.
+            self._token = None
+            return token
+        self._token = token
+        self._expires_at = now + lifetime
+        self._refresh_at = self._expires_at - min(self.refresh_ahead, lifetime / 2)
+        return token
+
+    def _lifetime(self, token: str) -> Optional[float]:
+        lifetimes = []
+        if self.ttl is not None:
+            lifetimes.append(self.ttl)
+        exp = jwt_expiry(token)
+        if exp is not None:
+            lifetimes.append(exp - time.time())
+        return min(lifetimes) if lifetimes else None
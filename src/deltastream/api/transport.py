@@ -0,0 +1,1040 @@
+"""asyncio HTTP transport for the generated OpenAPI clients.
+
+The generated ``RESTClientObject`` performs blocking urllib3 calls, which
+stalls the event loop for the whole round trip. ``AsyncRESTClientObject``
+speaks HTTP/1.1 over asyncio streams instead and keeps a bounded pool of
+keep-alive connections per origin, so many statements can be in flight on
+a single loop. Passing ``http2=True`` multiplexes requests over one HTTP/2
+connection per origin instead (see ``deltastream.api.http2``).
+"""
+
+import asyncio
+import json
+import re
+import socket
+import ssl
+from collections import OrderedDict, deque
+from contextlib import aclosing
+from dataclasses import dataclass
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+from urllib.parse import urlencode, urlsplit
+
+from urllib3 import encode_multipart_formdata
+from urllib3._collections import HTTPHeaderDict
+
+from .breaker import CircuitBreakers
+from .compression import ACCEPT_ENCODING, ByteCounter, get_decoder
+from .resolver import DNSCache, shared_dns_cache
+from .tls import (
+    ResumingSSLContext,
+    TLSSessionStats,
+    create_resuming_context,
+    record_handshake,
+    save_session,
+)
+
+if TYPE_CHECKING:
+    from .http2 import HTTP2Pool, HTTP2Settings
+
+RequestTimeout = Union[None, int, float, Tuple[float, float]]
+
+_BODY_METHODS = ("POST", "PUT", "PATCH", "OPTIONS", "DELETE")
+# Methods safe to send again after the connection failed mid-request.
+_RESENDABLE_METHODS = ("GET", "HEAD")
+_READ_CHUNK_SIZE = 64 * 1024
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+@dataclass
+class Timeout:
+    """Timeouts (in seconds) applied to a single request."""
+
+    connect: Optional[float] = None
+    read: Optional[float] = None
+    total: Optional[float] = None
+
+    @classmethod
+    def from_request_timeout(cls, request_timeout: RequestTimeout) -> "Timeout":
+        """Interpret ``_request_timeout`` the same way the generated client does."""
+        if not request_timeout:
+            return cls()
+        if isinstance(request_timeout, (int, float)):
+            return cls(total=float(request_timeout))
+        if isinstance(request_timeout, tuple) and len(request_timeout) == 2:
+            return cls(connect=request_timeout[0], read=request_timeout[1])
+        raise ValueError(f"Invalid request timeout: {request_timeout!r}")
+
+
+async def _wait(aw: Any, timeout: Optional[float]) -> Any:
+    if timeout is None:
+        return await aw
+    return await asyncio.wait_for(aw, timeout)
+
+
+class HTTP2NotNegotiated(ConnectionError):
+    """The server did not select HTTP/2 during the TLS handshake."""
+
+
+def _apply_socket_options(
+    writer: asyncio.StreamWriter, socket_options: Optional[List[Tuple[int, int, int]]]
+) -> None:
+    if not socket_options:
+        return
+    sock = writer.get_extra_info("socket")
+    if sock is None:
+        return
+    for level, option, value in socket_options:
+        sock.setsockopt(level, option, value)
+
+
+def keepalive_socket_options(
+    idle: int = 30, interval: int = 10, count: int = 3
+) -> List[Tuple[int, int, int]]:
+    """Socket options for low-latency, long-lived API connections.
+
+    Disables Nagle's algorithm and enables TCP keepalive probes after ``idle``
+    seconds of silence, every ``interval`` seconds, giving up after ``count``
+    unanswered probes. Suitable for ``Configuration.socket_options``; probe
+    timing is only set where the platform supports it.
+    """
+    options = [
+        (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),
+        (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+    ]
+    # macOS calls the idle time TCP_KEEPALIVE.
+    keepidle = getattr(socket, "TCP_KEEPIDLE", getattr(socket, "TCP_KEEPALIVE", None))
+    for option, value in (
+        (keepidle, idle),
+        (getattr(socket, "TCP_KEEPINTVL", None), interval),
+        (getattr(socket, "TCP_KEEPCNT", None), count),
+    ):
+        if option is not None:
+            options.append((socket.IPPROTO_TCP, option, value))
+    return options
+
+
+class _Connection:
+    """A single HTTP/1.1 connection."""
+
+    def __init__(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.reusable = True
+        self.reused = False
+        self.idle_since = 0.0
+
+    def is_dropped(self) -> bool:
+        return self.reader.at_eof() or self.writer.is_closing()
+
+    def close(self) -> None:
+        self.reusable = False
+        try:
+            self.writer.close()
+        except RuntimeError:
+            # The loop that owned this connection is already closed.
+            pass
+
+
+class ConnectionPool:
+    """Keep-alive connections to a single origin.
+
+    At most ``maxsize`` connections are checked out at once; further callers
+    wait for a connection to be released instead of opening new sockets.
+    Idle connections are reused most-recently-used first and closed once they
+    have been idle for longer than ``idle_timeout`` seconds, except for the
+    ``min_idle`` connections kept open by ``warm()``.
+    """
+
+    def __init__(
+        self,
+        scheme: str,
+        host: str,
+        port: int,
+        ssl_context: Optional[ssl.SSLContext],
+        server_hostname: Optional[str],
+        maxsize: int,
+        proxy: Optional[str] = None,
+        proxy_headers: Optional[Dict[str, str]] = None,
+        socket_options: Optional[List[Tuple[int, int, int]]] = None,
+        idle_timeout: Optional[float] = None,
+        resolver: Optional[DNSCache] = None,
+    ) -> None:
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.ssl_context = ssl_context
+        self.server_hostname = server_hostname
+        self.resolver = resolver or shared_dns_cache()
+        self.maxsize = maxsize
+        self.proxy = urlsplit(proxy) if proxy else None
+        self.proxy_headers = proxy_headers or {}
+        self.socket_options = socket_options
+        self.idle_timeout = idle_timeout
+        self.connections_opened = 0
+        self.connections_reused = 0
+        self.last_used = 0.0
+        self.min_idle = 0
+        self._in_use = 0
+        self._idle: Deque[_Connection] = deque()
+        self._slots = asyncio.Semaphore(maxsize)
+
+    @property
+    def num_idle(self) -> int:
+        return len(self._idle)
+
+    @property
+    def num_in_use(self) -> int:
+        return self._in_use
+
+    async def acquire(self, timeout: Optional[float] = None) -> _Connection:
+        """Check out a connection, opening one if none is idle.
+
+        ``timeout`` bounds both the wait for a free slot and the connect;
+        ``asyncio.TimeoutError`` is raised when either runs out.
+        """
+        async with asyncio.timeout(timeout):
+            await self._slots.acquire()
+        self._in_use += 1
+        self.last_used = asyncio.get_running_loop().time()
+        try:
+            self.evict_idle()
+            while self._idle:
+                conn = self._idle.pop()
+                if not conn.is_dropped():
+                    conn.reused = True
+                    self.connections_reused += 1
+                    return conn
+                conn.close()
+            conn = await self._connect(timeout)
+            self.connections_opened += 1
+            return conn
+        except BaseException:
+            self._in_use -= 1
+            self._slots.release()
+            raise
+
+    def release(self, conn: _Connection) -> None:
+        now = asyncio.get_running_loop().time()
+        self.last_used = now
+        save_session(conn.writer.get_extra_info("ssl_object"))
+        if conn.reusable and not conn.is_dropped():
+            conn.idle_since = now
+            self._idle.append(conn)
+        else:
+            conn.close()
+        self._in_use -= 1
+        self._slots.release()
+
+    def evict_idle(self) -> None:
+        """Close connections that have been idle for longer than ``idle_timeout``."""
+        if self.idle_timeout is None:
+            return
+        expiry = asyncio.get_running_loop().time() - self.idle_timeout
+        while len(self._idle) > self.min_idle and self._idle[0].idle_since <= expiry:
+            self._idle.popleft().close()
+
+    async def warm(self, count: int, timeout: Optional[float] = None) -> int:
+        """Open connections until ``count`` are idle or checked out.
+
+        Connections the server has closed are replaced, and up to ``count``
+        idle connections are exempt from ``idle_timeout`` from now on. Returns
+        the number of connections opened; raises only if every attempt failed.
+        """
+        count = min(count, self.maxsize)
+        self.min_idle = max(self.min_idle, count)
+        for conn in [conn for conn in self._idle if conn.is_dropped()]:
+            self._idle.remove(conn)
+            conn.close()
+        missing = count - len(self._idle) - self._in_use
+        if missing <= 0:
+            return 0
+
+        results = await asyncio.gather(
+            *(self._connect(timeout) for _ in range(missing)), return_exceptions=True
+        )
+        now = asyncio.get_running_loop().time()
+        opened = [conn for conn in results if isinstance(conn, _Connection)]
+        for conn in opened:
+            conn.idle_since = now
+            self._idle.append(conn)
+        self.connections_opened += len(opened)
+        self.last_used = now
+        if not opened:
+            error = results[0]
+            assert isinstance(error, BaseException)
+            raise error
+        return len(opened)
+
+    def close(self) -> None:
+        while self._idle:
+            self._idle.pop().close()
+
+    async def _connect(self, timeout: Optional[float]) -> _Connection:
+        if self.proxy is None:
+            reader, writer = await _wait(
+                self.resolver.connect(
+                    self.host,
+                    self.port,
+                    lambda address: asyncio.open_connection(
+                        address,
+                        self.port,
+                        ssl=self.ssl_context,
+                        server_hostname=self.server_hostname
+                        if self.ssl_context
+                        else None,
+                    ),
+                ),
+                timeout,
+            )
+        else:
+            reader, writer = await _wait(self._connect_via_proxy(), timeout)
+        record_handshake(writer.get_extra_info("ssl_object"))
+        _apply_socket_options(writer, self.socket_options)
+        return _Connection(reader, writer)
+
+    async def _connect_via_proxy(
+        self,
+    ) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        assert self.proxy is not None
+        proxy_port = self.proxy.port or _DEFAULT_PORTS[self.proxy.scheme]
+        reader, writer = await self.resolver.connect(
+            self.proxy.hostname or "",
+            proxy_port,
+            lambda address: asyncio.open_connection(address, proxy_port),
+        )
+        if self.ssl_context is None:
+            return reader, writer
+
+        # Tunnel TLS through the proxy with CONNECT.
+        authority = f"{self.host}:{self.port}"
+        lines = [f"CONNECT {authority} HTTP/1.1", f"Host: {authority}"]
+        lines.extend(f"{k}: {v}" for k, v in self.proxy_headers.items())
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+        status, reason, _ = await _read_response_head(reader)
+        if status != 200:
+            writer.close()
+            raise ConnectionError(f"Proxy CONNECT failed: {status} {reason}")
+        await writer.start_tls(self.ssl_context, server_hostname=self.server_hostname)
+        return reader, writer
+
+
+class AsyncRESTResponse:
+    """Response returned by ``AsyncRESTClientObject``.
+
+    Mirrors the generated ``RESTResponse`` so ``ApiClient.response_deserialize``
+    can consume it once the body has been read with ``await read()``. Bodies
+    are decoded according to ``Content-Encoding``; ``wire_bytes`` and
+    ``decoded_bytes`` count the body before and after decoding.
+    """
+
+    def __init__(
+        self,
+        status: int,
+        reason: str,
+        headers: HTTPHeaderDict,
+        conn: Optional[_Connection],
+        pool: Optional[ConnectionPool],
+        method: str,
+        timeout: Timeout,
+        deadline: Optional[float],
+    ) -> None:
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.data: Optional[bytes] = None
+        self.wire_bytes = 0
+        self.decoded_bytes = 0
+        # Client-wide totals, set by ``AsyncRESTClientObject``.
+        self.byte_counter: Optional[ByteCounter] = None
+        self._conn: Optional[_Connection] = conn
+        self._pool = pool
+        self._method = method
+        self._timeout = timeout
+        self._deadline = deadline
+        self._body_read = False
+        self._release_callbacks: List[Callable[[], None]] = []
+
+    async def read(self) -> bytes:
+        if self.data is None:
+            self.data = b"".join([chunk async for chunk in self.stream()])
+        return self.data
+
+    async def stream(self) -> AsyncGenerator[bytes, None]:
+        """Yield the decoded response body as it arrives off the socket."""
+        try:
+            decoder = get_decoder(self.headers.get("Content-Encoding"))
+        except ValueError:
+            self.release()
+            raise
+        async with aclosing(self._raw_stream()) as raw:
+            async for chunk in raw:
+                decoded = decoder.decompress(chunk) if decoder else chunk
+                self._count(len(chunk), decoded)
+                if decoded:
+                    yield decoded
+        if decoder is not None:
+            tail = decoder.flush()
+            self._count(0, tail)
+            if tail:
+                yield tail
+
+    def _count(self, wire_bytes: int, decoded: bytes) -> None:
+        self.wire_bytes += wire_bytes
+        self.decoded_bytes += len(decoded)
+        if self.byte_counter is not None:
+            self.byte_counter.add(wire_bytes, len(decoded))
+
+    async def _raw_stream(self) -> AsyncGenerator[bytes, None]:
+        conn = self._conn
+        if conn is None:
+            return
+        try:
+            async for chunk in self._iter_body(conn):
+                yield chunk
+            self._body_read = True
+        except BaseException:
+            conn.close()
+            raise
+        finally:
+            self.release()
+
+    def release(self) -> None:
+        """Return the connection to its pool.
+
+        A connection whose body was not fully consumed cannot be reused.
+        """
+        if self._conn is not None and self._pool is not None:
+            conn, self._conn = self._conn, None
+            if not self._body_read:
+                conn.close()
+            self._pool.release(conn)
+        self._run_release_callbacks()
+
+    def add_release_callback(self, callback: Callable[[], None]) -> None:
+        """Call ``callback`` once the body has been read or released."""
+        self._release_callbacks.append(callback)
+
+    def _run_release_callbacks(self) -> None:
+        callbacks, self._release_callbacks = self._release_callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def getheaders(self) -> HTTPHeaderDict:
+        """Returns a dictionary of the response headers."""
+        return self.headers
+
+    def getheader(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        """Returns a given response header."""
+        return self.headers.get(name, default)
+
+    def _read_timeout(self) -> Optional[float]:
+        if self._deadline is None:
+            return self._timeout.read
+        remaining = max(self._deadline - asyncio.get_running_loop().time(), 0.0)
+        if self._timeout.read is None:
+            return remaining
+        return min(self._timeout.read, remaining)
+
+    async def _iter_body(self, conn: _Connection) -> AsyncIterator[bytes]:
+        if (
+            self._method == "HEAD"
+            or self.status in (204, 304)
+            or 100 <= self.status < 200
+        ):
+            return
+
+        reader = conn.reader
+        transfer_encoding = self.headers.get("Transfer-Encoding", "").lower()
+        content_length = self.headers.get("Content-Length")
+
+        # Mark the connection as unusable until the body is fully read.
+        reusable = conn.reusable
+        conn.reusable = False
+
+        if "chunked" in transfer_encoding:
+            while True:
+                line = await _wait(reader.readline(), self._read_timeout())
+                if not line:
+                    raise asyncio.IncompleteReadError(b"", None)
+                size = int(line.split(b";", 1)[0].strip(), 16)
+                if size == 0:
+                    # Discard trailers.
+                    while True:
+                        trailer = await _wait(reader.readline(), self._read_timeout())
+                        if trailer in (b"\r\n", b"\n", b""):
+                            break
+                    break
+                chunk = await _wait(reader.readexactly(size), self._read_timeout())
+                await _wait(reader.readexactly(2), self._read_timeout())
+                yield chunk
+        elif content_length is not None:
+            remaining = int(content_length)
+            while remaining > 0:
+                chunk = await _wait(
+                    reader.read(min(remaining, _READ_CHUNK_SIZE)),
+                    self._read_timeout(),
+                )
+                if not chunk:
+                    raise asyncio.IncompleteReadError(b"", remaining)
+                remaining -= len(chunk)
+                yield chunk
+        else:
+            # Body is delimited by the server closing the connection.
+            reusable = False
+            while True:
+                chunk = await _wait(reader.read(_READ_CHUNK_SIZE), self._read_timeout())
+                if not chunk:
+                    break
+                yield chunk
+
+        conn.reusable = reusable
+
+
+async def _read_response_head(
+    reader: asyncio.StreamReader,
+) -> Tuple[int, str, HTTPHeaderDict]:
+    while True:
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed before response")
+        parts = status_line.decode("latin-1").rstrip("\r\n").split(" ", 2)
+        if len(parts) < 2 or not parts[0].startswith("HTTP/"):
+            raise ConnectionError(f"Malformed status line: {status_line!r}")
+        status = int(parts[1])
+        reason = parts[2] if len(parts) > 2 else ""
+
+        headers = HTTPHeaderDict()
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers.add(name.strip(), value.strip())
+
+        # Skip interim responses such as 100 Continue.
+        if 100 <= status < 200 and status != 101:
+            continue
+        if (
+            parts[0] == "HTTP/1.0"
+            and "keep-alive" not in headers.get("Connection", "").lower()
+        ):
+            headers.setdefault("Connection", "close")
+        return status, reason, headers
+
+
+def _encode_body(
+    method: str,
+    headers: Dict[str, str],
+    body: Any,
+    post_params: Any,
+) -> Optional[bytes]:
+    """Serialize the request body following the generated client's rules."""
+    if method not in _BODY_METHODS:
+        return None
+
+    content_type = headers.get("Content-Type")
+    if not content_type or re.search("json", content_type, re.IGNORECASE):
+        if body is None:
+            return None
+        return json.dumps(body).encode("utf-8")
+    if content_type == "application/x-www-form-urlencoded":
+        return urlencode(post_params).encode("utf-8")
+    if content_type == "multipart/form-data":
+        # Ensures that dict objects are serialized
+        fields = [
+            (a, json.dumps(b)) if isinstance(b, dict) else (a, b)
+            for a, b in post_params
+        ]
+        data, headers["Content-Type"] = encode_multipart_formdata(fields)
+        return data
+    if isinstance(body, bytes):
+        return body
+    if isinstance(body, str):
+        return body.encode("utf-8")
+    if content_type.startswith("text/") and isinstance(body, bool):
+        return b"true" if body else b"false"
+    raise ValueError(
+        "Cannot prepare a request message for provided arguments. "
+        "Please check that your arguments match declared content type."
+    )
+
+
+def create_ssl_context(configuration: Any) -> ResumingSSLContext:
+    """Build an ``SSLContext`` from a generated ``Configuration``.
+
+    The context caches TLS sessions per server so reconnects can resume them
+    (see ``deltastream.api.tls``).
+    """
+    context = create_resuming_context(
+        cafile=configuration.ssl_ca_cert, cadata=configuration.ca_cert_data
+    )
+    if configuration.cert_file:
+        context.load_cert_chain(configuration.cert_file, configuration.key_file)
+    if not configuration.verify_ssl:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    elif configuration.assert_hostname is False:
+        context.check_hostname = False
+    return context
+
+
+def _tls_key(configuration: Any) -> Tuple[Any, ...]:
+    return (
+        configuration.verify_ssl,
+        configuration.ssl_ca_cert,
+        configuration.ca_cert_data,
+        configuration.cert_file,
+        configuration.key_file,
+        configuration.assert_hostname,
+        configuration.tls_server_name,
+    )
+
+
+def _server_hostname(configuration: Any, host: str) -> str:
+    if configuration.tls_server_name:
+        return configuration.tls_server_name
+    if isinstance(configuration.assert_hostname, str):
+        return configuration.assert_hostname
+    return host
+
+
+def _origin(url: str) -> Tuple[str, str, int]:
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    if scheme not in _DEFAULT_PORTS:
+        raise ValueError(f"Unsupported URL scheme: {url}")
+    return scheme, parts.hostname or "", parts.port or _DEFAULT_PORTS[scheme]
+
+
+_PoolMap = OrderedDict[Tuple[Any, ...], Union[ConnectionPool, "HTTP2Pool"]]
+
+
+class PoolRegistry:
+    """Connection pools shared by every client in the process.
+
+    Pools are keyed by origin, TLS settings, proxy and socket options, so the
+    controlplane client and every short-lived ``DPAPIConnection`` talking to
+    the same host reuse warm keep-alive connections instead of paying a new
+    TCP and TLS handshake. asyncio streams are bound to the loop that opened
+    them, so pools are tracked per event loop.
+
+    :param max_pools: upper bound on pools per loop; the least recently used
+        pool without checked-out connections is closed beyond it.
+    :param idle_timeout: seconds after which idle connections are closed and
+        unused pools are dropped.
+
+    :param dns: cache used to resolve host names; the process-wide
+        ``shared_dns_cache()`` by default.
+    :param breakers: circuit breakers of the origins requests are sent to.
+
+    ``tls_stats`` counts the TLS handshakes made through the registry's SSL
+    contexts and how many of them resumed a cached session.
+    """
+
+    def __init__(
+        self,
+        max_pools: int = 64,
+        idle_timeout: float = 60.0,
+        dns: Optional[DNSCache] = None,
+        breakers: Optional[CircuitBreakers] = None,
+    ) -> None:
+        self.max_pools = max_pools
+        self.idle_timeout = idle_timeout
+        self.dns = dns or shared_dns_cache()
+        self.breakers = breakers or CircuitBreakers()
+        self.tls_stats = TLSSessionStats()
+        self._ssl_contexts: Dict[Tuple[Any, ...], ResumingSSLContext] = {}
+        self._pools: Dict[asyncio.AbstractEventLoop, _PoolMap] = {}
+
+    def ssl_context(
+        self, configuration: Any, alpn_protocols: Tuple[str, ...] = ()
+    ) -> ResumingSSLContext:
+        """Return the (cached) ``SSLContext`` for ``configuration``'s TLS settings.
+
+        Connections that should resume each other's TLS sessions must use the
+        same context.
+        """
+        key = (_tls_key(configuration), alpn_protocols)
+        context = self._ssl_contexts.get(key)
+        if context is None:
+            context = create_ssl_context(configuration)
+            context.stats = self.tls_stats
+            if alpn_protocols:
+                context.set_alpn_protocols(list(alpn_protocols))
+            self._ssl_contexts[key] = context
+        return context
+
+    def pool_for(self, url: str, configuration: Any) -> ConnectionPool:
+        """Return the connection pool serving ``url``'s origin.
+
+        The first configuration to reach an origin sets the pool size.
+        """
+        scheme, host, port = _origin(url)
+        key = (
+            scheme,
+            host,
+            port,
+            _tls_key(configuration) if scheme == "https" else None,
+            configuration.proxy,
+            tuple(sorted((configuration.proxy_headers or {}).items())),
+            tuple(configuration.socket_options or ()),
+        )
+
+        pools = self._loop_pools()
+        pool = pools.get(key)
+        if pool is not None:
+            pools.move_to_end(key)
+            assert isinstance(pool, ConnectionPool)
+            return pool
+
+        self._evict(pools)
+        pool = ConnectionPool(
+            scheme,
+            host,
+            port,
+            self.ssl_context(configuration) if scheme == "https" else None,
+            _server_hostname(configuration, host),
+            configuration.connection_pool_maxsize or 1,
+            proxy=configuration.proxy,
+            proxy_headers=configuration.proxy_headers,
+            socket_options=configuration.socket_options,
+            idle_timeout=self.idle_timeout,
+            resolver=self.dns,
+        )
+        pools[key] = pool
+        return pool
+
+    def http2_pool_for(
+        self, url: str, configuration: Any, settings: "HTTP2Settings"
+    ) -> "HTTP2Pool":
+        """Return the multiplexed HTTP/2 pool serving ``url``'s origin."""
+        from .http2 import HTTP2Pool
+
+        scheme, host, port = _origin(url)
+        key = (
+            "h2",
+            scheme,
+            host,
+            port,
+            _tls_key(configuration) if scheme == "https" else None,
+            tuple(configuration.socket_options or ()),
+            settings,
+        )
+
+        pools = self._loop_pools()
+        pool = pools.get(key)
+        if pool is not None:
+            pools.move_to_end(key)
+            assert isinstance(pool, HTTP2Pool)
+            return pool
+
+        self._evict(pools)
+        pool = HTTP2Pool(
+            scheme,
+            host,
+            port,
+            self.ssl_context(configuration, ("h2", "http/1.1"))
+            if scheme == "https"
+            else None,
+            _server_hostname(configuration, host),
+            settings,
+            socket_options=configuration.socket_options,
+            idle_timeout=self.idle_timeout,
+            resolver=self.dns,
+        )
+        pools[key] = pool
+        return pool
+
+    def pools(self) -> List[Union[ConnectionPool, "HTTP2Pool"]]:
+        """Pools opened on the running event loop."""
+        return list(self._loop_pools().values())
+
+    def _loop_pools(self) -> _PoolMap:
+        loop = asyncio.get_running_loop()
+        pools = self._pools.get(loop)
+        if pools is None:
+            # Forget pools of loops that have been closed since.
+            for closed in [other for other in self._pools if other.is_closed()]:
+                for pool in self._pools.pop(closed).values():
+                    pool.close()
+            pools = OrderedDict()
+            self._pools[loop] = pools
+        return pools
+
+    def _evict(self, pools: _PoolMap) -> None:
+        expiry = asyncio.get_running_loop().time() - self.idle_timeout
+        for key, pool in list(pools.items()):
+            pool.evict_idle()
+            unused = pool.num_in_use == 0 and pool.num_idle == 0
+            if unused and pool.last_used <= expiry:
+                del pools[key]
+
+        while len(pools) >= self.max_pools:
+            for key, pool in pools.items():
+                if pool.num_in_use == 0:
+                    pool.close()
+                    del pools[key]
+                    break
+            else:
+                # Every pool is busy; let this loop go over the limit.
+                return
+
+    async def close(self) -> None:
+        """Close idle connections of every pool on the running event loop."""
+        pools = self._loop_pools()
+        for pool in pools.values():
+            pool.close()
+        pools.clear()
+
+
+_shared_registry = PoolRegistry()
+
+
+def shared_pool_registry() -> PoolRegistry:
+    """Return the process-wide ``PoolRegistry`` used by default."""
+    return _shared_registry
+
+
+class AsyncRESTClientObject:
+    """asyncio equivalent of the generated ``RESTClientObject``.
+
+    Connections come from a ``PoolRegistry`` (the process-wide one unless
+    another is given), pooled per origin and bounded by
+    ``configuration.connection_pool_maxsize``.
+
+    :param http2: multiplex requests over a single HTTP/2 connection per
+        origin. ``True`` uses the default ``HTTP2Settings``; pass an instance
+        to tune flow control. Requires the ``h2`` package. Origins that do not
+        negotiate ``h2`` and proxied requests keep using HTTP/1.1.
+    """
+
+    def __init__(
+        self,
+        configuration: Any,
+        registry: Optional[PoolRegistry] = None,
+        http2: Union[bool, "HTTP2Settings"] = False,
+    ) -> None:
+        if configuration.proxy and not configuration.proxy.lower().startswith("http"):
+            raise ValueError(
+                f"Unsupported proxy for the asyncio transport: {configuration.proxy}"
+            )
+        self.configuration = configuration
+        self.registry = registry or shared_pool_registry()
+        self.byte_counter = ByteCounter()
+        self.http2: Optional["HTTP2Settings"] = None
+        if http2 is True:
+            from .http2 import HTTP2Settings
+
+            self.http2 = HTTP2Settings()
+        elif http2:
+            self.http2 = http2
+
+    def pool_for(self, url: str) -> ConnectionPool:
+        """Return the connection pool serving ``url``'s origin."""
+        return self.registry.pool_for(url, self.configuration)
+
+    async def warm(
+        self, url: str, connections: int, timeout: Optional[float] = None
+    ) -> int:
+        """Pre-open connections to ``url``'s origin; see ``ConnectionPool.warm``.
+
+        With HTTP/2 a single multiplexed connection is opened instead.
+        Returns the number of connections opened.
+        """
+        if self.http2 is not None and not self.configuration.proxy:
+            h2_pool = self.registry.http2_pool_for(url, self.configuration, self.http2)
+            if h2_pool.negotiated is not False:
+                try:
+                    return await h2_pool.warm(timeout)
+                except HTTP2NotNegotiated:
+                    pass
+        return await self.pool_for(url).warm(connections, timeout)
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        body: Any = None,
+        post_params: Any = None,
+        _request_timeout: RequestTimeout = None,
+    ) -> AsyncRESTResponse:
+        """Perform requests.
+
+        :param method: http request method
+        :param url: http request url
+        :param headers: http request headers
+        :param body: request json body, for `application/json`
+        :param post_params: request post parameters,
+                            `application/x-www-form-urlencoded`
+                            and `multipart/form-data`
+        :param _request_timeout: timeout setting for this request. If one
+                                 number provided, it will be total request
+                                 timeout. It can also be a pair (tuple) of
+                                 (connection, read) timeouts.
+        """
+        method = method.upper()
+        assert method in ["GET", "HEAD", "DELETE", "POST", "PUT", "PATCH", "OPTIONS"]
+
+        if post_params and body:
+            raise ValueError(
+                "body parameter cannot be used with post_params parameter."
+            )
+
+        headers = dict(headers or {})
+        if not any(k.lower() == "accept-encoding" for k in headers):
+            headers["Accept-Encoding"] = ACCEPT_ENCODING
+        payload = _encode_body(method, headers, body, post_params or [])
+        timeout = Timeout.from_request_timeout(_request_timeout)
+
+        if not self.registry.breakers.enabled:
+            return await self._request(method, url, headers, payload, timeout)
+        breaker = self.registry.breakers.breaker_for(_origin(url))
+        breaker.before_request()
+        try:
+            response = await self._request(method, url, headers, payload, timeout)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            breaker.record_failure()
+            raise
+        except BaseException:
+            breaker.record_abandoned()
+            raise
+        breaker.record_status(response.status)
+        return response
+
+    async def _request(
+        self,
+        method: str,
+        url: str,
+        headers: Dict[str, str],
+        payload: Optional[bytes],
+        timeout: Timeout,
+    ) -> AsyncRESTResponse:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout.total if timeout.total is not None else None
+        response: Optional[AsyncRESTResponse] = None
+        if self.http2 is not None and not self.configuration.proxy:
+            h2_pool = self.registry.http2_pool_for(url, self.configuration, self.http2)
+            if h2_pool.negotiated is not False:
+                try:
+                    response = await _wait(
+                        h2_pool.request(
+                            method, url, headers, payload, timeout, deadline
+                        ),
+                        timeout.total,
+                    )
+                except HTTP2NotNegotiated:
+                    pass
+
+        if response is None:
+            pool = self.pool_for(url)
+            response = await _wait(
+                self._send(pool, method, url, headers, payload, timeout, deadline),
+                timeout.total,
+            )
+        response.byte_counter = self.byte_counter
+        return response
+
+    async def _send(
+        self,
+        pool: ConnectionPool,
+        method: str,
+        url: str,
+        headers: Dict[str, str],
+        payload: Optional[bytes],
+        timeout: Timeout,
+        deadline: Optional[float],
+    ) -> AsyncRESTResponse:
+        request = _serialize_request(pool, method, url, headers, payload)
+        while True:
+            conn = await pool.acquire(timeout.connect)
+            try:
+                conn.writer.write(request)
+                await conn.writer.drain()
+                status, reason, response_headers = await _wait(
+                    _read_response_head(conn.reader), timeout.read
+                )
+            except (ConnectionError, asyncio.IncompleteReadError):
+                conn.close()
+                pool.release(conn)
+                if conn.reused and method in _RESENDABLE_METHODS:
+                    # The server may have dropped an idle keep-alive
+                    # connection before it saw the request; retry on a fresh
+                    # one. Other methods may already have taken effect, so
+                    # the error is left to the caller's retry policy.
+                    continue
+                raise
+            except BaseException:
+                conn.close()
+                pool.release(conn)
+                raise
+
+            if "close" in response_headers.get("Connection", "").lower():
+                conn.reusable = False
+            return AsyncRESTResponse(
+                status,
+                reason,
+                response_headers,
+                conn,
+                pool,
+                method,
+                timeout,
+                deadline,
+            )
+
+    async def close(self) -> None:
+        """Release this client.
+
+        Pools are shared through the registry and outlive individual clients;
+        use ``PoolRegistry.close()`` to close their connections.
+        """
+
+
+def _serialize_request(
+    pool: ConnectionPool,
+    method: str,
+    url: str,
+    headers: Dict[str, str],
+    payload: Optional[bytes],
+) -> bytes:
+    parts = urlsplit(url)
+    if pool.proxy is not None and pool.ssl_context is None:
+        # Plain HTTP through a forward proxy uses the absolute form.
+        target = url
+    else:
+        target = parts.path or "/"
+        if parts.query:
+            target += "?" + parts.query
+
+    host = pool.host
+    if pool.port != _DEFAULT_PORTS[pool.scheme]:
+        host = f"{host}:{pool.port}"
+
+    lower = {k.lower() for k in headers}
+    lines = [f"{method} {target} HTTP/1.1"]
+    if "host" not in lower:
+        lines.append(f"Host: {host}")
+    if payload is not None:
+        lines.append(f"Content-Length: {len(payload)}")
+    elif method in _BODY_METHODS:
+        lines.append("Content-Length: 0")
+    if pool.proxy is not None and pool.ssl_context is None:
+        lines.extend(f"{k}: {v}" for k, v in pool.proxy_headers.items())
+    lines.extend(f"{k}: {v}" for k, v in headers.items() if v is not None)
+    head = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+    return head + payload if payload else head
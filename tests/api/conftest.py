@@ -0,0 +1,273 @@
+"""
+Shared fixtures for the API tests.
+"""
+
+import asyncio
+import ssl
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+import pytest
+import pytest_asyncio
+
+# Self-signed certificate for localhost and 127.0.0.1.
+CERT_FILE = str(Path(__file__).parent / "certs" / "localhost.pem")
+KEY_FILE = str(Path(__file__).parent / "certs" / "localhost.key")
+
+
+@dataclass
+class RecordedRequest:
+    method: str
+    path: str
+    headers: Dict[str, str]
+    body: bytes
+
+
+@dataclass
+class Response:
+    status: int = 200
+    body: Union[bytes, List[bytes]] = b""
+    headers: Dict[str, str] = field(default_factory=dict)
+    # Send the body with chunked transfer encoding
+    chunked: bool = False
+    # Close the connection after responding, without announcing it
+    drop: bool = False
+    # Close the connection instead of responding
+    hang_up: bool = False
+    # Reset the HTTP/2 stream with REFUSED_STREAM instead of responding
+    refuse: bool = False
+    # Pause between chunks of a chunked body
+    chunk_delay: float = 0.0
+    # Close the connection before the end of the body
+    truncate: bool = False
+
+
+# Handlers return the keyword arguments of a ``Response``.
+Handler = Callable[[RecordedRequest], Awaitable[Dict[str, Any]]]
+
+
+_H2_PREFACE = b"PRI * HTTP/2.0\r\n"
+
+
+class LocalHTTPServer:
+    """A minimal HTTP server standing in for the DeltaStream APIs.
+
+    Speaks HTTP/1.1, and HTTP/2 to clients that open with the h2c preface.
+    """
+
+    def __init__(self, handler: Handler, ssl_context: Optional[ssl.SSLContext] = None):
+        self.handler = handler
+        self.ssl_context = ssl_context
+        self.requests: List[RecordedRequest] = []
+        self.connections = 0
+        self.active = 0
+        self.max_active = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def url(self) -> str:
+        assert self._server is not None
+        host, port = self._server.sockets[0].getsockname()[:2]
+        scheme = "https" if self.ssl_context else "http"
+        return f"{scheme}://{host}:{port}"
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(
+            self._serve, "127.0.0.1", 0, ssl=self.ssl_context
+        )
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _read_request(
+        self, reader: asyncio.StreamReader, request_line: Optional[bytes] = None
+    ) -> Optional[RecordedRequest]:
+        if request_line is None:
+            request_line = await reader.readline()
+        if not request_line:
+            return None
+        method, path, _ = request_line.decode().split(" ", 2)
+        headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode().partition(":")
+            headers[name.strip().lower()] = value.strip()
+        body = await reader.readexactly(int(headers.get("content-length", "0")))
+        return RecordedRequest(method, path, headers, body)
+
+    async def _serve(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.connections += 1
+        try:
+            first_line = await reader.readline()
+            if first_line == _H2_PREFACE:
+                await self._serve_h2(reader, writer)
+                return
+            request = await self._read_request(reader, first_line)
+            while request is not None:
+                response = await self._handle(request)
+                if response.hang_up:
+                    break
+                parts = _encode_response(response)
+                if response.truncate:
+                    parts = parts[:-1]
+                for i, part in enumerate(parts):
+                    if i > 1 and response.chunk_delay:
+                        await asyncio.sleep(response.chunk_delay)
+                    writer.write(part)
+                    await writer.drain()
+                if response.drop or response.truncate:
+                    break
+                request = await self._read_request(reader)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle(self, request: RecordedRequest) -> Response:
+        self.requests.append(request)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            return Response(**await self.handler(request))
+        finally:
+            self.active -= 1
+
+    async def _serve_h2(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        import h2.config
+        import h2.connection
+        import h2.errors
+        import h2.events
+        import h2.exceptions
+
+        conn = h2.connection.H2Connection(
+            h2.config.H2Configuration(client_side=False, header_encoding="utf-8")
+        )
+        conn.initiate_connection()
+        conn.receive_data(_H2_PREFACE + await reader.readexactly(8))
+        writer.write(conn.data_to_send())
+        requests: Dict[int, Tuple[Dict[str, str], bytearray]] = {}
+        window_updated = asyncio.Event()
+        tasks = set()
+
+        async def respond(stream_id: int) -> None:
+            headers, body = requests.pop(stream_id)
+            request = RecordedRequest(
+                headers[":method"],
+                headers[":path"],
+                {k: v for k, v in headers.items() if not k.startswith(":")},
+                bytes(body),
+            )
+            response = await self._handle(request)
+            if response.hang_up:
+                writer.close()
+                return
+            if response.refuse:
+                conn.reset_stream(stream_id, h2.errors.ErrorCodes.REFUSED_STREAM)
+                writer.write(conn.data_to_send())
+                return
+            chunks = (
+                response.body if isinstance(response.body, list) else [response.body]
+            )
+            payload = b"".join(chunks)
+            response_headers = [(":status", str(response.status))]
+            response_headers.extend((k.lower(), v) for k, v in response.headers.items())
+            response_headers.append(("content-length", str(len(payload))))
+            try:
+                conn.send_headers(stream_id, response_headers)
+                while payload:
+                    window = min(
+                        conn.local_flow_control_window(stream_id),
+                        conn.max_outbound_frame_size,
+                    )
+                    if window <= 0:
+                        window_updated.clear()
+                        await window_updated.wait()
+                        continue
+                    conn.send_data(stream_id, payload[:window])
+                    payload = payload[window:]
+                    writer.write(conn.data_to_send())
+                conn.end_stream(stream_id)
+            except h2.exceptions.StreamClosedError:
+                # Reset by the client.
+                pass
+            writer.write(conn.data_to_send())
+
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            for event in conn.receive_data(data):
+                if isinstance(event, h2.events.RequestReceived):
+                    requests[event.stream_id] = (dict(event.headers), bytearray())
+                elif isinstance(event, h2.events.DataReceived):
+                    requests[event.stream_id][1].extend(event.data)
+                    conn.acknowledge_received_data(
+                        event.flow_controlled_length, event.stream_id
+                    )
+                elif isinstance(event, h2.events.StreamEnded):
+                    task = asyncio.ensure_future(respond(event.stream_id))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                elif isinstance(event, h2.events.WindowUpdated):
+                    window_updated.set()
+                elif isinstance(event, h2.events.ConnectionTerminated):
+                    return
+            writer.write(conn.data_to_send())
+
+
+def _encode_response(response: Response) -> List[bytes]:
+    """Encode ``response`` as the head followed by its body parts."""
+    chunks = response.body if isinstance(response.body, list) else [response.body]
+    headers: List[Tuple[str, str]] = list(response.headers.items())
+    if response.chunked:
+        headers.append(("Transfer-Encoding", "chunked"))
+        parts = [b"%x\r\n%s\r\n" % (len(chunk), chunk) for chunk in chunks if chunk]
+        parts.append(b"0\r\n\r\n")
+    else:
+        parts = [b"".join(chunks)]
+        headers.append(("Content-Length", str(len(parts[0]))))
+    head = f"HTTP/1.1 {response.status} OK\r\n"
+    head += "".join(f"{k}: {v}\r\n" for k, v in headers)
+    return [(head + "\r\n").encode(), *parts]
+
+
+@pytest_asyncio.fixture
+async def http_server():
+    """Factory fixture starting local HTTP servers bound to 127.0.0.1."""
+    servers: List[LocalHTTPServer] = []
+
+    async def start(
+        handler: Handler, ssl_context: Optional[ssl.SSLContext] = None
+    ) -> LocalHTTPServer:
+        server = LocalHTTPServer(handler, ssl_context)
+        await server.start()
+        servers.append(server)
+        return server
+
+    yield start
+
+    for server in servers:
+        await server.close()
+
+
+@pytest.fixture
+def server_ssl_context() -> ssl.SSLContext:
+    """Server-side TLS context using the self-signed localhost certificate."""
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(CERT_FILE, KEY_FILE)
+    return context
+
+
+@pytest.fixture
+def ca_cert_file() -> str:
+    """Path of the certificate that ``server_ssl_context`` presents."""
+    return CERT_FILE
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import uuid
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from deltastream.api.dpconn import DPAPIConnection
+from deltastream.api.transport import shared_pool_registry
+
+pytestmark = pytest.mark.asyncio
+
+
+def result_set_body(statement_id: str, rows) -> bytes:
+    return json.dumps(
+        {
+            "sqlState": "00000",
+            "statementID": statement_id,
+            "createdOn": 1704067200,
+            "metadata": {
+                "encoding": "json",
+                "partitionInfo": [{"rowCount": len(rows)}],
+                "columns": [{"name": "col1", "type": "VARCHAR", "nullable": True}],
+            },
+            "data": rows,
+        }
+    ).encode()
+
+
+JSON = {"Content-Type": "application/json"}
+
+
+async def test_get_statement_status_fetches_partition(http_server):
+    statement_id = str(uuid.uuid4())
+
+    async def handler(request):
+        return {"body": result_set_body(statement_id, [["a"]]), "headers": JSON}
+
+    server = await http_server(handler)
+    dpconn = DPAPIConnection(f"{server.url}/v2", "dp_token", "UTC")
+
+    result_set = await dpconn.get_statement_status(uuid.UUID(statement_id), 1)
+
+    assert result_set.data[0][0].actual_instance == "a"
+    request = server.requests[0]
+    assert request.path == f"/v2/statements/{statement_id}?partitionID=1"
+    assert request.headers["authorization"] == "Bearer dp_token"
+    await dpconn.close()
+
+
+async def test_get_statement_status_polls_while_accepted(http_server):
+    statement_id = str(uuid.uuid4())
+    responses = [
+        {
+            "status": 202,
+            "body": json.dumps(
+                {
+                    "sqlState": "03000",
+                    "statementID": statement_id,
+                    "createdOn": 1704067200,
+                }
+            ).encode(),
+            "headers": JSON,
+        },
+        {"body": result_set_body(statement_id, [["b"]]), "headers": JSON},
+    ]
+
+    async def handler(request):
+        return responses.pop(0)
+
+    server = await http_server(handler)
+    dpconn = DPAPIConnection(f"{server.url}/v2", "dp_token", "UTC")
+
+    with patch("deltastream.api.deadline.asyncio.sleep", new=AsyncMock()):
+        result_set = await dpconn.get_statement_status(uuid.UUID(statement_id), 0)
+
+    assert result_set.data[0][0].actual_instance == "b"
+    assert len(server.requests) == 2
+    await dpconn.close()
+
+
+async def test_partition_fetches_do_not_block_the_loop(http_server):
+    statement_id = str(uuid.uuid4())
+
+    async def slow(request):
+        await asyncio.sleep(0.05)
+        return {"body": result_set_body(statement_id, [["c"]]), "headers": JSON}
+
+    server = await http_server(slow)
+    dpconn = DPAPIConnection(f"{server.url}/v2", "dp_token", "UTC")
+
+    await asyncio.gather(
+        *(dpconn.get_statement_status(uuid.UUID(statement_id), i) for i in range(4))
+    )
+
+    assert server.max_active == 4
+    await dpconn.close()
+
+
+async def test_back_to_back_connections_reuse_the_shared_pool(http_server):
+    statement_id = str(uuid.uuid4())
+
+    async def handler(request):
+        return {"body": result_set_body(statement_id, [["d"]]), "headers": JSON}
+
+    server = await http_server(handler)
+
+    for _ in range(3):
+        dpconn = DPAPIConnection(f"{server.url}/v2", "dp_token", "UTC")
+        await dpconn.get_statement_status(uuid.UUID(statement_id), 0)
+        await dpconn.close()
+
+    assert server.connections == 1
+    await shared_pool_registry().close()
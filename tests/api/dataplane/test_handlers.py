@@ -2,7 +2,7 @@ from deltastream.api.controlplane.openapi_client.exceptions import ApiException
 from deltastream.api.error import SQLError
 import pytest
 import uuid
-from unittest.mock import Mock, MagicMock, patch
+from unittest.mock import AsyncMock, patch
 from deltastream.api.controlplane.openapi_client.models.result_set import ResultSet
 from deltastream.api.controlplane.openapi_client.models.result_set_metadata import (
     ResultSetMetadata,
@@ -24,12 +24,12 @@ pytestmark = pytest.mark.asyncio
 async def test_statement_handler_submit_statement_passes_compute_pool_name():
     rsctx = ResultSetContext(compute_pool_name="pool42")
     handler = StatementHandler(
-        api=MagicMock(), rsctx=rsctx, session_id="sid", timezone="UTC"
+        api=AsyncMock(), rsctx=rsctx, session_id="sid", timezone="UTC"
     )
     with patch(
         "deltastream.api.handlers.StatementRequest", wraps=StatementRequest
     ) as MockRequest:
-        handler.api.submit_statement = Mock(
+        handler.api.submit_statement = AsyncMock(
             return_value=ResultSet(
                 statement_id=str(uuid.uuid4()),
                 sql_state="00000",
@@ -55,7 +55,7 @@ async def test_statement_handler_submit_statement_passes_compute_pool_name():
 async def test_query_handles_sql_error():
     rsctx = ResultSetContext(compute_pool_name="pool42")
     handler = StatementHandler(
-        api=MagicMock(), rsctx=rsctx, session_id="sid", timezone="UTC"
+        api=AsyncMock(), rsctx=rsctx, session_id="sid", timezone="UTC"
     )
 
     # Simulate a ResultSet with an error SQL state
@@ -72,7 +72,7 @@ async def test_query_handles_sql_error():
         ),
         createdOn=1704067200,
     )
-    handler.api.submit_statement = Mock(return_value=error_result)
+    handler.api.submit_statement = AsyncMock(return_value=error_result)
 
     with pytest.raises(SQLError) as exc_info:
         await handler.submit_statement("SELECT * FROM nonexistent_table")
@@ -0,0 +1,175 @@
+"""
+Tests for per-endpoint circuit breakers.
+"""
+
+import asyncio
+import json
+import socket
+import uuid
+
+import pytest
+
+from deltastream.api import transport
+from deltastream.api.breaker import CircuitBreaker, CircuitBreakers, CircuitState
+from deltastream.api.controlplane.openapi_client.configuration import Configuration
+from deltastream.api.dpconn import DPAPIConnection
+from deltastream.api.error import CircuitOpenError, ServiceUnavailableError
+from deltastream.api.transport import AsyncRESTClientObject, PoolRegistry
+
+pytestmark = pytest.mark.asyncio
+
+
+def make_client(url: str, breakers: CircuitBreakers) -> AsyncRESTClientObject:
+    config = Configuration()
+    config.host = url
+    return AsyncRESTClientObject(config, PoolRegistry(breakers=breakers))
+
+
+def unused_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class TestCircuitBreaker:
+    async def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker("https://api:443", failure_threshold=3)
+
+        for _ in range(2):
+            breaker.before_request()
+            breaker.record_failure()
+        breaker.before_request()
+        breaker.record_status(200)
+        for _ in range(3):
+            breaker.before_request()
+            breaker.record_status(503)
+
+        assert breaker.state is CircuitState.OPEN
+        with pytest.raises(CircuitOpenError) as exc_info:
+            breaker.before_request()
+        assert isinstance(exc_info.value, ServiceUnavailableError)
+        assert 0 < exc_info.value.retry_in <= 10
+        assert (breaker.opened, breaker.rejected) == (1, 1)
+
+    async def test_server_errors_are_not_endpoint_failures(self):
+        breaker = CircuitBreaker("https://api:443", failure_threshold=1)
+
+        breaker.record_status(500)
+        breaker.record_status(404)
+
+        assert breaker.state is CircuitState.CLOSED
+
+    async def test_half_open_probe_closes_the_circuit(self):
+        breaker = CircuitBreaker("https://api:443", 1, recovery_timeout=0.05)
+        breaker.record_failure()
+        await asyncio.sleep(0.06)
+
+        assert breaker.state is CircuitState.HALF_OPEN
+        breaker.before_request()
+        with pytest.raises(CircuitOpenError):
+            breaker.before_request()
+        breaker.record_success()
+
+        assert breaker.state is CircuitState.CLOSED
+        assert breaker.failures == 0
+
+    async def test_failed_probe_reopens_the_circuit(self):
+        breaker = CircuitBreaker("https://api:443", 3, recovery_timeout=0.05)
+        for _ in range(3):
+            breaker.record_failure()
+        await asyncio.sleep(0.06)
+
+        breaker.before_request()
+        breaker.record_failure()
+
+        assert breaker.state is CircuitState.OPEN
+        assert breaker.opened == 2
+
+    async def test_abandoned_probe_frees_its_slot(self):
+        breaker = CircuitBreaker("https://api:443", 1, recovery_timeout=0.0)
+        breaker.record_failure()
+
+        breaker.before_request()
+        breaker.record_abandoned()
+        breaker.before_request()
+
+
+class TestTransportBreaker:
+    async def test_unavailable_endpoint_fails_fast_then_recovers(self, http_server):
+        healthy = False
+
+        async def handler(request):
+            if healthy:
+                return {"body": b"{}"}
+            return {"status": 503, "body": b"{}"}
+
+        server = await http_server(handler)
+        breakers = CircuitBreakers(failure_threshold=2, recovery_timeout=0.1)
+        client = make_client(server.url, breakers)
+        url = f"{server.url}/v2/version"
+
+        for _ in range(2):
+            assert (await client.request("GET", url)).status == 503
+        with pytest.raises(CircuitOpenError):
+            await client.request("GET", url)
+        assert len(server.requests) == 2
+
+        healthy = True
+        await asyncio.sleep(0.11)
+        resp = await client.request("GET", url)
+        await resp.read()
+
+        assert resp.status == 200
+        host, port = server.url.rsplit("/", 1)[1].split(":")
+        assert breakers.states() == {f"http://{host}:{port}": CircuitState.CLOSED}
+        await client.registry.close()
+
+    async def test_connection_failures_open_the_circuit(self):
+        url = f"http://127.0.0.1:{unused_port()}"
+        breakers = CircuitBreakers(failure_threshold=2)
+        client = make_client(url, breakers)
+
+        for _ in range(2):
+            with pytest.raises(OSError):
+                await client.request("GET", f"{url}/v2/version")
+
+        with pytest.raises(CircuitOpenError):
+            await client.request("GET", f"{url}/v2/version")
+        await client.registry.close()
+
+    async def test_disabled_breakers(self, http_server):
+        async def unavailable(request):
+            return {"status": 503, "body": b"{}"}
+
+        server = await http_server(unavailable)
+        client = make_client(server.url, CircuitBreakers(failure_threshold=0))
+
+        for _ in range(3):
+            resp = await client.request("GET", f"{server.url}/v2/version")
+            await resp.read()
+
+        assert len(server.requests) == 3
+        await client.registry.close()
+
+
+async def test_dataplane_fails_fast_with_service_unavailable(http_server, monkeypatch):
+    async def unavailable(request):
+        return {
+            "status": 503,
+            "body": json.dumps({"message": "down"}).encode(),
+            "headers": {"Content-Type": "application/json"},
+        }
+
+    server = await http_server(unavailable)
+    registry = PoolRegistry(breakers=CircuitBreakers(failure_threshold=1))
+    monkeypatch.setattr(transport, "_shared_registry", registry)
+    dpconn = DPAPIConnection(f"{server.url}/v2", "dp_token", "UTC")
+    dpconn.retry.max_attempts = 1
+
+    with pytest.raises(RuntimeError):
+        await dpconn.get_statement_status(uuid.UUID(int=1), 0)
+    with pytest.raises(ServiceUnavailableError):
+        await dpconn.get_statement_status(uuid.UUID(int=1), 0)
+
+    assert len(server.requests) == 1
+    await registry.close()
@@ -0,0 +1,185 @@
+"""
+Tests for Content-Encoding negotiation and incremental decompression.
+"""
+
+import gzip
+import json
+import zlib
+
+import pytest
+
+from deltastream.api.async_api import AsyncDeltastreamApi
+from deltastream.api.compression import (
+    ACCEPT_ENCODING,
+    ByteCounter,
+    ContentDecodingError,
+    get_decoder,
+)
+from deltastream.api.controlplane.openapi_client.api_client import ApiClient
+from deltastream.api.controlplane.openapi_client.configuration import Configuration
+from deltastream.api.transport import AsyncRESTClientObject, PoolRegistry
+
+pytestmark = pytest.mark.asyncio
+
+ROWS = json.dumps({"data": [[str(i), "some verbose cell"] for i in range(2000)]})
+
+
+def make_config(url: str) -> Configuration:
+    config = Configuration()
+    config.host = url
+    return config
+
+
+def decode_all(content_encoding, chunks):
+    decoder = get_decoder(content_encoding)
+    return b"".join(decoder.decompress(c) for c in chunks) + decoder.flush()
+
+
+def split(data: bytes, size: int = 1000):
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+class TestDecoders:
+    async def test_identity_has_no_decoder(self):
+        assert get_decoder(None) is None
+        assert get_decoder("identity") is None
+
+    async def test_gzip_in_small_chunks(self):
+        body = ROWS.encode()
+        assert decode_all("gzip", split(gzip.compress(body), 7)) == body
+
+    async def test_gzip_with_several_members(self):
+        data = gzip.compress(b"abc") + gzip.compress(b"def")
+        assert decode_all("gzip", [data]) == b"abcdef"
+
+    async def test_zlib_and_raw_deflate(self):
+        raw = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+        raw_deflate = raw.compress(b"hello") + raw.flush()
+
+        assert decode_all("deflate", [zlib.compress(b"hello")]) == b"hello"
+        assert decode_all("deflate", split(raw_deflate, 3)) == b"hello"
+
+    async def test_brotli(self):
+        brotli = pytest.importorskip("brotli")
+        assert "br" in ACCEPT_ENCODING
+        assert decode_all("br", split(brotli.compress(ROWS.encode()))) == ROWS.encode()
+
+    async def test_zstd(self):
+        zstandard = pytest.importorskip("zstandard")
+        data = zstandard.ZstdCompressor().compress(ROWS.encode())
+        assert "zstd" in ACCEPT_ENCODING
+        assert decode_all("zstd", split(data)) == ROWS.encode()
+
+    async def test_stacked_encodings_are_undone_in_reverse(self):
+        data = zlib.compress(gzip.compress(b"nested"))
+        assert decode_all("gzip, deflate", [data]) == b"nested"
+
+    async def test_unsupported_and_corrupt_bodies(self):
+        with pytest.raises(ContentDecodingError):
+            get_decoder("compress")
+        with pytest.raises(ContentDecodingError):
+            decode_all("gzip", [b"not gzip at all"])
+
+    async def test_byte_counter_ratio(self):
+        counter = ByteCounter()
+        assert counter.compression_ratio == 1.0
+        counter.add(100, 1000)
+        assert counter.compression_ratio == 10.0
+
+
+class TestCompressedResponses:
+    async def test_gzip_body_is_decoded_and_counted(self, http_server):
+        compressed = gzip.compress(ROWS.encode())
+
+        async def handler(request):
+            return {"body": compressed, "headers": {"Content-Encoding": "gzip"}}
+
+        server = await http_server(handler)
+        client = AsyncRESTClientObject(make_config(server.url), PoolRegistry())
+
+        resp = await client.request("GET", f"{server.url}/v2/statements/1")
+
+        assert await resp.read() == ROWS.encode()
+        assert server.requests[0].headers["accept-encoding"] == ACCEPT_ENCODING
+        assert (resp.wire_bytes, resp.decoded_bytes) == (len(compressed), len(ROWS))
+        assert client.byte_counter.wire_bytes == len(compressed)
+        assert client.byte_counter.decoded_bytes == len(ROWS)
+        await client.registry.close()
+
+    async def test_chunked_body_is_decoded_incrementally(self, http_server):
+        compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+        chunks = [compressor.compress(ROWS.encode()), compressor.flush()]
+        chunks = split(b"".join(chunks), 512)
+
+        async def handler(request):
+            return {
+                "body": chunks,
+                "chunked": True,
+                "headers": {"Content-Encoding": "gzip"},
+            }
+
+        server = await http_server(handler)
+        client = AsyncRESTClientObject(make_config(server.url), PoolRegistry())
+
+        resp = await client.request("GET", f"{server.url}/v2/statements/1")
+        decoded = [chunk async for chunk in resp.stream()]
+
+        assert len(decoded) > 1
+        assert b"".join(decoded) == ROWS.encode()
+        # The connection is reused once the body has been consumed.
+        resp = await client.request("GET", f"{server.url}/v2/statements/1")
+        await resp.read()
+        assert server.connections == 1
+        await client.registry.close()
+
+    async def test_explicit_accept_encoding_is_kept(self, http_server):
+        async def handler(request):
+            return {"body": b"{}"}
+
+        server = await http_server(handler)
+        client = AsyncRESTClientObject(make_config(server.url), PoolRegistry())
+
+        resp = await client.request(
+            "GET", f"{server.url}/v2/version", headers={"accept-encoding": "identity"}
+        )
+        await resp.read()
+
+        assert server.requests[0].headers["accept-encoding"] == "identity"
+        assert resp.wire_bytes == resp.decoded_bytes == 2
+        await client.registry.close()
+
+    async def test_undecodable_body_closes_connection(self, http_server):
+        async def handler(request):
+            return {"body": b"garbage", "headers": {"Content-Encoding": "gzip"}}
+
+        server = await http_server(handler)
+        client = AsyncRESTClientObject(make_config(server.url), PoolRegistry())
+
+        for _ in range(2):
+            resp = await client.request("GET", f"{server.url}/v2/version")
+            with pytest.raises(ContentDecodingError):
+                await resp.read()
+
+        assert server.connections == 2
+        await client.registry.close()
+
+    async def test_api_deserializes_compressed_json(self, http_server):
+        async def version(request):
+            return {
+                "body": gzip.compress(b'{"major": 2, "minor": 1, "patch": 0}'),
+                "headers": {
+                    "Content-Type": "application/json",
+                    "Content-Encoding": "gzip",
+                },
+            }
+
+        server = await http_server(version)
+        config = make_config(server.url)
+        api = AsyncDeltastreamApi(
+            ApiClient(config), AsyncRESTClientObject(config, PoolRegistry())
+        )
+
+        result = await api.get_version()
+
+        assert (result.major, result.minor, result.patch) == (2, 1, 0)
+        await api.rest_client.registry.close()
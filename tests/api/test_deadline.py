@@ -0,0 +1,229 @@
+"""
+Tests for end-to-end deadlines.
+"""
+
+import asyncio
+import functools
+import json
+import time
+import uuid
+from unittest.mock import AsyncMock
+
+import pytest
+import websockets
+
+from deltastream.api import transport
+from deltastream.api.conn import APIConnection
+from deltastream.api.deadline import Deadline
+from deltastream.api.dpconn import DPAPIConnection
+from deltastream.api.error import TimeoutError
+from deltastream.api.models import DataplaneRequest
+from deltastream.api.resultset_rows import ResultsetRows
+from deltastream.api.streaming_rows import StreamingRows
+from deltastream.api.transport import PoolRegistry
+
+pytestmark = pytest.mark.asyncio
+
+STATEMENT_ID = str(uuid.uuid4())
+METADATA = {
+    "encoding": "json",
+    "partitionInfo": [{"rowCount": 1}, {"rowCount": 2}],
+    "columns": [{"name": "id", "type": "INTEGER", "nullable": False}],
+}
+
+
+def result_set(rows) -> bytes:
+    return json.dumps(
+        {
+            "sqlState": "00000",
+            "statementID": STATEMENT_ID,
+            "createdOn": 1704067200,
+            "metadata": METADATA,
+            "data": rows,
+        }
+    ).encode()
+
+
+def make_connection(url: str) -> APIConnection:
+    return APIConnection(
+        server_url=f"{url}/v2",
+        token_provider=AsyncMock(return_value="token"),
+        session_id=None,
+        timezone="UTC",
+        organization_id=None,
+        role_name=None,
+        database_name=None,
+        schema_name=None,
+        store_name=None,
+    )
+
+
+class TestDeadline:
+    async def test_without_timeout_never_expires(self):
+        deadline = Deadline(None)
+
+        assert deadline.remaining() is None
+        assert deadline.request_timeout() is None
+        assert not deadline.expired()
+
+    async def test_request_timeout_is_the_time_left(self):
+        deadline = Deadline(10.0)
+
+        assert 9.0 < deadline.request_timeout() <= 10.0
+
+    async def test_expired_deadline_raises(self):
+        deadline = Deadline(0.0)
+
+        assert deadline.expired()
+        with pytest.raises(TimeoutError, match="Deadline of 0.0s exceeded"):
+            deadline.request_timeout()
+
+    async def test_sleep_stops_at_the_deadline(self):
+        deadline = Deadline(0.1)
+        start = time.monotonic()
+
+        with pytest.raises(TimeoutError):
+            await deadline.sleep(5)
+        assert time.monotonic() - start < 1.0
+
+    async def test_run_bounds_an_awaitable(self):
+        with pytest.raises(TimeoutError):
+            await Deadline(0.1).run(asyncio.sleep(5))
+        assert await Deadline(1.0).run(asyncio.sleep(0, "done")) == "done"
+
+    async def test_run_after_the_deadline_closes_the_awaitable(self):
+        deadline = Deadline(0.01)
+        await asyncio.sleep(0.02)
+        aw = asyncio.sleep(5)
+
+        with pytest.raises(TimeoutError):
+            await deadline.run(aw)
+        assert aw.cr_frame is None
+
+    async def test_run_leaves_timeouts_of_the_awaitable_alone(self):
+        async def read():
+            raise asyncio.TimeoutError()
+
+        with pytest.raises(asyncio.TimeoutError):
+            await Deadline(5.0).run(read())
+
+
+class TestQueryTimeout:
+    async def test_slow_submit_times_out(self, http_server):
+        async def slow(request):
+            await asyncio.sleep(5)
+            return {"body": result_set([["1"]])}
+
+        server = await http_server(slow)
+        conn = make_connection(server.url)
+        start = time.monotonic()
+
+        with pytest.raises(TimeoutError):
+            await conn.query("SELECT 1;", timeout=0.2)
+        assert time.monotonic() - start < 1.0
+        await conn.close()
+
+    async def test_polling_stops_at_the_deadline(self, http_server):
+        async def running(request):
+            status = {
+                "sqlState": "03000",
+                "statementID": STATEMENT_ID,
+                "createdOn": 1704067200,
+            }
+            return {
+                "status": 202,
+                "body": json.dumps(status).encode(),
+                "headers": {"Content-Type": "application/json"},
+            }
+
+        server = await http_server(running)
+        conn = make_connection(server.url)
+        conn.polling.initial_delay = conn.polling.max_delay = 1.0
+        start = time.monotonic()
+
+        with pytest.raises(TimeoutError):
+            await conn.query("SELECT 1;", timeout=0.5)
+        assert time.monotonic() - start < 1.0
+        # Submitted, polled once, then gave up instead of sleeping past the deadline.
+        assert len(server.requests) == 2
+        await conn.close()
+
+    async def test_query_within_deadline_succeeds(self, http_server):
+        async def done(request):
+            return {
+                "body": result_set([["1"]]),
+                "headers": {"Content-Type": "application/json"},
+            }
+
+        server = await http_server(done)
+        conn = make_connection(server.url)
+
+        rows = await conn.query("SELECT 1;", timeout=5.0)
+
+        assert await anext(rows) == [1]
+        await conn.close()
+
+
+async def test_partition_fetch_times_out(http_server):
+    async def handler(request):
+        if request.path.endswith("partitionID=0"):
+            return {
+                "body": result_set([["1"]]),
+                "headers": {"Content-Type": "application/json"},
+            }
+        body = result_set([["2"], ["3"]])
+        cut = body.index(b'"2"]') + len(b'"2"]')
+        return {
+            "body": [body[:cut], body[cut:]],
+            "headers": {"Content-Type": "application/json"},
+            "chunked": True,
+            "chunk_delay": 1.0,
+        }
+
+    server = await http_server(handler)
+    dpconn = DPAPIConnection(f"{server.url}/v2", "dp_token", "UTC")
+    deadline = Deadline(0.5)
+    first = await dpconn.get_statement_status(uuid.UUID(STATEMENT_ID), 0, deadline)
+    rows = ResultsetRows(
+        dpconn.get_statement_status,
+        first,
+        stream_partition=functools.partial(
+            dpconn.stream_statement_status, deadline=deadline
+        ),
+    )
+
+    assert await anext(rows) == [1]
+    assert await anext(rows) == [2]
+    with pytest.raises(TimeoutError, match="partition 1"):
+        await anext(rows)
+    await rows.close()
+    await dpconn.close()
+
+
+async def test_websocket_open_times_out(server_ssl_context, ca_cert_file, monkeypatch):
+    monkeypatch.setenv("SSL_CERT_FILE", ca_cert_file)
+    registry = PoolRegistry()
+    monkeypatch.setattr(transport, "_shared_registry", registry)
+
+    async def never_ready(ws):
+        await ws.wait_closed()
+
+    async with websockets.serve(
+        never_ready, "127.0.0.1", 0, ssl=server_ssl_context
+    ) as ws_server:
+        port = ws_server.sockets[0].getsockname()[1]
+        rows = StreamingRows(
+            DPAPIConnection(f"https://127.0.0.1:{port}/v2", "dp_token", "UTC"),
+            DataplaneRequest(
+                uri=f"https://127.0.0.1:{port}/v2/print/1",
+                statement_id=STATEMENT_ID,
+                token="dp_token",
+                request_type="print",
+            ),
+            Deadline(0.3),
+        )
+
+        with pytest.raises(TimeoutError):
+            await rows.open()
+        assert rows.ws is None
+    await registry.close()
@@ -0,0 +1,219 @@
+"""
+Tests for the opt-in HTTP/2 transport.
+"""
+
+import asyncio
+import json
+import uuid
+
+import pytest
+
+pytest.importorskip("h2")
+
+from deltastream.api.async_api import AsyncDataplaneApi  # noqa: E402
+from deltastream.api.dataplane.openapi_client.api_client import ApiClient  # noqa: E402
+from deltastream.api.dataplane.openapi_client.configuration import (  # noqa: E402
+    Configuration,
+)
+from deltastream.api.dpconn import DPAPIConnection  # noqa: E402
+from deltastream.api.http2 import HTTP2Pool, HTTP2Settings  # noqa: E402
+from deltastream.api.transport import AsyncRESTClientObject, PoolRegistry  # noqa: E402
+
+pytestmark = pytest.mark.asyncio
+
+
+def make_config(url: str) -> Configuration:
+    config = Configuration()
+    config.host = url
+    config.connection_pool_maxsize = 2
+    return config
+
+
+async def slow_ok(request):
+    await asyncio.sleep(0.02)
+    return {"body": json.dumps({"path": request.path}).encode()}
+
+
+async def test_concurrent_requests_share_one_connection(http_server):
+    server = await http_server(slow_ok)
+    registry = PoolRegistry()
+    client = AsyncRESTClientObject(make_config(server.url), registry, http2=True)
+
+    async def call(i):
+        resp = await client.request("GET", f"{server.url}/v2/statements/{i}")
+        return json.loads(await resp.read())
+
+    results = await asyncio.gather(*(call(i) for i in range(12)))
+
+    assert [r["path"] for r in results] == [f"/v2/statements/{i}" for i in range(12)]
+    # All twelve were in flight at once although the HTTP/1.1 pool allows two.
+    assert server.connections == 1
+    assert server.max_active == 12
+    (pool,) = registry.pools()
+    assert isinstance(pool, HTTP2Pool)
+    assert (pool.connections_opened, pool.streams_opened) == (1, 12)
+    await registry.close()
+
+
+async def test_flow_control_window_is_replenished(http_server):
+    body = b"x" * (1024 * 1024)
+
+    async def large(request):
+        return {"body": body}
+
+    server = await http_server(large)
+    registry = PoolRegistry()
+    settings = HTTP2Settings(initial_window_size=65535, connection_window_size=65535)
+    client = AsyncRESTClientObject(make_config(server.url), registry, http2=settings)
+
+    for _ in range(2):
+        resp = await client.request("GET", f"{server.url}/v2/statements/1")
+        assert await resp.read() == body
+
+    assert server.connections == 1
+    await registry.close()
+
+
+async def test_multipart_post_body(http_server):
+    async def echo(request):
+        return {"body": request.body}
+
+    server = await http_server(echo)
+    registry = PoolRegistry()
+    client = AsyncRESTClientObject(make_config(server.url), registry, http2=True)
+
+    resp = await client.request(
+        "POST",
+        f"{server.url}/v2/statements",
+        headers={"Content-Type": "multipart/form-data"},
+        post_params=[("request", {"statement": "SELECT 1;"})],
+    )
+
+    assert b'{"statement": "SELECT 1;"}' in await resp.read()
+    assert server.requests[0].headers["content-type"].startswith("multipart/")
+    await registry.close()
+
+
+async def test_timed_out_stream_leaves_connection_usable(http_server):
+    async def handler(request):
+        if request.path == "/slow":
+            await asyncio.sleep(1)
+        return {"body": b"{}"}
+
+    server = await http_server(handler)
+    registry = PoolRegistry()
+    client = AsyncRESTClientObject(make_config(server.url), registry, http2=True)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await client.request("GET", f"{server.url}/slow", _request_timeout=0.05)
+    resp = await client.request("GET", f"{server.url}/fast")
+
+    assert await resp.read() == b"{}"
+    assert server.connections == 1
+    await registry.close()
+
+
+async def test_refused_stream_is_retried(http_server):
+    async def refuse_first(request):
+        return {"body": b"{}", "refuse": len(server.requests) == 1}
+
+    server = await http_server(refuse_first)
+    registry = PoolRegistry()
+    client = AsyncRESTClientObject(make_config(server.url), registry, http2=True)
+
+    resp = await client.request("POST", f"{server.url}/v2/statements", body={})
+
+    assert await resp.read() == b"{}"
+    assert [r.method for r in server.requests] == ["POST", "POST"]
+    await registry.close()
+
+
+async def test_lost_connection_is_not_retried(http_server):
+    async def hang_up(request):
+        return {"hang_up": True}
+
+    server = await http_server(hang_up)
+    registry = PoolRegistry()
+    client = AsyncRESTClientObject(make_config(server.url), registry, http2=True)
+
+    with pytest.raises(ConnectionError):
+        await client.request("POST", f"{server.url}/v2/statements", body={})
+
+    assert [r.method for r in server.requests] == ["POST"]
+    await registry.close()
+
+
+async def test_dataplane_connection_over_http2(http_server):
+    statement_id = str(uuid.uuid4())
+
+    async def partition(request):
+        return {
+            "body": json.dumps(
+                {
+                    "sqlState": "00000",
+                    "statementID": statement_id,
+                    "createdOn": 1704067200,
+                    "metadata": {
+                        "encoding": "json",
+                        "partitionInfo": [{"rowCount": 1}],
+                        "columns": [
+                            {"name": "col1", "type": "VARCHAR", "nullable": True}
+                        ],
+                    },
+                    "data": [["a"]],
+                }
+            ).encode(),
+            "headers": {"Content-Type": "application/json"},
+        }
+
+    server = await http_server(partition)
+    dpconn = DPAPIConnection(f"{server.url}/v2", "dp_token", "UTC", http2=True)
+
+    results = await asyncio.gather(
+        *(dpconn.get_statement_status(uuid.UUID(statement_id), i) for i in range(3))
+    )
+
+    assert [r.data[0][0].actual_instance for r in results] == ["a"] * 3
+    assert server.connections == 1
+    assert server.requests[0].headers["authorization"] == "Bearer dp_token"
+    await dpconn.api.rest_client.registry.close()
+
+
+async def test_error_status_is_deserialized(http_server):
+    async def unavailable(request):
+        return {
+            "status": 503,
+            "body": b'{"message": "try later"}',
+            "headers": {"Content-Type": "application/json"},
+        }
+
+    server = await http_server(unavailable)
+    registry = PoolRegistry()
+    config = make_config(server.url)
+    api = AsyncDataplaneApi(
+        ApiClient(config), AsyncRESTClientObject(config, registry, http2=True)
+    )
+
+    with pytest.raises(Exception) as exc_info:
+        await api.get_version()
+
+    assert exc_info.value.status == 503
+    assert "Service Unavailable" in str(exc_info.value)
+    await registry.close()
+
+
+async def test_warm_opens_the_connection_ahead_of_requests(http_server):
+    server = await http_server(slow_ok)
+    registry = PoolRegistry(idle_timeout=0.0)
+    client = AsyncRESTClientObject(make_config(server.url), registry, http2=True)
+
+    assert await client.warm(server.url, 4) == 1
+    assert await client.warm(server.url, 4) == 0
+    (pool,) = registry.pools()
+    pool.evict_idle()
+    resp = await client.request("GET", f"{server.url}/v2/version")
+    await resp.read()
+
+    assert server.connections == 1
+    assert isinstance(pool, HTTP2Pool) and pool.connections_opened == 1
+    await registry.close()
@@ -0,0 +1,167 @@
+"""
+Tests for incremental parsing of ResultSet partitions.
+"""
+
+import asyncio
+import json
+import uuid
+
+import pytest
+
+from deltastream.api.dataplane.openapi_client.configuration import Configuration
+from deltastream.api.dataplane.openapi_client.models import ResultSet as DPResultSet
+from deltastream.api.dpconn import DPAPIConnection
+from deltastream.api.jsonstream import ResultSetParser, ResultSetStream
+from deltastream.api.resultset_rows import ResultsetRows
+from deltastream.api.transport import AsyncRESTClientObject, PoolRegistry
+
+pytestmark = pytest.mark.asyncio
+
+STATEMENT_ID = str(uuid.uuid4())
+METADATA = {
+    "encoding": "json",
+    "partitionInfo": [{"rowCount": 2}, {"rowCount": 3}],
+    "columns": [
+        {"name": "id", "type": "INTEGER", "nullable": False},
+        {"name": "name", "type": "VARCHAR", "nullable": True},
+    ],
+}
+
+
+def document(rows, metadata_first=True) -> bytes:
+    head = {"sqlState": "00000", "statementID": STATEMENT_ID, "createdOn": 1704067200}
+    members = [("metadata", METADATA), ("data", rows)]
+    if not metadata_first:
+        members.reverse()
+    return json.dumps({**head, **dict(members)}).encode()
+
+
+def feed_all(parser, data: bytes, size: int):
+    rows = []
+    for i in range(0, len(data), size):
+        rows.extend(parser.feed(data[i : i + size]))
+    rows.extend(parser.feed(b"", final=True))
+    return rows
+
+
+class TestResultSetParser:
+    @pytest.mark.parametrize("size", [1, 3, 64, 100000])
+    async def test_rows_and_fields_in_any_chunking(self, size):
+        rows = [[str(i), f"name é {i}"] for i in range(50)] + [["50", None]]
+        parser = ResultSetParser()
+
+        assert feed_all(parser, document(rows), size) == rows
+        assert parser.done
+        assert parser.fields["createdOn"] == 1704067200
+        assert parser.fields["metadata"] == METADATA
+        assert "data" not in parser.fields
+
+    async def test_rows_are_returned_before_the_document_ends(self):
+        data = document([["1", "a"], ["2", "b"]])
+        parser = ResultSetParser()
+
+        first_row_end = data.index(b'"a"]') + len(b'"a"]')
+        rows = parser.feed(data[:first_row_end])
+
+        assert rows == [["1", "a"]]
+        assert "metadata" in parser.fields and parser.in_rows
+
+    async def test_number_split_across_chunks(self):
+        parser = ResultSetParser()
+        parser.feed(b'{"createdOn": 17')
+        parser.feed(b'04067200, "data": null}', final=True)
+
+        assert parser.fields == {"createdOn": 1704067200, "data": None}
+
+    async def test_incomplete_document_raises_on_final_chunk(self):
+        parser = ResultSetParser()
+        parser.feed(b'{"data": [["1"], ["2"')
+
+        with pytest.raises(json.JSONDecodeError):
+            parser.feed(b"", final=True)
+
+    async def test_malformed_document_raises(self):
+        with pytest.raises(json.JSONDecodeError):
+            ResultSetParser().feed(b'{"data": [1, 2]}', final=True)
+
+
+class TestResultSetStream:
+    async def test_rows_stream_while_the_body_downloads(self, http_server):
+        rows = [[str(i), "x"] for i in range(3)]
+        body = document(rows)
+        # Send the document up to the first row, then the rest slowly.
+        cut = body.index(b'"x"]') + len(b'"x"]')
+
+        async def handler(request):
+            return {
+                "body": [body[:cut], body[cut:-5], body[-5:]],
+                "chunked": True,
+                "chunk_delay": 0.2,
+            }
+
+        server = await http_server(handler)
+        config = Configuration()
+        config.host = server.url
+        client = AsyncRESTClientObject(config, PoolRegistry())
+        resp = await client.request("GET", f"{server.url}/v2/statements/1")
+
+        stream = await ResultSetStream.open(resp, DPResultSet.from_dict)
+        row_iter = stream.rows()
+        first = await asyncio.wait_for(anext(row_iter), 0.1)
+
+        assert stream.result_set.metadata.partition_info[1].row_count == 3
+        assert stream.result_set.data is None
+        assert first == ["0", "x"]
+        assert [row async for row in row_iter] == rows[1:]
+        await client.registry.close()
+
+    async def test_metadata_after_data_buffers_rows(self, http_server):
+        rows = [["1", "a"], ["2", "b"]]
+
+        async def handler(request):
+            return {"body": document(rows, metadata_first=False)}
+
+        server = await http_server(handler)
+        config = Configuration()
+        config.host = server.url
+        client = AsyncRESTClientObject(config, PoolRegistry())
+        resp = await client.request("GET", f"{server.url}/v2/statements/1")
+
+        stream = await ResultSetStream.open(resp, DPResultSet.from_dict)
+
+        assert stream.result_set.metadata.columns[0].name == "id"
+        assert [row async for row in stream.rows()] == rows
+        await client.registry.close()
+
+
+async def test_resultset_rows_stream_later_partitions(http_server):
+    partitions = {
+        "0": [["1", "a"], ["2", "b"]],
+        "1": [["3", "c"], ["4", None], ["5", "e"]],
+    }
+
+    async def handler(request):
+        partition = request.path.rsplit("partitionID=", 1)[1]
+        return {
+            "body": document(partitions[partition]),
+            "headers": {"Content-Type": "application/json"},
+        }
+
+    server = await http_server(handler)
+    dpconn = DPAPIConnection(f"{server.url}/v2", "dp_token", "UTC")
+    first = await dpconn.get_statement_status(uuid.UUID(STATEMENT_ID), 0)
+
+    async def fail(statement_id, partition_id):
+        raise AssertionError("partitions should be streamed")
+
+    rows = ResultsetRows(fail, first, stream_partition=dpconn.stream_statement_status)
+
+    assert [row async for row in rows] == [
+        [1, "a"],
+        [2, "b"],
+        [3, "c"],
+        [4, None],
+        [5, "e"],
+    ]
+    assert server.requests[-1].path.endswith("partitionID=1")
+    await rows.close()
@@ -0,0 +1,252 @@
+"""
+Tests for waiting on statements: poll backoff and the poll loop.
+"""
+
+import asyncio
+import inspect
+import json
+import time
+import uuid
+from unittest.mock import AsyncMock
+
+import pytest
+
+from deltastream.api.conn import APIConnection
+from deltastream.api.dpconn import DPAPIConnection
+from deltastream.api.error import PollCancelledError, SQLError, TimeoutError
+from deltastream.api.polling import Pending, PollStrategy, StatementPoller
+
+pytestmark = pytest.mark.asyncio
+
+STATEMENT_ID = str(uuid.uuid4())
+
+
+def result_set() -> bytes:
+    return json.dumps(
+        {
+            "sqlState": "00000",
+            "statementID": STATEMENT_ID,
+            "createdOn": 1704067200,
+            "metadata": {"encoding": "json", "partitionInfo": [], "columns": []},
+            "data": [],
+        }
+    ).encode()
+
+
+def running() -> dict:
+    status = {"sqlState": "03000", "statementID": STATEMENT_ID, "createdOn": 0}
+    return {
+        "status": 202,
+        "body": json.dumps(status).encode(),
+        "headers": {"Content-Type": "application/json"},
+    }
+
+
+def completes_after(polls: int):
+    """A handler answering 202 to the first ``polls`` requests."""
+
+    async def handler(request):
+        if len(handler.requests) < polls:
+            handler.requests.append(request)
+            return running()
+        return {"body": result_set(), "headers": {"Content-Type": "application/json"}}
+
+    handler.requests = []
+    return handler
+
+
+class TestPollStrategy:
+    async def test_delay_grows_geometrically_to_the_cap(self):
+        polling = PollStrategy(initial_delay=0.02, max_delay=0.1, jitter=0)
+
+        assert [polling.delay(n) for n in range(1, 6)] == pytest.approx(
+            [0.02, 0.04, 0.08, 0.1, 0.1]
+        )
+
+    async def test_jitter_stays_under_the_cap(self):
+        polling = PollStrategy(initial_delay=0.1, max_delay=0.1, jitter=0.5)
+
+        delays = [polling.delay(1) for _ in range(100)]
+
+        assert all(0.05 <= d <= 0.1 for d in delays)
+
+    async def test_invalid_delays(self):
+        with pytest.raises(ValueError):
+            PollStrategy(initial_delay=2, max_delay=1)
+        with pytest.raises(ValueError):
+            PollStrategy(multiplier=0.5)
+
+    async def test_records_polls_and_overshoot(self):
+        polling = PollStrategy(initial_delay=0.02, jitter=0, history=2)
+        stats = polling.begin(STATEMENT_ID)
+
+        assert polling.pending(stats) == pytest.approx(0.02)
+        assert polling.pending(stats) == pytest.approx(0.04)
+        assert not stats.done
+        polling.completed(stats)
+
+        assert stats.polls == 3
+        assert stats.overshoot == pytest.approx(0.04)
+        for _ in range(2):
+            polling.begin("other")
+        assert [s.statement_id for s in polling.history] == ["other", "other"]
+
+
+def fast_polling(**kwargs) -> PollStrategy:
+    return PollStrategy(initial_delay=0.001, max_delay=0.001, **kwargs)
+
+
+def stack_depth() -> int:
+    depth, frame = 0, inspect.currentframe()
+    while frame is not None:
+        depth, frame = depth + 1, frame.f_back
+    return depth
+
+
+def pending_for(polls: int, result="done"):
+    """A fetch that reports the statement pending ``polls`` times."""
+    calls = []
+
+    async def fetch(statement_id, partition_id):
+        calls.append(stack_depth())
+        if len(calls) <= polls:
+            return Pending(statement_id, partition_id)
+        return result
+
+    return fetch, calls
+
+
+class TestStatementPoller:
+    async def test_long_waits_do_not_grow_the_stack(self):
+        fetch, calls = pending_for(300)
+        poller = StatementPoller(fetch, uuid.UUID(STATEMENT_ID), 0, fast_polling())
+
+        assert await poller.wait() == "done"
+
+        assert len(calls) == 301
+        assert min(calls) == max(calls)
+        assert poller.stats.polls == 301
+
+    async def test_progress_is_reported_after_each_pending_poll(self):
+        fetch, _ = pending_for(3)
+        seen = []
+        poller = StatementPoller(
+            fetch,
+            uuid.UUID(STATEMENT_ID),
+            0,
+            fast_polling(),
+            on_progress=lambda stats: seen.append(stats.polls),
+        )
+
+        await poller.wait()
+
+        assert seen == [1, 2, 3]
+
+    async def test_max_wait(self):
+        fetch, _ = pending_for(1000)
+        poller = StatementPoller(
+            fetch,
+            uuid.UUID(STATEMENT_ID),
+            0,
+            PollStrategy(initial_delay=0.01, max_delay=0.01, max_wait=0.05),
+        )
+
+        with pytest.raises(TimeoutError):
+            await poller.wait()
+
+    async def test_cancel_stops_only_the_wait(self):
+        fetch, calls = pending_for(1000)
+        poller = StatementPoller(fetch, uuid.UUID(STATEMENT_ID), 0, fast_polling())
+        waiter = asyncio.ensure_future(poller.wait())
+        await asyncio.sleep(0.02)
+
+        poller.cancel()
+
+        with pytest.raises(PollCancelledError) as exc_info:
+            await waiter
+        assert exc_info.value.statement_id == uuid.UUID(STATEMENT_ID)
+        polls = len(calls)
+        await asyncio.sleep(0.02)
+        assert len(calls) == polls
+
+    async def test_cancelling_the_task_stops_polling(self):
+        fetch, calls = pending_for(1000)
+        poller = StatementPoller(fetch, uuid.UUID(STATEMENT_ID), 0, fast_polling())
+        waiter = asyncio.ensure_future(poller.wait())
+        await asyncio.sleep(0.01)
+
+        waiter.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        polls = len(calls)
+        await asyncio.sleep(0.02)
+        assert len(calls) == polls
+
+    async def test_failed_statement_completes_the_wait(self):
+        async def fetch(statement_id, partition_id):
+            raise SQLError("boom", "42000", statement_id)
+
+        poller = StatementPoller(fetch, uuid.UUID(STATEMENT_ID), 0, fast_polling())
+
+        with pytest.raises(SQLError):
+            await poller.wait()
+        assert poller.stats.done
+
+
+async def test_short_statements_are_picked_up_quickly(http_server):
+    server = await http_server(completes_after(3))
+    conn = APIConnection(
+        server_url=f"{server.url}/v2",
+        token_provider=AsyncMock(return_value="token"),
+        session_id=None,
+        timezone="UTC",
+        organization_id=None,
+        role_name=None,
+        database_name=None,
+        schema_name=None,
+        store_name=None,
+        polling=PollStrategy(initial_delay=0.01, jitter=0),
+    )
+    start = time.monotonic()
+
+    await conn.get_statement_status(uuid.UUID(STATEMENT_ID), 0)
+
+    # Waited 0.01 + 0.02 + 0.04 instead of three seconds.
+    assert time.monotonic() - start < 0.5
+    stats = conn.polling.history[-1]
+    assert (stats.statement_id, stats.polls) == (STATEMENT_ID, 4)
+    assert stats.overshoot == pytest.approx(0.04)
+    await conn.close()
+
+
+async def test_dataplane_polls_with_backoff(http_server):
+    server = await http_server(completes_after(2))
+    polling = PollStrategy(initial_delay=0.01, jitter=0)
+    dpconn = DPAPIConnection(f"{server.url}/v2", "dp_token", "UTC", polling=polling)
+
+    await dpconn.get_statement_status(uuid.UUID(STATEMENT_ID), 1)
+
+    assert len(server.requests) == 3
+    assert polling.history[-1].polls == 3
+    assert polling.history[-1].overshoot == pytest.approx(0.02)
+    await dpconn.close()
+
+
+async def test_dataplane_wait_for_completion_is_bounded(http_server):
+    async def always_running(request):
+        return running()
+
+    server = await http_server(always_running)
+    dpconn = DPAPIConnection(
+        f"{server.url}/v2", "dp_token", "UTC", polling=fast_polling()
+    )
+    progress = []
+
+    with pytest.raises(TimeoutError):
+        await dpconn.wait_for_completion(
+            uuid.UUID(STATEMENT_ID), max_wait=0.05, on_progress=progress.append
+        )
+
+    assert len(progress) == len(server.requests) > 1
+    await dpconn.close()
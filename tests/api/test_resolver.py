@@ -0,0 +1,184 @@
+"""
+Tests for the cached DNS resolver.
+"""
+
+import asyncio
+import json
+import socket
+import uuid
+
+import pytest
+import websockets
+
+from deltastream.api import transport
+from deltastream.api.controlplane.openapi_client.configuration import Configuration
+from deltastream.api.dpconn import DPAPIConnection
+from deltastream.api.models import DataplaneRequest
+from deltastream.api.resolver import DNSCache
+from deltastream.api.streaming_rows import StreamingRows
+from deltastream.api.transport import AsyncRESTClientObject, PoolRegistry
+
+pytestmark = pytest.mark.asyncio
+
+
+class FakeLookup:
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = 0
+
+    async def __call__(self, loop, host, port):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+class TestDNSCache:
+    async def test_lookups_are_cached(self, monkeypatch):
+        cache = DNSCache()
+        lookup = FakeLookup(["10.0.0.1", "10.0.0.2"])
+        monkeypatch.setattr(cache, "_lookup", lookup)
+
+        for _ in range(3):
+            assert await cache.resolve("API.example.test", 443) == [
+                "10.0.0.1",
+                "10.0.0.2",
+            ]
+
+        assert lookup.calls == 1
+        assert (cache.hits, cache.misses) == (2, 1)
+
+    async def test_expired_entries_are_resolved_again(self, monkeypatch):
+        cache = DNSCache(ttl=0.0)
+        lookup = FakeLookup(["10.0.0.1"], ["10.0.0.9"])
+        monkeypatch.setattr(cache, "_lookup", lookup)
+
+        await cache.resolve("api.example.test", 443)
+
+        assert await cache.resolve("api.example.test", 443) == ["10.0.0.9"]
+        assert lookup.calls == 2
+
+    async def test_concurrent_lookups_are_shared(self, monkeypatch):
+        cache = DNSCache()
+        lookup = FakeLookup(["10.0.0.1"])
+        monkeypatch.setattr(cache, "_lookup", lookup)
+
+        results = await asyncio.gather(
+            *(cache.resolve("api.example.test", 443) for _ in range(5))
+        )
+
+        assert results == [["10.0.0.1"]] * 5
+        assert lookup.calls == 1
+
+    async def test_failures_are_cached_for_negative_ttl(self, monkeypatch):
+        cache = DNSCache(negative_ttl=60.0)
+        error = socket.gaierror(socket.EAI_NONAME, "Name or service not known")
+        lookup = FakeLookup(error)
+        monkeypatch.setattr(cache, "_lookup", lookup)
+
+        for _ in range(2):
+            with pytest.raises(socket.gaierror, match="not known"):
+                await cache.resolve("missing.example.test", 443)
+
+        assert lookup.calls == 1
+        cache.invalidate("missing.example.test")
+        lookup.results.append(["10.0.0.1"])
+        assert await cache.resolve("missing.example.test", 443) == ["10.0.0.1"]
+
+    async def test_ip_addresses_are_not_looked_up(self, monkeypatch):
+        cache = DNSCache()
+        monkeypatch.setattr(cache, "_lookup", FakeLookup())
+
+        assert await cache.resolve("127.0.0.1", 80) == ["127.0.0.1"]
+        assert await cache.resolve("::1", 80) == ["::1"]
+
+    async def test_system_resolver(self):
+        cache = DNSCache()
+
+        addresses = await cache.resolve("localhost", 80)
+
+        assert addresses and set(addresses) <= {"127.0.0.1", "::1"}
+
+    async def test_connect_tries_each_address(self):
+        cache = DNSCache()
+        cache.seed("api.example.test", ["10.0.0.1", "10.0.0.2"])
+        attempts = []
+
+        async def connect(address):
+            attempts.append(address)
+            if address == "10.0.0.1":
+                raise ConnectionRefusedError(address)
+            return address
+
+        assert await cache.connect("api.example.test", 443, connect) == "10.0.0.2"
+        assert attempts == ["10.0.0.1", "10.0.0.2"]
+
+    async def test_entry_is_dropped_when_every_address_fails(self):
+        cache = DNSCache()
+        cache.seed("api.example.test", ["10.0.0.1"])
+
+        async def refuse(address):
+            raise ConnectionRefusedError(address)
+
+        with pytest.raises(ConnectionRefusedError):
+            await cache.connect("api.example.test", 443, refuse)
+        assert "api.example.test" not in cache._entries
+
+
+class TestSeededHosts:
+    async def test_http_requests_use_seeded_addresses(self, http_server):
+        async def echo_host(request):
+            return {"body": json.dumps({"host": request.headers["host"]}).encode()}
+
+        server = await http_server(echo_host)
+        port = server.url.rsplit(":", 1)[1]
+        cache = DNSCache()
+        cache.seed("api.deltastream.test", ["127.0.0.1"])
+        config = Configuration()
+        config.host = f"http://api.deltastream.test:{port}"
+        registry = PoolRegistry(dns=cache)
+        client = AsyncRESTClientObject(config, registry)
+
+        resp = await client.request("GET", f"{config.host}/v2/version")
+
+        assert json.loads(await resp.read()) == {"host": f"api.deltastream.test:{port}"}
+        assert cache.hits == 1
+        await registry.close()
+
+    async def test_websocket_uses_the_dataplane_cache(
+        self, server_ssl_context, ca_cert_file, monkeypatch
+    ):
+        monkeypatch.setenv("SSL_CERT_FILE", ca_cert_file)
+        cache = DNSCache()
+        # The certificate is issued for localhost.
+        cache.seed("localhost", ["127.0.0.1"])
+        registry = PoolRegistry(dns=cache)
+        monkeypatch.setattr(transport, "_shared_registry", registry)
+
+        async def print_topic(ws):
+            await ws.recv()
+            await ws.send(
+                json.dumps({"type": "metadata", "headers": {}, "columns": []})
+            )
+            await ws.wait_closed()
+
+        async with websockets.serve(
+            print_topic, "127.0.0.1", 0, ssl=server_ssl_context
+        ) as ws_server:
+            port = ws_server.sockets[0].getsockname()[1]
+            rows = StreamingRows(
+                DPAPIConnection(f"https://localhost:{port}/v2", "dp_token", "UTC"),
+                DataplaneRequest(
+                    uri=f"https://localhost:{port}/v2/print/1",
+                    statement_id=str(uuid.uuid4()),
+                    token="dp_token",
+                    request_type="print",
+                ),
+            )
+            await rows.open()
+            await rows.close()
+
+        assert cache.hits == 1
+        await registry.close()
@@ -0,0 +1,188 @@
+"""
+Tests for retrying idempotent API calls.
+"""
+
+import email.utils
+import json
+import time
+import uuid
+from unittest.mock import AsyncMock
+
+import pytest
+
+from deltastream.api.async_api import AsyncDeltastreamApi
+from deltastream.api.conn import APIConnection
+from deltastream.api.controlplane.openapi_client.api_client import ApiClient
+from deltastream.api.controlplane.openapi_client.configuration import Configuration
+from deltastream.api.controlplane.openapi_client.exceptions import ApiException
+from deltastream.api.controlplane.openapi_client.models import StatementRequest
+from deltastream.api.retry import RetryBudget, RetryPolicy, parse_retry_after
+
+pytestmark = pytest.mark.asyncio
+
+VERSION = json.dumps({"major": 2, "minor": 1, "patch": 0}).encode()
+
+
+def make_config(url: str) -> Configuration:
+    config = Configuration()
+    config.host = url
+    return config
+
+
+def flaky(failures: int, headers=None):
+    """Handler answering 503 ``failures`` times, then the version."""
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        if len(calls) <= failures:
+            return {
+                "status": 503,
+                "body": b'{"message": "try later"}',
+                "headers": {"Content-Type": "application/json", **(headers or {})},
+            }
+        return {"body": VERSION, "headers": {"Content-Type": "application/json"}}
+
+    return handler
+
+
+class FakeResponse:
+    def __init__(self, status: int, headers=None):
+        self.status = status
+        self.headers = headers or {}
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name, default)
+
+    async def read(self):
+        return b""
+
+
+class TestRetryPolicy:
+    async def test_backoff_is_jittered_below_the_ceiling(self):
+        policy = RetryPolicy(base_delay=0.1, max_delay=0.3)
+
+        delays = [policy.backoff(retry) for retry in range(5) for _ in range(20)]
+
+        assert all(0 <= d <= 0.3 for d in delays)
+        assert len(set(delays)) > 1
+
+    async def test_connection_errors_are_retried(self):
+        policy = RetryPolicy(base_delay=0.01)
+        send = AsyncMock(side_effect=[ConnectionResetError(), FakeResponse(200)])
+
+        response = await policy.run(send)
+
+        assert response.status == 200
+        assert send.await_count == 2
+        assert policy.stats.retries == 1
+        assert policy.stats.retry_time > 0
+
+    async def test_attempts_are_limited(self):
+        policy = RetryPolicy(max_attempts=3, base_delay=0.01)
+        send = AsyncMock(side_effect=ConnectionResetError())
+
+        with pytest.raises(ConnectionResetError):
+            await policy.run(send)
+        assert send.await_count == 3
+
+    async def test_budget_stops_retry_storms(self):
+        policy = RetryPolicy(base_delay=0.01, budget=RetryBudget(0.0, 1.0))
+        send = AsyncMock(return_value=FakeResponse(503))
+
+        for _ in range(3):
+            assert (await policy.run(send)).status == 503
+
+        assert send.await_count == 4
+        assert policy.stats.retries == 1
+        assert policy.stats.budget_exhausted == 3
+
+    async def test_retry_after_past_the_deadline_is_not_waited_for(self):
+        policy = RetryPolicy()
+        send = AsyncMock(return_value=FakeResponse(503, {"Retry-After": "5"}))
+        start = time.monotonic()
+
+        assert (await policy.run(send, 0.5)).status == 503
+        assert time.monotonic() - start < 0.5
+        assert send.await_count == 1
+
+    async def test_parse_retry_after(self):
+        in_a_minute = email.utils.formatdate(time.time() + 60, usegmt=True)
+
+        assert parse_retry_after("3") == 3.0
+        assert 55 < parse_retry_after(in_a_minute) <= 60
+        assert parse_retry_after("soon") is None
+
+
+class TestRetriedCalls:
+    async def test_unavailable_server_is_retried(self, http_server):
+        server = await http_server(flaky(2))
+        policy = RetryPolicy(base_delay=0.01)
+        api = AsyncDeltastreamApi(ApiClient(make_config(server.url)), retry=policy)
+
+        version = await api.get_version()
+
+        assert version.major == 2
+        assert len(server.requests) == 3
+        assert policy.stats.retries == 2
+        await api.close()
+
+    async def test_retry_after_is_honored(self, http_server):
+        server = await http_server(flaky(1, {"Retry-After": "1"}))
+        policy = RetryPolicy(base_delay=0.01)
+        api = AsyncDeltastreamApi(ApiClient(make_config(server.url)), retry=policy)
+        start = time.monotonic()
+
+        await api.get_version()
+
+        assert time.monotonic() - start >= 0.9
+        assert policy.stats.retry_time >= 0.9
+        await api.close()
+
+    async def test_long_retry_after_returns_the_error(self, http_server):
+        server = await http_server(flaky(1, {"Retry-After": "120"}))
+        api = AsyncDeltastreamApi(
+            ApiClient(make_config(server.url)), retry=RetryPolicy()
+        )
+
+        with pytest.raises(ApiException) as exc_info:
+            await api.get_version()
+
+        assert exc_info.value.status == 503
+        assert len(server.requests) == 1
+        await api.close()
+
+    async def test_statements_are_not_resubmitted(self, http_server):
+        server = await http_server(flaky(1))
+        api = AsyncDeltastreamApi(
+            ApiClient(make_config(server.url)), retry=RetryPolicy(base_delay=0.01)
+        )
+
+        with pytest.raises(ApiException):
+            await api.submit_statement(
+                StatementRequest(statement="SELECT 1;"),
+                _content_type="multipart/form-data",
+            )
+
+        assert len(server.requests) == 1
+        await api.close()
+
+
+async def test_connection_retries_idempotent_calls(http_server):
+    server = await http_server(flaky(1))
+    conn = APIConnection(
+        server_url=server.url,
+        token_provider=AsyncMock(return_value="token"),
+        session_id=None,
+        timezone="UTC",
+        organization_id=str(uuid.uuid4()),
+        role_name=None,
+        database_name=None,
+        schema_name=None,
+        store_name=None,
+    )
+    conn.retry.base_delay = 0.01
+
+    assert await conn.version() == {"major": 2, "minor": 1, "patch": 0}
+    assert conn.retry.stats.retries == 1
+    await conn.close()
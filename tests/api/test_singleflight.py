@@ -0,0 +1,256 @@
+"""
+Tests for coalescing identical in-flight status and partition requests.
+"""
+
+import asyncio
+import json
+import uuid
+from unittest.mock import AsyncMock
+
+import pytest
+
+from deltastream.api.controlplane.openapi_client.models.result_set import ResultSet
+from deltastream.api.controlplane.openapi_client.models.result_set_context import (
+    ResultSetContext,
+)
+from deltastream.api.controlplane.openapi_client.models.result_set_metadata import (
+    ResultSetMetadata,
+)
+from deltastream.api.controlplane.openapi_client.models.statement_status import (
+    StatementStatus,
+)
+from deltastream.api.deadline import Deadline
+from deltastream.api.dpconn import DPAPIConnection
+from deltastream.api.error import TimeoutError
+from deltastream.api.handlers import StatementHandler
+from deltastream.api.singleflight import SingleFlight
+
+pytestmark = pytest.mark.asyncio
+
+STATEMENT_ID = str(uuid.uuid4())
+
+
+def slow_call(result="done", delay=0.05):
+    calls = []
+
+    async def call():
+        calls.append(None)
+        await asyncio.sleep(delay)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    return call, calls
+
+
+class TestSingleFlight:
+    async def test_concurrent_calls_share_one_flight(self):
+        flights: SingleFlight[str] = SingleFlight()
+        call, calls = slow_call()
+
+        results = await asyncio.gather(*(flights.do("key", call) for _ in range(5)))
+
+        assert results == ["done"] * 5
+        assert len(calls) == 1
+        assert flights.coalesced == 4
+
+    async def test_different_keys_are_not_shared(self):
+        flights: SingleFlight[str] = SingleFlight()
+        call, calls = slow_call()
+
+        await asyncio.gather(flights.do("a", call), flights.do("b", call))
+
+        assert len(calls) == 2
+
+    async def test_later_calls_start_a_new_flight(self):
+        flights: SingleFlight[str] = SingleFlight()
+        call, calls = slow_call(delay=0)
+
+        await flights.do("key", call)
+        await flights.do("key", call)
+
+        assert len(calls) == 2
+
+    async def test_errors_are_shared(self):
+        flights: SingleFlight[str] = SingleFlight()
+        call, calls = slow_call(ValueError("boom"))
+
+        results = await asyncio.gather(
+            *(flights.do("key", call) for _ in range(3)), return_exceptions=True
+        )
+
+        assert [str(r) for r in results] == ["boom"] * 3
+        assert len(calls) == 1
+
+    async def test_cancelled_caller_does_not_abort_the_others(self):
+        flights: SingleFlight[str] = SingleFlight()
+        call, calls = slow_call(delay=0.1)
+        first = asyncio.ensure_future(flights.do("key", call))
+        second = asyncio.ensure_future(flights.do("key", call))
+        await asyncio.sleep(0.01)
+
+        first.cancel()
+
+        assert await second == "done"
+        assert len(calls) == 1
+
+    async def test_flight_is_cancelled_when_every_caller_left(self):
+        flights: SingleFlight[str] = SingleFlight()
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def call():
+            started.set()
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            return "done"
+
+        waiter = asyncio.ensure_future(flights.do("key", call))
+        await started.wait()
+        waiter.cancel()
+
+        await asyncio.wait_for(cancelled.wait(), 1)
+        assert flights._flights == {}
+
+
+async def test_handler_coalesces_status_requests():
+    result = ResultSet(
+        statement_id=STATEMENT_ID,
+        sql_state="00000",
+        metadata=ResultSetMetadata(encoding="json", partitionInfo=[], columns=[]),
+        createdOn=1704067200,
+    )
+
+    async def get_statement_status(**kwargs):
+        await asyncio.sleep(0.05)
+        return result
+
+    handler = StatementHandler(
+        api=AsyncMock(), rsctx=ResultSetContext(), session_id="sid", timezone="UTC"
+    )
+    handler.api.get_statement_status = AsyncMock(side_effect=get_statement_status)
+
+    results = await asyncio.gather(
+        *(handler.get_statement_status(uuid.UUID(STATEMENT_ID), 1) for _ in range(4)),
+        handler.get_statement_status(uuid.UUID(STATEMENT_ID), 2),
+    )
+
+    assert all(r is result for r in results)
+    assert handler.api.get_statement_status.await_count == 2
+
+
+async def test_dataplane_partitions_are_fetched_once(http_server):
+    async def partition(request):
+        await asyncio.sleep(0.05)
+        body = {
+            "sqlState": "00000",
+            "statementID": STATEMENT_ID,
+            "createdOn": 1704067200,
+            "metadata": {"encoding": "json", "partitionInfo": [], "columns": []},
+            "data": [],
+        }
+        return {
+            "body": json.dumps(body).encode(),
+            "headers": {"Content-Type": "application/json"},
+        }
+
+    server = await http_server(partition)
+    dpconn = DPAPIConnection(f"{server.url}/v2", "dp_token", "UTC")
+
+    results = await asyncio.gather(
+        *(dpconn.get_statement_status(uuid.UUID(STATEMENT_ID), 3) for _ in range(5))
+    )
+
+    assert len(server.requests) == 1
+    assert all(r is results[0] for r in results)
+    assert dpconn.status_flights.coalesced == 4
+    await dpconn.close()
+
+
+async def test_coalesced_callers_keep_their_own_deadlines():
+    result = ResultSet(
+        statement_id=STATEMENT_ID,
+        sql_state="00000",
+        metadata=ResultSetMetadata(encoding="json", partitionInfo=[], columns=[]),
+        createdOn=1704067200,
+    )
+
+    async def get_statement_status(**kwargs):
+        # Like the transport, give up after the request's timeout.
+        await asyncio.wait_for(asyncio.sleep(0.2), kwargs["_request_timeout"])
+        return result
+
+    handler = StatementHandler(
+        api=AsyncMock(), rsctx=ResultSetContext(), session_id="sid", timezone="UTC"
+    )
+    handler.api.get_statement_status = AsyncMock(side_effect=get_statement_status)
+    statement_id = uuid.UUID(STATEMENT_ID)
+
+    impatient = asyncio.ensure_future(
+        handler.get_statement_status(statement_id, 1, Deadline(0.05))
+    )
+    await asyncio.sleep(0.01)
+
+    assert await handler.get_statement_status(statement_id, 1) is result
+    with pytest.raises(TimeoutError):
+        await impatient
+    assert handler.api.get_statement_status.await_count == 1
+
+
+async def test_dataplane_connections_can_share_flights(http_server):
+    async def partition(request):
+        await asyncio.sleep(0.05)
+        body = {
+            "sqlState": "00000",
+            "statementID": STATEMENT_ID,
+            "createdOn": 1704067200,
+            "metadata": {"encoding": "json", "partitionInfo": [], "columns": []},
+            "data": [],
+        }
+        return {
+            "body": json.dumps(body).encode(),
+            "headers": {"Content-Type": "application/json"},
+        }
+
+    server = await http_server(partition)
+    flights: SingleFlight = SingleFlight()
+    dpconns = [
+        DPAPIConnection(f"{server.url}/v2", "dp_token", "UTC", status_flights=flights)
+        for _ in range(3)
+    ]
+
+    await asyncio.gather(
+        *(dpconn.get_statement_status(uuid.UUID(STATEMENT_ID), 0) for dpconn in dpconns)
+    )
+
+    assert len(server.requests) == 1
+    assert flights.coalesced == 2
+    for dpconn in dpconns:
+        await dpconn.close()
+
+
+async def test_pending_partition_keeps_being_polled():
+    result = ResultSet(
+        statement_id=STATEMENT_ID,
+        sql_state="00000",
+        metadata=ResultSetMetadata(encoding="json", partitionInfo=[], columns=[]),
+        createdOn=1704067200,
+    )
+    pending = StatementStatus(
+        statementID=STATEMENT_ID, sqlState="03000", createdOn=1704067200
+    )
+    handler = StatementHandler(
+        api=AsyncMock(), rsctx=ResultSetContext(), session_id="sid", timezone="UTC"
+    )
+    handler.polling.initial_delay = 0.001
+    handler.api.get_statement_status = AsyncMock(side_effect=[pending, result])
+
+    await handler.get_statement_status(uuid.UUID(STATEMENT_ID), 3)
+
+    assert [
+        call.kwargs["partition_id"]
+        for call in handler.api.get_statement_status.await_args_list
+    ] == [3, 3]
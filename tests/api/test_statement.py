@@ -0,0 +1,291 @@
+"""
+Tests for submitting statements without waiting for them.
+"""
+
+import asyncio
+import json
+import time
+import uuid
+from unittest.mock import AsyncMock
+
+import pytest
+
+from deltastream.api.conn import APIConnection
+from deltastream.api.error import PollCancelledError, SQLError, SqlState
+from deltastream.api.polling import PollStrategy
+
+pytestmark = pytest.mark.asyncio
+
+METADATA = {
+    "encoding": "json",
+    "partitionInfo": [{"rowCount": 1}],
+    "columns": [{"name": "id", "type": "INTEGER", "nullable": False}],
+}
+
+
+def json_response(body: dict, status: int = 200) -> dict:
+    return {
+        "status": status,
+        "body": json.dumps(body).encode(),
+        "headers": {"Content-Type": "application/json"},
+    }
+
+
+class Statements:
+    """A server that runs each submitted statement for ``polls`` status polls."""
+
+    def __init__(self, polls: int = 2, sql_state: str = "00000") -> None:
+        self.polls = polls
+        self.sql_state = sql_state
+        self.seen: dict = {}
+
+    async def __call__(self, request):
+        if request.method == "POST":
+            statement_id = str(uuid.uuid4())
+            self.seen[statement_id] = 0
+            return self.running(statement_id)
+        statement_id = request.path.split("/")[3].split("?")[0]
+        self.seen[statement_id] += 1
+        if self.seen[statement_id] <= self.polls:
+            return self.running(statement_id)
+        return json_response(
+            {
+                "sqlState": self.sql_state,
+                "message": "failed" if self.sql_state != "00000" else None,
+                "statementID": statement_id,
+                "createdOn": 0,
+                "metadata": METADATA,
+                "data": [[str(len(self.seen))]],
+            }
+        )
+
+    def running(self, statement_id: str) -> dict:
+        return json_response(
+            {"sqlState": "03000", "statementID": statement_id, "createdOn": 0}, 202
+        )
+
+
+def make_connection(url: str, **kwargs) -> APIConnection:
+    return APIConnection(
+        server_url=f"{url}/v2",
+        token_provider=AsyncMock(return_value="token"),
+        session_id=None,
+        timezone="UTC",
+        organization_id=None,
+        role_name=None,
+        database_name=None,
+        schema_name=None,
+        store_name=None,
+        polling=PollStrategy(initial_delay=0.01, max_delay=0.01, jitter=0),
+        **kwargs,
+    )
+
+
+class TestSubmit:
+    async def test_returns_once_the_statement_is_accepted(self, http_server):
+        statements = Statements(polls=1000)
+        server = await http_server(statements)
+        conn = make_connection(server.url)
+
+        handle = await conn.submit("SELECT 1;")
+
+        assert [r.method for r in server.requests] == ["POST"]
+        assert str(handle.statement_id) in statements.seen
+        assert not handle.done()
+        assert (
+            await handle.status() == SqlState.SQL_STATE_SQL_STATEMENT_NOT_YET_COMPLETE
+        )
+        await conn.close()
+
+    async def test_rows_wait_for_completion(self, http_server):
+        server = await http_server(Statements(polls=2))
+        conn = make_connection(server.url)
+        handle = await conn.submit("SELECT 1;")
+
+        rows = await handle.rows()
+
+        assert await anext(rows) == [1]
+        assert handle.done()
+        assert await handle.status() == SqlState.SQL_STATE_SUCCESSFUL_COMPLETION
+        await conn.close()
+
+    async def test_status_of_a_completed_statement(self, http_server):
+        statements = Statements(polls=0)
+        server = await http_server(statements)
+        conn = make_connection(server.url)
+        handle = await conn.submit("SELECT 1;")
+
+        assert await handle.status() == SqlState.SQL_STATE_SUCCESSFUL_COMPLETION
+        await handle.result()
+
+        # The completed status poll is reused instead of polling again.
+        assert statements.seen[str(handle.statement_id)] == 1
+        await conn.close()
+
+    async def test_concurrent_results_share_one_wait(self, http_server):
+        statements = Statements(polls=3)
+        server = await http_server(statements)
+        conn = make_connection(server.url)
+        handle = await conn.submit("SELECT 1;")
+
+        results = await asyncio.gather(*(handle.result() for _ in range(5)))
+
+        assert all(rs is results[0] for rs in results)
+        assert statements.seen[str(handle.statement_id)] == 4
+        await conn.close()
+
+    async def test_submissions_overlap(self, http_server):
+        server = await http_server(Statements(polls=5))
+        conn = make_connection(server.url)
+
+        handles = [await conn.submit(f"SELECT {n};") for n in range(10)]
+        assert not any(h.done() for h in handles)
+        results = await asyncio.gather(*(h.result() for h in handles))
+
+        assert [rs.statement_id for rs in results] == [h.statement_id for h in handles]
+        await conn.close()
+
+    async def test_failed_statement_raises(self, http_server):
+        server = await http_server(Statements(polls=1, sql_state="42000"))
+        conn = make_connection(server.url)
+        handle = await conn.submit("SELECT nope;")
+
+        with pytest.raises(SQLError):
+            await handle.result()
+        assert handle.done()
+        await conn.close()
+
+    async def test_cancel_stops_the_wait(self, http_server):
+        statements = Statements(polls=1000)
+        server = await http_server(statements)
+        conn = make_connection(server.url)
+        handle = await conn.submit("SELECT 1;")
+        waiter = asyncio.ensure_future(handle.result())
+        await asyncio.sleep(0.05)
+
+        handle.cancel()
+
+        with pytest.raises(PollCancelledError) as exc_info:
+            await waiter
+        assert exc_info.value.statement_id == handle.statement_id
+        polls = statements.seen[str(handle.statement_id)]
+        await asyncio.sleep(0.05)
+        assert statements.seen[str(handle.statement_id)] == polls
+        with pytest.raises(PollCancelledError):
+            await handle.rows()
+        await conn.close()
+
+    async def test_cancelling_one_caller_leaves_the_others(self, http_server):
+        server = await http_server(Statements(polls=3))
+        conn = make_connection(server.url)
+        handle = await conn.submit("SELECT 1;")
+        impatient = asyncio.ensure_future(handle.result())
+        patient = asyncio.ensure_future(handle.result())
+        await asyncio.sleep(0)
+
+        impatient.cancel()
+
+        rs = await patient
+        assert rs.statement_id == handle.statement_id
+        await conn.close()
+
+
+class Script(Statements):
+    """A server that splits a submission into ``count`` statements."""
+
+    def __init__(self, count: int, polls: int = 2, failing: int = -1) -> None:
+        super().__init__(polls)
+        self.count = count
+        self.failing = failing
+        self.ids: list = []
+
+    async def __call__(self, request):
+        if request.method == "POST":
+            self.ids = [str(uuid.uuid4()) for _ in range(self.count)]
+            for statement_id in self.ids:
+                self.seen[statement_id] = 0
+            return json_response(
+                {
+                    "sqlState": "03000",
+                    "statementID": self.ids[0],
+                    "statementIDs": self.ids,
+                    "createdOn": 0,
+                },
+                202,
+            )
+        statement_id = request.path.split("/")[3].split("?")[0]
+        self.sql_state = (
+            "42000"
+            if self.failing >= 0 and statement_id == self.ids[self.failing]
+            else "00000"
+        )
+        if self.sql_state != "00000":
+            self.seen[statement_id] = self.polls
+        response = await super().__call__(request)
+        if self.seen[statement_id] > self.polls and self.sql_state == "00000":
+            body = json.loads(response["body"])
+            body["data"] = [[str(self.ids.index(statement_id))]]
+            response["body"] = json.dumps(body).encode()
+        return response
+
+
+class TestMultipleStatements:
+    async def test_rows_come_back_in_statement_order(self, http_server):
+        script = Script(count=50, polls=3)
+        server = await http_server(script)
+        conn = make_connection(server.url, poll_rate=1000)
+
+        results = await conn.query_all("CREATE ...; CREATE ...;")
+
+        assert [await anext(rows) for rows in results] == [[n] for n in range(50)]
+        assert [r.method for r in server.requests].count("POST") == 1
+        assert all(polls == 4 for polls in script.seen.values())
+        await conn.close()
+
+    async def test_statements_are_waited_for_concurrently(self, http_server):
+        server = await http_server(Script(count=20, polls=5))
+        conn = make_connection(server.url, poll_rate=1000)
+        conn.polling.max_delay = conn.polling.initial_delay = 0.05
+        start = time.monotonic()
+
+        await conn.query_all("CREATE ...;")
+
+        # One after another, 20 statements would take 20 * 5 * 0.05s.
+        assert time.monotonic() - start < 1.0
+        assert conn.statement_handler.multiplexer.polls == 120
+        await conn.close()
+
+    async def test_handles_follow_the_statements(self, http_server):
+        script = Script(count=3, polls=1)
+        server = await http_server(script)
+        conn = make_connection(server.url)
+
+        handles = await conn.submit_all("CREATE ...; CREATE ...; CREATE ...;")
+
+        assert [str(h.statement_id) for h in handles] == script.ids
+        assert not any(h.done() for h in handles)
+        await asyncio.gather(*(h.result() for h in handles))
+        await conn.close()
+
+    async def test_single_statement(self, http_server):
+        server = await http_server(Statements(polls=1))
+        conn = make_connection(server.url)
+
+        results = await conn.query_all("SELECT 1;")
+
+        assert len(results) == 1
+        await conn.close()
+
+    async def test_failure_cancels_the_other_waits(self, http_server):
+        script = Script(count=3, polls=1000, failing=1)
+        server = await http_server(script)
+        conn = make_connection(server.url)
+
+        with pytest.raises(SQLError):
+            await conn.query_all("SELECT nope; SELECT 1; SELECT 2;")
+        await asyncio.sleep(0.05)
+        polls = dict(script.seen)
+        await asyncio.sleep(0.05)
+
+        assert script.seen == polls
+        await conn.close()
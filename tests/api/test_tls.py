@@ -0,0 +1,142 @@
+"""
+Tests for TLS session resumption.
+"""
+
+import json
+import ssl
+import uuid
+
+import pytest
+import websockets
+
+from deltastream.api.controlplane.openapi_client.configuration import Configuration
+from deltastream.api.dpconn import DPAPIConnection
+from deltastream.api.models import DataplaneRequest
+from deltastream.api.streaming_rows import StreamingRows
+from deltastream.api import transport
+from deltastream.api.tls import ResumingSSLContext
+from deltastream.api.transport import AsyncRESTClientObject, PoolRegistry
+
+pytestmark = pytest.mark.asyncio
+
+
+async def json_ok(request):
+    return {"body": json.dumps({"path": request.path}).encode()}
+
+
+def make_config(url: str, ca_cert_file: str) -> Configuration:
+    config = Configuration()
+    config.host = url
+    config.ssl_ca_cert = ca_cert_file
+    return config
+
+
+async def fetch_on_new_connection(client: AsyncRESTClientObject, url: str) -> None:
+    resp = await client.request("GET", f"{url}/v2/version")
+    await resp.read()
+    # Drop the keep-alive connection so the next request reconnects.
+    client.pool_for(url).close()
+
+
+class TestSessionResumption:
+    async def test_reconnects_resume_the_session(
+        self, http_server, server_ssl_context, ca_cert_file
+    ):
+        server = await http_server(json_ok, server_ssl_context)
+        registry = PoolRegistry()
+        client = AsyncRESTClientObject(make_config(server.url, ca_cert_file), registry)
+
+        for _ in range(3):
+            await fetch_on_new_connection(client, server.url)
+
+        assert server.connections == 3
+        assert (registry.tls_stats.handshakes, registry.tls_stats.resumed) == (3, 2)
+        assert registry.tls_stats.hit_rate == pytest.approx(2 / 3)
+        context = registry.ssl_context(client.configuration)
+        assert isinstance(context, ResumingSSLContext)
+        assert list(context.sessions) == ["127.0.0.1"]
+        await registry.close()
+
+    async def test_tls_1_2_sessions_resume(
+        self, http_server, server_ssl_context, ca_cert_file
+    ):
+        server_ssl_context.maximum_version = ssl.TLSVersion.TLSv1_2
+        server = await http_server(json_ok, server_ssl_context)
+        registry = PoolRegistry()
+        client = AsyncRESTClientObject(make_config(server.url, ca_cert_file), registry)
+
+        for _ in range(2):
+            await fetch_on_new_connection(client, server.url)
+
+        assert registry.tls_stats.resumed == 1
+        await registry.close()
+
+    async def test_sessions_are_not_shared_across_tls_settings(
+        self, http_server, server_ssl_context, ca_cert_file
+    ):
+        server = await http_server(json_ok, server_ssl_context)
+        registry = PoolRegistry()
+        first = AsyncRESTClientObject(make_config(server.url, ca_cert_file), registry)
+        config = make_config(server.url, ca_cert_file)
+        config.tls_server_name = "localhost"
+        second = AsyncRESTClientObject(config, registry)
+
+        await fetch_on_new_connection(first, server.url)
+        await fetch_on_new_connection(second, server.url)
+
+        assert registry.tls_stats.handshakes == 2
+        assert registry.tls_stats.resumed == 0
+        await registry.close()
+
+    async def test_session_cache_is_bounded(
+        self, http_server, server_ssl_context, ca_cert_file
+    ):
+        server = await http_server(json_ok, server_ssl_context)
+        registry = PoolRegistry()
+        client = AsyncRESTClientObject(make_config(server.url, ca_cert_file), registry)
+        context = registry.ssl_context(client.configuration)
+        context.max_sessions = 1
+
+        await fetch_on_new_connection(client, server.url)
+        context.sessions["stale.example.com"] = context.sessions.pop("127.0.0.1")
+        await fetch_on_new_connection(client, server.url)
+
+        assert list(context.sessions) == ["127.0.0.1"]
+        await registry.close()
+
+
+async def test_websocket_resumes_the_dataplane_session(
+    http_server, server_ssl_context, ca_cert_file, monkeypatch
+):
+    # DPAPIConnection trusts the default CA store, loaded into a new context.
+    monkeypatch.setenv("SSL_CERT_FILE", ca_cert_file)
+    registry = PoolRegistry()
+    monkeypatch.setattr(transport, "_shared_registry", registry)
+
+    async def print_topic(ws):
+        await ws.recv()
+        await ws.send(json.dumps({"type": "metadata", "headers": {}, "columns": []}))
+        await ws.wait_closed()
+
+    server = await http_server(json_ok, server_ssl_context)
+    # Both servers share ticket keys through the same server context.
+    async with websockets.serve(
+        print_topic, "127.0.0.1", 0, ssl=server_ssl_context
+    ) as ws_server:
+        ws_port = ws_server.sockets[0].getsockname()[1]
+        dpconn = DPAPIConnection(f"{server.url}/v2", "dp_token", "UTC")
+        await fetch_on_new_connection(dpconn.api.rest_client, server.url)
+        rows = StreamingRows(
+            dpconn,
+            DataplaneRequest(
+                uri=f"https://127.0.0.1:{ws_port}/v2/print/1",
+                statement_id=str(uuid.uuid4()),
+                token="dp_token",
+                request_type="print",
+            ),
+        )
+        await rows.open()
+        await rows.close()
+
+        assert (registry.tls_stats.handshakes, registry.tls_stats.resumed) == (2, 1)
+        await registry.close()
@@ -0,0 +1,301 @@
+"""
+Tests for the asyncio HTTP transport and the awaitable API facades.
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from deltastream.api.async_api import AsyncDeltastreamApi
+from deltastream.api.controlplane.openapi_client.api_client import ApiClient
+from deltastream.api.controlplane.openapi_client.configuration import Configuration
+from deltastream.api.controlplane.openapi_client.exceptions import ApiException
+from deltastream.api.transport import AsyncRESTClientObject, PoolRegistry, Timeout
+
+pytestmark = pytest.mark.asyncio
+
+
+def make_config(url: str, maxsize: int = 4) -> Configuration:
+    config = Configuration()
+    config.host = url
+    config.connection_pool_maxsize = maxsize
+    return config
+
+
+async def json_ok(request):
+    return {"body": json.dumps({"path": request.path}).encode()}
+
+
+class TestAsyncRESTClientObject:
+    async def test_get_reads_json_body(self, http_server):
+        server = await http_server(json_ok)
+        client = AsyncRESTClientObject(make_config(server.url))
+
+        resp = await client.request("GET", f"{server.url}/v2/version?x=1")
+        data = await resp.read()
+
+        assert resp.status == 200
+        assert json.loads(data) == {"path": "/v2/version?x=1"}
+        assert resp.getheader("content-length") == str(len(data))
+        await client.close()
+
+    async def test_sequential_requests_reuse_keep_alive_connection(self, http_server):
+        server = await http_server(json_ok)
+        client = AsyncRESTClientObject(make_config(server.url))
+
+        for _ in range(3):
+            resp = await client.request("GET", f"{server.url}/v2/version")
+            await resp.read()
+
+        assert server.connections == 1
+        assert len(server.requests) == 3
+        await client.close()
+
+    async def test_concurrent_requests_share_bounded_pool(self, http_server):
+        async def slow(request):
+            await asyncio.sleep(0.02)
+            return {"body": b"{}"}
+
+        server = await http_server(slow)
+        client = AsyncRESTClientObject(make_config(server.url, maxsize=3))
+
+        async def call():
+            resp = await client.request("GET", f"{server.url}/v2/statements/1")
+            return await resp.read()
+
+        results = await asyncio.gather(*(call() for _ in range(12)))
+
+        assert results == [b"{}"] * 12
+        assert server.connections == 3
+        assert server.max_active == 3
+        await client.close()
+
+    async def test_chunked_response_body(self, http_server):
+        async def chunked(request):
+            return {"body": [b'{"a": ', b"1", b"}"], "chunked": True}
+
+        server = await http_server(chunked)
+        client = AsyncRESTClientObject(make_config(server.url))
+
+        resp = await client.request("GET", f"{server.url}/chunked")
+        chunks = [chunk async for chunk in resp.stream()]
+
+        assert chunks == [b'{"a": ', b"1", b"}"]
+        # The connection goes back to the pool once the body is consumed.
+        assert client.pool_for(server.url).num_idle == 1
+        await client.close()
+
+    async def test_multipart_post_serializes_dict_fields(self, http_server):
+        server = await http_server(json_ok)
+        client = AsyncRESTClientObject(make_config(server.url))
+
+        resp = await client.request(
+            "POST",
+            f"{server.url}/v2/statements",
+            headers={"Content-Type": "multipart/form-data"},
+            post_params=[
+                ("request", {"statement": "SELECT 1;"}),
+                ("attachments", ("udf.jar", b"\x00\x01", "application/java-archive")),
+            ],
+        )
+        await resp.read()
+
+        request = server.requests[0]
+        assert request.headers["content-type"].startswith("multipart/form-data")
+        assert b'{"statement": "SELECT 1;"}' in request.body
+        assert b'filename="udf.jar"' in request.body
+        await client.close()
+
+    async def test_request_timeout(self, http_server):
+        async def hang(request):
+            await asyncio.sleep(1)
+            return {}
+
+        server = await http_server(hang)
+        client = AsyncRESTClientObject(make_config(server.url))
+
+        with pytest.raises(asyncio.TimeoutError):
+            await client.request("GET", f"{server.url}/slow", _request_timeout=0.05)
+        await client.close()
+
+    async def test_wait_for_a_pool_slot_is_bounded_by_the_connect_timeout(
+        self, http_server
+    ):
+        async def slow(request):
+            await asyncio.sleep(0.3)
+            return {"body": b"{}"}
+
+        server = await http_server(slow)
+        client = AsyncRESTClientObject(make_config(server.url, maxsize=1))
+
+        async def call():
+            resp = await client.request("GET", f"{server.url}/slow")
+            return await resp.read()
+
+        busy = asyncio.ensure_future(call())
+        await asyncio.sleep(0.05)
+
+        with pytest.raises(asyncio.TimeoutError):
+            await client.request(
+                "GET", f"{server.url}/v2/version", _request_timeout=(0.05, None)
+            )
+        assert client.pool_for(server.url).num_in_use == 1
+        assert await busy == b"{}"
+        await client.close()
+
+    async def test_dropped_keep_alive_connection_is_replaced(self, http_server):
+        async def drop(request):
+            return {"body": b"{}", "drop": True}
+
+        server = await http_server(drop)
+        client = AsyncRESTClientObject(make_config(server.url))
+
+        for _ in range(2):
+            resp = await client.request("GET", f"{server.url}/v2/version")
+            assert await resp.read() == b"{}"
+            await asyncio.sleep(0.01)
+
+        assert server.connections == 2
+        await client.close()
+
+    @pytest.mark.parametrize("method, sent", [("GET", 2), ("POST", 1)])
+    async def test_only_safe_methods_are_resent_on_a_reused_connection(
+        self, http_server, method, sent
+    ):
+        async def hang_up_once_reused(request):
+            return {"body": b"{}", "hang_up": len(server.requests) == 2}
+
+        server = await http_server(hang_up_once_reused)
+        client = AsyncRESTClientObject(make_config(server.url))
+        resp = await client.request("GET", f"{server.url}/v2/version")
+        await resp.read()
+
+        if method == "GET":
+            resp = await client.request(method, f"{server.url}/v2/statements")
+            assert await resp.read() == b"{}"
+        else:
+            with pytest.raises((ConnectionError, asyncio.IncompleteReadError)):
+                await client.request(method, f"{server.url}/v2/statements")
+
+        assert [r.method for r in server.requests[1:]] == [method] * sent
+        await client.close()
+
+    async def test_timeout_from_request_timeout(self):
+        assert Timeout.from_request_timeout(None) == Timeout()
+        assert Timeout.from_request_timeout(5) == Timeout(total=5.0)
+        assert Timeout.from_request_timeout((1.0, 2.0)) == Timeout(
+            connect=1.0, read=2.0
+        )
+
+
+class TestPoolRegistry:
+    async def test_clients_with_same_settings_share_connections(self, http_server):
+        server = await http_server(json_ok)
+        registry = PoolRegistry()
+
+        for _ in range(3):
+            client = AsyncRESTClientObject(make_config(server.url), registry)
+            resp = await client.request("GET", f"{server.url}/v2/version")
+            await resp.read()
+
+        assert server.connections == 1
+        (pool,) = registry.pools()
+        assert (pool.connections_opened, pool.connections_reused) == (1, 2)
+        await registry.close()
+
+    async def test_different_tls_settings_use_separate_pools(self):
+        registry = PoolRegistry()
+        verified = make_config("https://api.deltastream.io/v2")
+        unverified = make_config("https://api.deltastream.io/v2")
+        unverified.verify_ssl = False
+
+        pool = registry.pool_for("https://api.deltastream.io/v2", verified)
+
+        assert registry.pool_for("https://api.deltastream.io/x", verified) is pool
+        assert (
+            registry.pool_for("https://api.deltastream.io/v2", unverified) is not pool
+        )
+        assert registry.ssl_context(verified) is pool.ssl_context
+
+    async def test_idle_connections_are_evicted(self, http_server):
+        server = await http_server(json_ok)
+        registry = PoolRegistry(idle_timeout=0.01)
+        client = AsyncRESTClientObject(make_config(server.url), registry)
+
+        for _ in range(2):
+            resp = await client.request("GET", f"{server.url}/v2/version")
+            await resp.read()
+            await asyncio.sleep(0.05)
+
+        assert server.connections == 2
+
+    async def test_least_recently_used_pool_is_closed_beyond_max_pools(
+        self, http_server
+    ):
+        first = await http_server(json_ok)
+        second = await http_server(json_ok)
+        registry = PoolRegistry(max_pools=1)
+
+        for server in (first, second):
+            client = AsyncRESTClientObject(make_config(server.url), registry)
+            resp = await client.request("GET", f"{server.url}/v2/version")
+            await resp.read()
+
+        (pool,) = registry.pools()
+        assert pool.port == int(second.url.rsplit(":", 1)[1])
+
+
+class TestAsyncDeltastreamApi:
+    async def test_get_version(self, http_server):
+        async def version(request):
+            return {
+                "body": b'{"major": 2, "minor": 1, "patch": 0}',
+                "headers": {"Content-Type": "application/json"},
+            }
+
+        server = await http_server(version)
+        api = AsyncDeltastreamApi(ApiClient(make_config(server.url)))
+
+        result = await api.get_version()
+
+        assert (result.major, result.minor, result.patch) == (2, 1, 0)
+        assert server.requests[0].path == "/version"
+        await api.close()
+
+    async def test_error_status_raises_api_exception(self, http_server):
+        async def unavailable(request):
+            return {
+                "status": 503,
+                "body": b'{"message": "try later"}',
+                "headers": {"Content-Type": "application/json"},
+            }
+
+        server = await http_server(unavailable)
+        api = AsyncDeltastreamApi(ApiClient(make_config(server.url)))
+
+        with pytest.raises(ApiException) as exc_info:
+            await api.get_version()
+
+        assert exc_info.value.status == 503
+        assert "try later" in exc_info.value.body
+        await api.close()
+
+    async def test_truncated_body_raises_api_exception(self, http_server):
+        async def truncated(request):
+            return {
+                "body": b'{"major": 2, "minor": 1, "patch": 0}',
+                "headers": {"Content-Type": "application/json"},
+                "chunked": True,
+                "truncate": True,
+            }
+
+        server = await http_server(truncated)
+        api = AsyncDeltastreamApi(ApiClient(make_config(server.url)))
+
+        with pytest.raises(ApiException) as exc_info:
+            await api.get_version()
+
+        assert exc_info.value.status == 0
+        assert "IncompleteReadError" in exc_info.value.reason
+        await api.close()
@@ -0,0 +1,168 @@
+"""
+Tests for pre-warming keep-alive connections.
+"""
+
+import asyncio
+import json
+import socket
+from unittest.mock import AsyncMock
+
+import pytest
+
+from deltastream.api.conn import APIConnection
+from deltastream.api.controlplane.openapi_client.configuration import Configuration
+from deltastream.api.transport import (
+    AsyncRESTClientObject,
+    PoolRegistry,
+    keepalive_socket_options,
+)
+
+pytestmark = pytest.mark.asyncio
+
+
+def make_config(url: str, maxsize: int = 4) -> Configuration:
+    config = Configuration()
+    config.host = url
+    config.connection_pool_maxsize = maxsize
+    return config
+
+
+async def json_ok(request):
+    return {"body": json.dumps({"path": request.path}).encode()}
+
+
+def make_connection(url: str) -> APIConnection:
+    return APIConnection(
+        server_url=f"{url}/v2",
+        token_provider=AsyncMock(return_value="token"),
+        session_id=None,
+        timezone="UTC",
+        organization_id=None,
+        role_name=None,
+        database_name=None,
+        schema_name=None,
+        store_name=None,
+    )
+
+
+class TestConnectionPoolWarm:
+    async def test_warm_connections_serve_the_first_requests(self, http_server):
+        server = await http_server(json_ok)
+        client = AsyncRESTClientObject(make_config(server.url), PoolRegistry())
+
+        assert await client.warm(server.url, 3) == 3
+        assert await client.warm(server.url, 3) == 0
+        await asyncio.sleep(0.05)
+        assert server.connections == 3
+
+        pool = client.pool_for(server.url)
+        for _ in range(3):
+            resp = await client.request("GET", f"{server.url}/v2/version")
+            await resp.read()
+
+        assert pool.connections_opened == 3
+        assert pool.connections_reused == 3
+        assert server.connections == 3
+        await client.registry.close()
+
+    async def test_warm_is_bounded_by_pool_size(self, http_server):
+        server = await http_server(json_ok)
+        client = AsyncRESTClientObject(make_config(server.url, 2), PoolRegistry())
+
+        assert await client.warm(server.url, 5) == 2
+        assert client.pool_for(server.url).num_idle == 2
+        await client.registry.close()
+
+    async def test_warm_connections_outlive_idle_timeout(self, http_server):
+        server = await http_server(json_ok)
+        client = AsyncRESTClientObject(
+            make_config(server.url), PoolRegistry(idle_timeout=0.0)
+        )
+        pool = client.pool_for(server.url)
+
+        await client.warm(server.url, 2)
+        resp = await client.request("GET", f"{server.url}/v2/version")
+        await resp.read()
+        pool.evict_idle()
+
+        assert pool.num_idle == 2
+        await client.registry.close()
+
+    async def test_dropped_connections_are_replaced(self, http_server):
+        server = await http_server(json_ok)
+        client = AsyncRESTClientObject(make_config(server.url), PoolRegistry())
+        pool = client.pool_for(server.url)
+
+        await client.warm(server.url, 2)
+        pool._idle[0].close()
+
+        assert await client.warm(server.url, 2) == 1
+        assert pool.num_idle == 2
+        await client.registry.close()
+
+    async def test_unreachable_origin_raises(self):
+        listener = socket.socket()
+        listener.bind(("127.0.0.1", 0))
+        url = "http://127.0.0.1:%d" % listener.getsockname()[1]
+        listener.close()
+        client = AsyncRESTClientObject(make_config(url), PoolRegistry())
+
+        with pytest.raises(OSError):
+            await client.warm(url, 2)
+        await client.registry.close()
+
+
+class TestKeepaliveSocketOptions:
+    async def test_options_are_applied_to_warm_sockets(self, http_server):
+        server = await http_server(json_ok)
+        config = make_config(server.url)
+        config.socket_options = keepalive_socket_options(idle=45)
+        client = AsyncRESTClientObject(config, PoolRegistry())
+
+        await client.warm(server.url, 1)
+        sock = client.pool_for(server.url)._idle[0].writer.get_extra_info("socket")
+
+        assert sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)
+        assert sock.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE)
+        if hasattr(socket, "TCP_KEEPIDLE"):
+            assert sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE) == 45
+        await client.registry.close()
+
+
+class TestAPIConnectionWarmup:
+    async def test_warms_controlplane_and_dataplane_hosts(self, http_server):
+        controlplane = await http_server(json_ok)
+        dataplane = await http_server(json_ok)
+        conn = make_connection(controlplane.url)
+
+        await conn.warmup(
+            connections=2,
+            dataplane_urls=[f"{dataplane.url}/v2"],
+            heartbeat_interval=None,
+        )
+        await asyncio.sleep(0.05)
+
+        assert controlplane.connections == 2
+        assert dataplane.connections == 2
+        assert conn.socket_options == keepalive_socket_options()
+        assert controlplane.requests == [] and dataplane.requests == []
+        await conn.close()
+        await conn.statement_handler.api.rest_client.registry.close()
+
+    async def test_heartbeat_replaces_closed_connections(self, http_server):
+        server = await http_server(json_ok)
+        conn = make_connection(server.url)
+        rest_client = conn.statement_handler.api.rest_client
+
+        await conn.warmup(connections=2, heartbeat_interval=0.02)
+        pool = rest_client.pool_for(server.url)
+        for idle in list(pool._idle):
+            idle.close()
+        await asyncio.sleep(0.1)
+
+        assert pool.num_idle == 2
+        assert pool.connections_opened == 4
+
+        await conn.close()
+        assert conn._heartbeat is None
+        await rest_client.registry.close()